@@ -0,0 +1,81 @@
+"""
+Text analysis for the search index.
+
+Text is split into lowercase terms, keeping the punctuation which is
+significant in programming terms - ``c#``, ``c++``, ``node.js`` and
+``objective-c`` are single terms. Common English words are dropped.
+"""
+import htmlentitydefs
+import re
+
+from django.utils.html import strip_tags
+
+# Maximum length of an indexed term
+MAX_TERM_LENGTH = 50
+
+term_re = re.compile(r'[\w#+]+(?:[.\-][\w#+]+)*', re.UNICODE)
+alphanumeric_re = re.compile(r'\w', re.UNICODE)
+entity_re = re.compile(r'&(#\d+|#x[0-9a-fA-F]+|\w+);')
+
+STOP_WORDS = frozenset(u"""
+a about an and are as at be but by for from has have how i if in into is it
+its of on or so than that the their then there these this to was what when
+which who why will with you
+""".split())
+
+def analyze(text):
+    """Returns a list of the terms in some text, in order."""
+    terms = []
+    for term in term_re.findall(text.lower()):
+        if (len(term) <= MAX_TERM_LENGTH and term not in STOP_WORDS and
+            alphanumeric_re.search(term)):
+            terms.append(term)
+    return terms
+
+def analyze_offsets(text):
+    """
+    Returns a list of ``(term, offset)`` tuples for the terms in some text,
+    in order, where ``offset`` is the position of the term in the text.
+    """
+    terms = []
+    for match in term_re.finditer(text):
+        term = match.group().lower()
+        if (len(term) <= MAX_TERM_LENGTH and term not in STOP_WORDS and
+            alphanumeric_re.search(term)):
+            terms.append((term, match.start()))
+    return terms
+
+def unescape_entity(match):
+    entity = match.group(1)
+    try:
+        if entity.startswith(u'#x'):
+            return unichr(int(entity[2:], 16))
+        elif entity.startswith(u'#'):
+            return unichr(int(entity[1:]))
+    except (ValueError, OverflowError):
+        return u' '
+    if entity in htmlentitydefs.name2codepoint:
+        return unichr(htmlentitydefs.name2codepoint[entity])
+    return match.group()
+
+def html_to_text(html):
+    """
+    Returns the text content of some HTML, with entities decoded and runs
+    of whitespace collapsed.
+    """
+    # Separate the text of adjacent elements before removing tags
+    text = entity_re.sub(unescape_entity,
+                         strip_tags(html.replace(u'<', u' <')))
+    return u' '.join(text.split())
+
+def analyze_html(html):
+    """Returns a list of the terms in the text content of some HTML."""
+    return analyze(html_to_text(html))
+
+def analyze_tagnames(tagnames):
+    """
+    Returns a list of the terms for some space-separated Tag names, which
+    are indexed whole.
+    """
+    return [name for name in tagnames.lower().split()
+            if len(name) <= MAX_TERM_LENGTH]
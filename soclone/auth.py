@@ -2,8 +2,14 @@
 Authorisation related functions.
 
 The actions a User is authorised to perform are dependent on their reputation
-and superuser status.
+and superuser status, which are reduced to a bitmask of privileges once per
+User object - and so once per request - or stored on the User when the
+STORE_USER_PRIVILEGES setting is enabled.
 """
+from django.conf import settings
+
+STORE_USER_PRIVILEGES = getattr(settings, 'STORE_USER_PRIVILEGES', False)
+
 VOTE_UP                   = 15
 FLAG_OFFENSIVE            = 15
 POST_IMAGES               = 15
@@ -18,66 +24,142 @@ VIEW_OFFENSIVE_FLAGS      = 2000
 CLOSE_OTHER_QUESTIONS     = 3000
 LOCK_POSTS                = 4000
 
+# Privilege bits
+VOTE_UP_PRIVILEGE                   = 1 << 0
+FLAG_OFFENSIVE_PRIVILEGE            = 1 << 1
+POST_IMAGES_PRIVILEGE               = 1 << 2
+LEAVE_COMMENTS_PRIVILEGE            = 1 << 3
+VOTE_DOWN_PRIVILEGE                 = 1 << 4
+CLOSE_OWN_QUESTIONS_PRIVILEGE       = 1 << 5
+RETAG_QUESTIONS_PRIVILEGE           = 1 << 6
+EDIT_COMMUNITY_WIKI_POSTS_PRIVILEGE = 1 << 7
+EDIT_OTHER_POSTS_PRIVILEGE          = 1 << 8
+DELETE_COMMENTS_PRIVILEGE           = 1 << 9
+VIEW_OFFENSIVE_FLAGS_PRIVILEGE      = 1 << 10
+CLOSE_OTHER_QUESTIONS_PRIVILEGE     = 1 << 11
+LOCK_POSTS_PRIVILEGE                = 1 << 12
+
+# Privileges granted by reputation thresholds, which superusers always have
+REPUTATION_PRIVILEGES = (
+    (VOTE_UP,                   VOTE_UP_PRIVILEGE),
+    (FLAG_OFFENSIVE,            FLAG_OFFENSIVE_PRIVILEGE),
+    (POST_IMAGES,               POST_IMAGES_PRIVILEGE),
+    (LEAVE_COMMENTS,            LEAVE_COMMENTS_PRIVILEGE),
+    (VOTE_DOWN,                 VOTE_DOWN_PRIVILEGE),
+    (CLOSE_OWN_QUESTIONS,       CLOSE_OWN_QUESTIONS_PRIVILEGE),
+    (EDIT_COMMUNITY_WIKI_POSTS, EDIT_COMMUNITY_WIKI_POSTS_PRIVILEGE),
+    (EDIT_OTHER_POSTS,          EDIT_OTHER_POSTS_PRIVILEGE),
+    (DELETE_COMMENTS,           DELETE_COMMENTS_PRIVILEGE),
+    (VIEW_OFFENSIVE_FLAGS,      VIEW_OFFENSIVE_FLAGS_PRIVILEGE),
+    (CLOSE_OTHER_QUESTIONS,     CLOSE_OTHER_QUESTIONS_PRIVILEGE),
+    (LOCK_POSTS,                LOCK_POSTS_PRIVILEGE),
+)
+SUPERUSER_PRIVILEGES = reduce(lambda a, b: a | b,
+                              [p for t, p in REPUTATION_PRIVILEGES])
+
+def calculate_privileges(reputation, is_superuser):
+    """
+    Calculates the privilege bitmask for a reputation score and superuser
+    status.
+
+    Retagging is only granted to Users who can't edit other posts, as
+    editing also allows retagging.
+    """
+    if is_superuser:
+        privileges = SUPERUSER_PRIVILEGES
+    else:
+        privileges = 0
+        for threshold, privilege in REPUTATION_PRIVILEGES:
+            if reputation >= threshold:
+                privileges |= privilege
+    if RETAG_OTHER_QUESTIONS <= reputation < EDIT_OTHER_POSTS:
+        privileges |= RETAG_QUESTIONS_PRIVILEGE
+    return privileges
+
+def privileges_sql():
+    """
+    Creates an SQL expression which calculates the privilege bitmask from
+    the ``reputation`` and ``is_superuser`` columns of ``auth_user``, in
+    the same way as ``calculate_privileges``.
+    """
+    retag = ('CASE WHEN reputation >= %s AND reputation < %s THEN %s '
+             'ELSE 0 END' % (RETAG_OTHER_QUESTIONS, EDIT_OTHER_POSTS,
+                             RETAG_QUESTIONS_PRIVILEGE))
+    reputation_privileges = ' + '.join([
+        'CASE WHEN reputation >= %s THEN %s ELSE 0 END' % (threshold,
+                                                           privilege)
+        for threshold, privilege in REPUTATION_PRIVILEGES])
+    return 'CASE WHEN is_superuser THEN %s ELSE %s END + %s' % (
+        SUPERUSER_PRIVILEGES, reputation_privileges, retag)
+
+def get_privileges(user):
+    """
+    Retrieves the privilege bitmask for a User, which is calculated once
+    and cached on the User object.
+    """
+    if not user.is_authenticated():
+        return 0
+    try:
+        return user._privileges
+    except AttributeError:
+        if STORE_USER_PRIVILEGES:
+            user._privileges = user.privileges
+        else:
+            user._privileges = calculate_privileges(user.reputation,
+                                                    user.is_superuser)
+        return user._privileges
+
+def has_privilege(user, privilege):
+    """Determines if a User has the given privilege bit."""
+    return bool(get_privileges(user) & privilege)
+
 def can_vote_up(user):
     """Determines if a User can vote Questions and Answers up."""
-    return user.is_authenticated() and (
-        user.reputation >= VOTE_UP or
-        user.is_superuser)
+    return has_privilege(user, VOTE_UP_PRIVILEGE)
 
 def can_flag_offensive(user):
     """Determines if a User can flag Questions and Answers as offensive."""
-    return user.is_authenticated() and (
-        user.reputation >= FLAG_OFFENSIVE or
-        user.is_superuser)
+    return has_privilege(user, FLAG_OFFENSIVE_PRIVILEGE)
 
 def can_add_comments(user):
     """Determines if a User can add comments to Questions and Answers."""
-    return user.is_authenticated() and (
-        user.reputation >= LEAVE_COMMENTS or
-        user.is_superuser)
+    return has_privilege(user, LEAVE_COMMENTS_PRIVILEGE)
 
 def can_vote_down(user):
     """Determines if a User can vote Questions and Answers down."""
-    return user.is_authenticated() and (
-        user.reputation >= VOTE_DOWN or
-        user.is_superuser)
+    return has_privilege(user, VOTE_DOWN_PRIVILEGE)
 
 def can_retag_questions(user):
     """Determines if a User can retag Questions."""
-    return user.is_authenticated() and (
-        RETAG_OTHER_QUESTIONS <= user.reputation < EDIT_OTHER_POSTS)
+    return has_privilege(user, RETAG_QUESTIONS_PRIVILEGE)
 
 def can_edit_post(user, post):
     """Determines if a User can edit the given Question or Answer."""
+    privileges = get_privileges(user)
     return user.is_authenticated() and (
         user.id == post.author_id or
-        (post.wiki and user.reputation >= EDIT_COMMUNITY_WIKI_POSTS) or
-        user.reputation >= EDIT_OTHER_POSTS or
-        user.is_superuser)
+        (post.wiki and
+         privileges & EDIT_COMMUNITY_WIKI_POSTS_PRIVILEGE != 0) or
+        privileges & EDIT_OTHER_POSTS_PRIVILEGE != 0)
 
 def can_delete_comment(user, comment):
     """Determines if a User can delete the given Comment."""
     return user.is_authenticated() and (
         user.id == comment.user_id or
-        user.reputation >= DELETE_COMMENTS or
-        user.is_superuser)
+        has_privilege(user, DELETE_COMMENTS_PRIVILEGE))
 
 def can_view_offensive_flags(user):
     """Determines if a User can view offensive flag counts."""
-    return user.is_authenticated() and (
-        user.reputation >= VIEW_OFFENSIVE_FLAGS or
-        user.is_superuser)
+    return has_privilege(user, VIEW_OFFENSIVE_FLAGS_PRIVILEGE)
 
 def can_close_question(user, question):
     """Determines if a User can close the given Question."""
+    privileges = get_privileges(user)
     return user.is_authenticated() and (
         (user.id == question.author_id and
-         user.reputation >= CLOSE_OWN_QUESTIONS) or
-        user.reputation >= CLOSE_OTHER_QUESTIONS or
-        user.is_superuser)
+         privileges & CLOSE_OWN_QUESTIONS_PRIVILEGE != 0) or
+        privileges & CLOSE_OTHER_QUESTIONS_PRIVILEGE != 0)
 
 def can_lock_posts(user):
     """Determines if a User can lock Questions or Answers."""
-    return user.is_authenticated() and (
-        user.reputation >= LOCK_POSTS or
-        user.is_superuser)
+    return has_privilege(user, LOCK_POSTS_PRIVILEGE)
@@ -0,0 +1,79 @@
+"""
+Compares soclone.diff.html_diff with lxml's htmldiff on pairs of
+consecutive Question and Answer revisions from the database.
+
+If the database has no revisions, pairs are generated by making random
+edits to generated posts.
+
+Usage: python benchmark-diff.py [maximum number of revision pairs]
+"""
+import random
+import sys
+import time
+
+from lxml.html.diff import htmldiff
+
+from soclone import diff
+from soclone import markup
+from soclone.models import AnswerRevision, QuestionRevision
+
+def revision_pairs(model, post_attr, limit):
+    """Yields HTML for up to ``limit`` pairs of consecutive revisions."""
+    post_id_attr = '%s_id' % post_attr
+    previous = None
+    count = 0
+    for revision in model.objects.order_by(post_attr, 'revision').iterator():
+        if (previous is not None and
+            getattr(previous, post_id_attr) == getattr(revision, post_id_attr)):
+            yield previous.as_html(), revision.as_html()
+            count += 1
+            if count == limit:
+                return
+        previous = revision
+
+def generated_pairs(count, seed=0):
+    """Yields HTML for pairs of generated posts and edited versions."""
+    rand = random.Random(seed)
+    words = (u'the quick brown fox jumps over lazy dog *with* `code` and '
+             u'[links](http://example.com/)').split()
+    for i in xrange(count):
+        paragraphs = [u' '.join(rand.choice(words)
+                                for j in xrange(rand.randint(10, 60)))
+                      for j in xrange(rand.randint(2, 30))]
+        text = u'\n\n'.join(paragraphs)
+        for j in xrange(rand.randint(1, 5)):
+            k = rand.randrange(len(paragraphs))
+            paragraphs[k] = u'%s %s' % (paragraphs[k], rand.choice(words))
+        if rand.random() < 0.3:
+            paragraphs.insert(rand.randrange(len(paragraphs)),
+                              u'    def added_code():\n        pass')
+        yield markup.render(text), markup.render(u'\n\n'.join(paragraphs))
+
+def time_diffs(pairs, diff_function):
+    start = time.time()
+    for old_html, new_html in pairs:
+        diff_function(old_html, new_html)
+    return time.time() - start
+
+def main(limit):
+    pairs = (list(revision_pairs(QuestionRevision, 'question', limit)) +
+             list(revision_pairs(AnswerRevision, 'answer', limit)))
+    if not pairs:
+        print 'No revision pairs found - using generated pairs'
+        pairs = list(generated_pairs(min(limit, 200)))
+
+    fallbacks = len([1 for old_html, new_html in pairs
+                     if diff.diff_tokens(
+                         diff.comparison_keys(diff.tokenize_html(old_html)),
+                         diff.comparison_keys(diff.tokenize_html(new_html)))
+                     is None])
+    print '%s revision pairs, %s fall back to htmldiff' % (len(pairs),
+                                                           fallbacks)
+    htmldiff_time = time_diffs(pairs, htmldiff)
+    html_diff_time = time_diffs(pairs, diff.html_diff)
+    print 'htmldiff:  %.2f ms per pair' % (htmldiff_time * 1000 / len(pairs))
+    print 'html_diff: %.2f ms per pair (%.1fx faster)' % (
+        html_diff_time * 1000 / len(pairs), htmldiff_time / html_diff_time)
+
+if __name__ == '__main__':
+    main(len(sys.argv) > 1 and int(sys.argv[1]) or 1000)
@@ -0,0 +1,123 @@
+"""
+Compares retrieving pages of question lists as full Question instances
+with retrieving them as ``QuestionRow`` objects holding only the fields
+each view displays.
+
+For each view and page size, the data transferred from the database (as
+the total size of the column values fetched), the memory allocated for
+the page's objects and the time taken to retrieve a page are measured.
+
+If the database has fewer than the given number of Questions, realistic
+Questions are generated in a transaction which is rolled back afterwards.
+
+Usage: python benchmark-question-lists.py [number of questions]
+"""
+import datetime
+import random
+import sys
+import time
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+
+from soclone.models import Question
+from soclone.pagination import KeysetPaginator
+from soclone.questions import all_question_views
+
+PAGE_SIZES = (10, 50)
+REPEAT = 20
+
+def generate_questions(rand, count):
+    words = (u'the quick brown fox jumps over lazy dog with code and links '
+             u'python django list query template cache').split()
+    tags = (u'python django sql javascript css html jquery linux windows '
+            u'c java ruby').split()
+    user = User.objects.create_user('benchmark-question-lists',
+                                    'benchmark@example.com', 'benchmark')
+    now = datetime.datetime.now()
+    for i in xrange(count):
+        paragraphs = [u' '.join(rand.choice(words)
+                                for j in xrange(rand.randint(20, 80)))
+                      for k in xrange(rand.randint(2, 10))]
+        added_at = now - datetime.timedelta(minutes=rand.randint(0, 500000))
+        Question(title=u' '.join(rand.choice(words)
+                                 for j in xrange(rand.randint(5, 15))),
+                 author=user, added_at=added_at, last_activity_by=user,
+                 last_activity_at=added_at,
+                 tagnames=u' '.join(rand.sample(tags, rand.randint(1, 5))),
+                 summary=paragraphs[0][:180],
+                 html=u''.join(u'<p>%s</p>' % p for p in paragraphs),
+                 score=rand.randint(-2, 30),
+                 answer_count=rand.randint(0, 5),
+                 view_count=rand.randint(0, 5000)).save()
+
+def value_size(value):
+    """Approximates the size of a column value transferred as text."""
+    if value is None:
+        return 0
+    if isinstance(value, unicode):
+        return len(value.encode('utf-8'))
+    return len(str(value))
+
+def object_size(obj):
+    """
+    Calculates the memory used by an object, its attribute dict or slots
+    and its attribute values, counting shared values each time.
+    """
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        values = obj.__dict__.values()
+        size += sys.getsizeof(obj.__dict__)
+        if hasattr(obj, '_state'):
+            size += (sys.getsizeof(obj._state) +
+                     sys.getsizeof(obj._state.__dict__))
+    else:
+        values = [getattr(obj, slot) for slot in obj.__slots__
+                  if hasattr(obj, slot)]
+    return size + sum(sys.getsizeof(value) for value in values)
+
+def transferred(queryset):
+    """Totals the size of the column values fetched by a QuerySet."""
+    sql, params = queryset.query.get_compiler(queryset.db).as_sql()
+    cursor = connection.cursor()
+    cursor.execute(sql, params)
+    return sum(value_size(value) for row in cursor.fetchall()
+               for value in row)
+
+def benchmark_view(view, per_page):
+    results = []
+    for name, paginator in (
+            ('Question', KeysetPaginator(view.get_queryset(), view.ordering,
+                                         per_page)),
+            ('QuestionRow', view.get_paginator(per_page))):
+        queryset = paginator.object_list[:per_page]
+        size = transferred(queryset)
+        start = time.time()
+        for i in xrange(REPEAT):
+            objects = paginator.page(1).object_list
+        elapsed = (time.time() - start) / REPEAT
+        allocated = sum(object_size(obj) for obj in objects)
+        results.append((name, size, allocated, elapsed))
+    print '%s, %s per page:' % (view.id, per_page)
+    for name, size, allocated, elapsed in results:
+        print ('  %-11s %8s bytes transferred, %8s bytes allocated, '
+               '%.3f ms' % (name, size, allocated, elapsed * 1000))
+    print '  QuestionRow transfers %.1f%% and allocates %.1f%% as much' % (
+        results[1][1] * 100.0 / max(results[0][1], 1),
+        results[1][2] * 100.0 / max(results[0][2], 1))
+
+@transaction.commit_manually
+def main(count):
+    try:
+        existing = Question.objects.count()
+        if existing < count:
+            print 'Generating %s questions' % (count - existing)
+            generate_questions(random.Random(0), count - existing)
+        for view in all_question_views:
+            for per_page in PAGE_SIZES:
+                benchmark_view(view, per_page)
+    finally:
+        transaction.rollback()
+
+if __name__ == '__main__':
+    main(len(sys.argv) > 1 and int(sys.argv[1]) or 500)
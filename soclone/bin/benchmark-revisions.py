@@ -0,0 +1,101 @@
+"""
+Measures storage used and reconstruction latency for delta-compressed
+revision text.
+
+Chains of generated edits are encoded with a range of keyframe intervals
+to compare their size and the time taken to reconstruct every revision.
+If the database has revisions, the time taken to load the latest revision
+of each post and read its text is also measured, as stored.
+
+Usage: python benchmark-revisions.py [number of revisions per chain]
+"""
+import random
+import sys
+import time
+
+from soclone.diff import apply_text_delta, text_delta
+from soclone.models import AnswerRevision, QuestionRevision
+
+KEYFRAME_INTERVALS = (1, 5, 10, 20)
+
+def generate_chain(rand, length):
+    """Generates the text of ``length`` revisions of a post."""
+    words = (u'the quick brown fox jumps over lazy dog *with* `code` and '
+             u'[links](http://example.com/)').split()
+    paragraphs = [u' '.join(rand.choice(words)
+                            for j in xrange(rand.randint(10, 60)))
+                  for i in xrange(rand.randint(5, 30))]
+    chain = [u'\n\n'.join(paragraphs)]
+    for i in xrange(length - 1):
+        for j in xrange(rand.randint(1, 3)):
+            k = rand.randrange(len(paragraphs))
+            if rand.random() < 0.2:
+                paragraphs.insert(k, u'    def added_code():\n        pass')
+            else:
+                paragraphs[k] = u'%s %s' % (paragraphs[k], rand.choice(words))
+        chain.append(u'\n\n'.join(paragraphs))
+    return chain
+
+def encode_chain(chain, keyframe_interval):
+    """Encodes a chain as a list of ``(stored text, is delta)`` tuples."""
+    stored = [(chain[0], False)]
+    for i in xrange(1, len(chain)):
+        delta = None
+        if i % keyframe_interval:
+            delta = text_delta(chain[i - 1], chain[i])
+        if delta is not None and len(delta) < len(chain[i]):
+            stored.append((delta, True))
+        else:
+            stored.append((chain[i], False))
+    return stored
+
+def reconstruct(stored, index):
+    """Reconstructs the text at the given index of an encoded chain."""
+    start = index
+    while stored[start][1]:
+        start -= 1
+    text = stored[start][0]
+    for i in xrange(start + 1, index + 1):
+        text = apply_text_delta(text, stored[i][0])
+    return text
+
+def benchmark_chains(chains):
+    full_size = sum(len(text) for chain in chains for text in chain)
+    revisions = sum(len(chain) for chain in chains)
+    print '%s chains, %s revisions, %s characters stored in full' % (
+        len(chains), revisions, full_size)
+    for keyframe_interval in KEYFRAME_INTERVALS:
+        encoded = [encode_chain(chain, keyframe_interval) for chain in chains]
+        size = sum(len(text) for stored in encoded for text, d in stored)
+        start = time.time()
+        for chain, stored in zip(chains, encoded):
+            for i in xrange(len(chain)):
+                if reconstruct(stored, i) != chain[i]:
+                    raise AssertionError('Reconstruction failed')
+        elapsed = time.time() - start
+        print ('Keyframe every %2s: %5.1f%% of full size, %.3f ms per '
+               'reconstruction' % (keyframe_interval,
+                                   size * 100.0 / full_size,
+                                   elapsed * 1000 / revisions))
+
+def benchmark_database(model, post_attr):
+    """Times reading the text of the latest revision of every post."""
+    post_model = model._meta.get_field(post_attr).rel.to
+    post_ids = list(post_model._default_manager.values_list('id', flat=True))
+    if not post_ids:
+        return
+    start = time.time()
+    for post_id in post_ids:
+        model.objects.filter(**{post_attr: post_id})[0].text
+    elapsed = time.time() - start
+    print '%s: %.3f ms per latest revision text (%s posts)' % (
+        model.__name__, elapsed * 1000 / len(post_ids), len(post_ids))
+
+def main(length):
+    rand = random.Random(0)
+    benchmark_chains([generate_chain(rand, length) for i in xrange(50)])
+    benchmark_database(QuestionRevision, 'question')
+    benchmark_database(AnswerRevision, 'answer')
+
+if __name__ == '__main__':
+    main(len(sys.argv) > 1 and int(sys.argv[1]) or 40)
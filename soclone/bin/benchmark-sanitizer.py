@@ -0,0 +1,119 @@
+"""
+Compares streaming HTML sanitization with sanitization via a DOM.
+
+Output for every document in a corpus of generated posts is checked to be
+identical in both modes before latency and peak memory are measured on
+large answers.
+
+Usage: python benchmark-sanitizer.py [number of repetitions]
+"""
+import random
+import subprocess
+import sys
+import time
+
+import markdown2
+
+from soclone.utils.html import sanitize_html
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+MARKDOWN_BLOCKS = (
+    u'Some text with *emphasis*, **strong emphasis** and `inline <code>`.',
+    u'    def example(self):\n        return [x for x in range(10) if x < 5]\n'
+    u'    # <script>alert("&");</script>',
+    u'* First item\n* Second item with a [link](http://example.com/ "Title")\n'
+    u'    * Nested item',
+    u'1. One\n2. Two\n3. Three & four',
+    u'> A quoted paragraph\n> which continues here.',
+    u'## A heading\n\nA paragraph after it with <http://example.com/auto>.',
+    u'<div>Raw <b>HTML</b> with <span title="x">attributes</span></div>',
+    u'<p>Unclosed paragraph <p>and <b>misnested <i>tags</b></i>',
+    u'<table><tr><td>Table cell</td></tr></table>',
+    u'An image: ![alt text](/media/img/test.png)\n\n---',
+)
+
+def generate_post(rand, blocks):
+    """Generates Markdown for a post made up of random blocks."""
+    return u'\n\n'.join(rand.choice(MARKDOWN_BLOCKS) for i in xrange(blocks))
+
+def generate_corpus(seed=0):
+    """Generates rendered HTML for posts of varying sizes."""
+    rand = random.Random(seed)
+    markdowner = markdown2.Markdown(html4tags=True)
+    corpus = [markdowner.convert(block) for block in MARKDOWN_BLOCKS]
+    corpus.extend(markdowner.convert(generate_post(rand, rand.randint(1, 20)))
+                  for i in xrange(500))
+    return corpus
+
+def generate_large_answers(seed=0, count=20):
+    """
+    Generates rendered HTML for large, well-formed answers, rendering each
+    block separately so list items don't swallow following code blocks.
+    """
+    rand = random.Random(seed)
+    markdowner = markdown2.Markdown(html4tags=True)
+    rendered = [markdowner.convert(block) for block
+                in MARKDOWN_BLOCKS[:7] + MARKDOWN_BLOCKS[9:]]
+    return [u'\n\n'.join(rand.choice(rendered) for i in xrange(400))
+            for i in xrange(count)]
+
+def check_corpus(corpus):
+    for html in corpus:
+        streamed = sanitize_html(html)
+        built = sanitize_html(html, streaming=False)
+        if streamed != built:
+            raise AssertionError('Output differs for %r:\n%r\n%r' % (
+                html, streamed, built))
+
+def time_sanitization(documents, streaming, repetitions):
+    """Returns the mean time taken to sanitize a document, in seconds."""
+    start = time.time()
+    for i in xrange(repetitions):
+        for html in documents:
+            sanitize_html(html, streaming=streaming)
+    return (time.time() - start) / (repetitions * len(documents))
+
+def peak_memory(streaming):
+    """
+    Returns the increase in peak resident memory, in kilobytes, caused by
+    sanitizing large answers in a fresh process.
+    """
+    output = subprocess.Popen([sys.executable, __file__, '--memory',
+                               streaming and 'streaming' or 'dom'],
+                              stdout=subprocess.PIPE).communicate()[0]
+    return int(output)
+
+def measure_memory(streaming):
+    documents = generate_large_answers()
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    for html in documents:
+        sanitize_html(html, streaming=streaming)
+    print resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before
+
+def main(repetitions):
+    corpus = generate_corpus()
+    check_corpus(corpus)
+    print 'Output identical for %s documents' % len(corpus)
+
+    documents = generate_large_answers()
+    print 'Large answers: %s, averaging %s characters' % (
+        len(documents), sum(len(html) for html in documents) / len(documents))
+    dom_time = time_sanitization(documents, False, repetitions)
+    streaming_time = time_sanitization(documents, True, repetitions)
+    print 'DOM:       %.2f ms per answer' % (dom_time * 1000)
+    print 'Streaming: %.2f ms per answer (%.0f%% less)' % (
+        streaming_time * 1000, (1 - streaming_time / dom_time) * 100)
+
+    if resource is not None:
+        print 'Peak memory increase - DOM: %s KB, streaming: %s KB' % (
+            peak_memory(False), peak_memory(True))
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3 and sys.argv[1] == '--memory':
+        measure_memory(sys.argv[2] == 'streaming')
+    else:
+        main(len(sys.argv) > 1 and int(sys.argv[1]) or 3)
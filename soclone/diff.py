@@ -1,4 +1,243 @@
+import re
+
 from django.template.defaultfilters import pluralize
+from django.utils import simplejson
+from lxml.html.diff import htmldiff
+
+# Diffs which need more edits than this are left to lxml's htmldiff
+MAX_EDITS = 1000
+
+html_token_re = re.compile(
+    r"""<(?:[^>"']|"[^"]*"|'[^']*')*>|[^\s<]+\s*|\s+""")
+tag_name_re = re.compile(r'</?([a-zA-Z0-9]+)')
+text_token_re = re.compile(r'\S+\s*|\s+')
+
+VOID_ELEMENTS = frozenset(('area', 'br', 'col', 'hr', 'img', 'input'))
+
+def tokenize_html(html):
+    """
+    Splits HTML into a list of tags, words with any trailing whitespace
+    and runs of whitespace which follow tags.
+    """
+    return html_token_re.findall(html)
+
+def comparison_keys(tokens):
+    """
+    Creates keys for comparing tokens, ignoring whitespace which trails
+    words so that unchanged words at the end of a line still match.
+    """
+    return [token.rstrip() or token for token in tokens]
+
+def diff_tokens(old, new, max_edits=MAX_EDITS):
+    """
+    Finds a shortest edit script between two token lists using Myers'
+    O(ND) algorithm, after trimming any common prefix and suffix.
+
+    Returns a list of ``(operation, i1, i2, j1, j2)`` tuples in the style
+    of ``difflib.SequenceMatcher.get_opcodes()``, where operation is one
+    of ``'equal'``, ``'delete'`` or ``'insert'``, or ``None`` if more than
+    ``max_edits`` insertions and deletions would be required.
+    """
+    n, m = len(old), len(new)
+    prefix = 0
+    while prefix < n and prefix < m and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    while (suffix < n - prefix and suffix < m - prefix and
+           old[n - suffix - 1] == new[m - suffix - 1]):
+        suffix += 1
+
+    edits = _myers(old[prefix:n - suffix], new[prefix:m - suffix], max_edits)
+    if edits is None:
+        return None
+
+    opcodes = []
+    if prefix:
+        opcodes.append(('equal', 0, prefix, 0, prefix))
+    for operation, i1, i2, j1, j2 in edits:
+        opcodes.append((operation, i1 + prefix, i2 + prefix,
+                        j1 + prefix, j2 + prefix))
+    if suffix:
+        opcodes.append(('equal', n - suffix, n, m - suffix, m))
+    return opcodes
+
+def _myers(a, b, max_edits):
+    """
+    Returns grouped edit operations for transforming ``a`` into ``b``, or
+    ``None`` if more than ``max_edits`` edits would be required.
+    """
+    n, m = len(a), len(b)
+    v = {1: 0}
+    trace = []
+    for d in xrange(min(n + m, max_edits) + 1):
+        trace.append(v.copy())
+        for k in xrange(-d, d + 1, 2):
+            if k == -d or (k != d and v[k - 1] < v[k + 1]):
+                x = v[k + 1]
+            else:
+                x = v[k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[k] = x
+            if x >= n and y >= m:
+                return _group_edits(_backtrack(trace, n, m))
+    return None
+
+def _backtrack(trace, x, y):
+    """
+    Walks back through the furthest reaching paths recorded for each edit
+    distance, yielding single-token operations from last to first.
+    """
+    for d in xrange(len(trace) - 1, -1, -1):
+        v = trace[d]
+        k = x - y
+        if k == -d or (k != d and v[k - 1] < v[k + 1]):
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = v[prev_k]
+        prev_y = prev_x - prev_k
+        while x > prev_x and y > prev_y:
+            x -= 1
+            y -= 1
+            yield 'equal', x, y
+        if d > 0:
+            if x == prev_x:
+                yield 'insert', x, prev_y
+            else:
+                yield 'delete', prev_x, y
+        x, y = prev_x, prev_y
+
+def _group_edits(edits):
+    """Groups single-token operations into runs of the same operation."""
+    groups = []
+    for operation, i, j in reversed(list(edits)):
+        i2, j2 = i, j
+        if operation in ('equal', 'delete'):
+            i2 += 1
+        if operation in ('equal', 'insert'):
+            j2 += 1
+        if groups and groups[-1][0] == operation:
+            groups[-1][2], groups[-1][4] = i2, j2
+        else:
+            groups.append([operation, i, i2, j, j2])
+    return [tuple(group) for group in groups]
+
+def _is_structural_tag(token):
+    """
+    Returns ``True`` if a token is a tag for a non-void element. Comments
+    and declarations such as ``<!DOCTYPE>`` aren't.
+    """
+    if not token.startswith('<'):
+        return False
+    match = tag_name_re.match(token)
+    return match is not None and match.group(1).lower() not in VOID_ELEMENTS
+
+def _mark_up(output, tokens, element, keep_tags):
+    """
+    Appends tokens to the output, wrapping runs of content in the given
+    element. Tags for non-void elements are never wrapped, so the markup
+    stays balanced - they're output when ``keep_tags`` is ``True`` and
+    dropped otherwise.
+    """
+    content = []
+    def flush():
+        if content:
+            text = u''.join(content)
+            if text.strip():
+                output.append(u'<%s>%s</%s>' % (element, text, element))
+            elif keep_tags:
+                output.append(text)
+            del content[:]
+    for token in tokens:
+        if _is_structural_tag(token):
+            flush()
+            if keep_tags:
+                output.append(token)
+        else:
+            content.append(token)
+    flush()
+
+def html_diff(old_html, new_html):
+    """
+    Generates HTML for ``new_html`` with differences from ``old_html``
+    marked up with ``<ins>`` and ``<del>`` elements.
+
+    Words, whitespace and tags are compared as tokens, with tags from
+    ``new_html`` kept intact. Heavily rewritten content falls back to
+    lxml's ``htmldiff``.
+    """
+    old_tokens = tokenize_html(old_html)
+    new_tokens = tokenize_html(new_html)
+    opcodes = diff_tokens(comparison_keys(old_tokens),
+                          comparison_keys(new_tokens))
+    if opcodes is None:
+        return htmldiff(old_html, new_html)
+    output = []
+    for operation, i1, i2, j1, j2 in opcodes:
+        if operation == 'equal':
+            output.extend(new_tokens[j1:j2])
+        elif operation == 'delete':
+            _mark_up(output, old_tokens[i1:i2], 'del', False)
+        else:
+            _mark_up(output, new_tokens[j1:j2], 'ins', True)
+    return u''.join(output)
+
+def text_changes(old_text, new_text):
+    """
+    Returns a two-tuple of the number of characters added and removed
+    between two versions of some text, compared word by word.
+    """
+    old_tokens = text_token_re.findall(old_text)
+    new_tokens = text_token_re.findall(new_text)
+    opcodes = diff_tokens(comparison_keys(old_tokens),
+                          comparison_keys(new_tokens))
+    if opcodes is None:
+        change = len(new_text) - len(old_text)
+        return max(change, 0), max(-change, 0)
+    added = removed = 0
+    for operation, i1, i2, j1, j2 in opcodes:
+        if operation == 'insert':
+            added += sum(len(token) for token in new_tokens[j1:j2])
+        elif operation == 'delete':
+            removed += sum(len(token) for token in old_tokens[i1:i2])
+    return added, removed
+
+def text_delta(old_text, new_text):
+    """
+    Creates a compact delta for producing ``new_text`` from ``old_text``,
+    or ``None`` if they differ too much for a delta to be worthwhile.
+
+    The delta is a JSON list of ``[start, length]`` pairs, which copy
+    characters from ``old_text``, and strings, which are inserted.
+    """
+    old_tokens = text_token_re.findall(old_text)
+    new_tokens = text_token_re.findall(new_text)
+    opcodes = diff_tokens(old_tokens, new_tokens)
+    if opcodes is None:
+        return None
+    offsets = [0]
+    for token in old_tokens:
+        offsets.append(offsets[-1] + len(token))
+    delta = []
+    for operation, i1, i2, j1, j2 in opcodes:
+        if operation == 'equal':
+            delta.append([offsets[i1], offsets[i2] - offsets[i1]])
+        elif operation == 'insert':
+            delta.append(u''.join(new_tokens[j1:j2]))
+    return simplejson.dumps(delta, separators=(',', ':'))
+
+def apply_text_delta(old_text, delta):
+    """Produces new text by applying a delta created by ``text_delta``."""
+    parts = []
+    for part in simplejson.loads(delta):
+        if isinstance(part, list):
+            parts.append(old_text[part[0]:part[0] + part[1]])
+        else:
+            parts.append(part)
+    return u''.join(parts)
 
 def generate_question_revision_summary(old_revision, new_revision, wikified):
     """
@@ -40,16 +279,18 @@ def _generate_body_summary(old_revision, new_revision):
     """
     summary = None
     if old_revision.text != new_revision.text:
-        change = len(new_revision.text) - len(old_revision.text)
-        if not change:
-            summary = u'modified body'
+        added, removed = text_changes(old_revision.text, new_revision.text)
+        changes = []
+        if added:
+            changes.append(u'added %s character%s to body' % (
+                added, pluralize(added)))
+        if removed:
+            changes.append(u'removed %s character%s from body' % (
+                removed, pluralize(removed)))
+        if changes:
+            summary = u', '.join(changes)
         else:
-            if change > 0:
-                body_summary = u'added %s character%s to body'
-            else:
-                body_summary = u'removed %s character%s from body'
-                change = change * -1
-            summary = body_summary % (change, pluralize(change))
+            summary = u'modified body'
     return summary
 
 def _generate_wikified_summary(wikified):
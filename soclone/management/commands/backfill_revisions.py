@@ -0,0 +1,60 @@
+"""
+Renders and stores HTML and diffs for revisions which were saved before
+they were denormalised.
+
+Each chunk of revisions is committed as it's completed and only revisions
+which haven't been rendered are processed, so the command can be stopped
+and run again to resume where it left off.
+"""
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+from django.db import transaction
+
+from soclone.models import AnswerRevision, QuestionRevision, render_revision
+
+class Command(NoArgsCommand):
+    help = 'Renders HTML and diffs for revisions which have none stored.'
+    option_list = NoArgsCommand.option_list + (
+        make_option('--chunk-size', action='store', type='int',
+                    dest='chunk_size', default=500,
+                    help='Number of revisions to process per transaction.'),
+    )
+
+    def handle_noargs(self, **options):
+        chunk_size = options['chunk_size']
+        verbosity = int(options.get('verbosity', 1))
+        for model, post_attr in ((QuestionRevision, 'question'),
+                                 (AnswerRevision, 'answer')):
+            total = 0
+            while True:
+                ids = list(model.objects.filter(html__isnull=True).order_by(
+                    post_attr, 'revision').values_list('id',
+                                                       flat=True)[:chunk_size])
+                if not ids:
+                    break
+                backfill_chunk(model, post_attr, ids)
+                total += len(ids)
+                if verbosity > 0:
+                    print '%s: rendered %s' % (model.__name__, total)
+
+@transaction.commit_on_success
+def backfill_chunk(model, post_attr, ids):
+    """
+    Renders the revisions with the given ids, looking up all revisions of
+    their posts in one query so previous revisions are available.
+    """
+    post_id_attr = '%s_id' % post_attr
+    revisions = list(model.objects.filter(id__in=ids))
+    post_ids = set(getattr(r, post_id_attr) for r in revisions)
+    all_revisions = dict(((getattr(r, post_id_attr), r.revision), r)
+        for r in model.objects.filter(**{'%s__in' % post_attr: post_ids}))
+    for revision in sorted(revisions, key=lambda r: r.revision):
+        previous_revision = all_revisions.get(
+            (getattr(revision, post_id_attr), revision.revision - 1))
+        render_revision(revision, previous_revision)
+        # Make rendered HTML available to later revisions of the same post
+        all_revisions[(getattr(revision, post_id_attr),
+                       revision.revision)] = revision
+        model.objects.filter(id=revision.id).update(html=revision.html,
+                                                    diff=revision.diff)
@@ -0,0 +1,43 @@
+"""
+Builds the MinHash signatures used to find similar Questions.
+
+Signatures are normally updated as Questions are saved, so this is only
+needed to populate them for an existing database, or after changing how
+they're made. Questions are processed in chunks ordered by id, with each
+chunk committed as it's completed.
+"""
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+from django.db import transaction
+
+from soclone.models import Question, QuestionSignature
+
+class Command(NoArgsCommand):
+    help = 'Builds the MinHash signatures used to find similar Questions.'
+    option_list = NoArgsCommand.option_list + (
+        make_option('--chunk-size', action='store', type='int',
+                    dest='chunk_size', default=500,
+                    help='Number of Questions to process per transaction.'),
+    )
+
+    def handle_noargs(self, **options):
+        chunk_size = options['chunk_size']
+        verbosity = int(options.get('verbosity', 1))
+        last_id = 0
+        total = 0
+        while True:
+            questions = list(Question.objects.filter(id__gt=last_id).order_by(
+                'id').only('id', 'title', 'deleted')[:chunk_size])
+            if not questions:
+                break
+            build_chunk(questions)
+            total += len(questions)
+            last_id = questions[-1].id
+            if verbosity > 0:
+                print 'Processed %s questions' % total
+
+@transaction.commit_on_success
+def build_chunk(questions):
+    for question in questions:
+        QuestionSignature.objects.update_question(question)
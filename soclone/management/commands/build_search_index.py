@@ -0,0 +1,98 @@
+"""
+Builds the search index for existing Questions and their Answers.
+
+Questions are normally indexed as they and their Answers are saved, so this
+is only needed to populate the index for an existing database, or after
+changing how text is analysed. Questions whose text hasn't changed since
+they were indexed are skipped unless ``--force`` is given, which clears
+the index first, so an interrupted build can be resumed.
+
+Chunks of Questions, ordered by id, are indexed by a pool of worker
+processes, each using its own database connection, committing each chunk
+as it's completed and writing it to the index as a new segment. Segments
+aren't merged until every chunk has been indexed, when they're merged into
+one.
+"""
+import multiprocessing
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+from django.db import connection, transaction
+
+from soclone.models import Question, SearchDocument
+from soclone.segments import segment_index
+
+class Command(NoArgsCommand):
+    help = 'Builds the search index for existing Questions.'
+    option_list = NoArgsCommand.option_list + (
+        make_option('--chunk-size', action='store', type='int',
+                    dest='chunk_size', default=1000,
+                    help='Number of Questions to index per transaction.'),
+        make_option('--processes', action='store', type='int',
+                    dest='processes', default=multiprocessing.cpu_count(),
+                    help='Number of worker processes to index with.'),
+        make_option('--force', action='store_true', dest='force',
+                    default=False,
+                    help='Reindex Questions which are already indexed.'),
+    )
+
+    def handle_noargs(self, **options):
+        chunk_size = options['chunk_size']
+        verbosity = int(options.get('verbosity', 1))
+        force = options['force']
+        if force:
+            clear_index()
+        chunks = list(get_chunks(chunk_size))
+        # Workers must not share the connection opened to find chunks
+        connection.close()
+        pool = multiprocessing.Pool(max(options['processes'], 1),
+                                    initializer=init_worker)
+        total = indexed = 0
+        try:
+            for chunk_total, chunk_indexed in pool.imap_unordered(
+                    index_chunk, [(first_id, last_id, force)
+                                  for first_id, last_id in chunks]):
+                total += chunk_total
+                indexed += chunk_indexed
+                if verbosity > 0:
+                    print 'Processed %s questions, indexed %s' % (total,
+                                                                  indexed)
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+        if verbosity > 0:
+            print 'Merging segments'
+        segment_index.merge(optimize=True)
+
+def init_worker():
+    connection.close()
+    segment_index.auto_merge = False
+
+def clear_index():
+    cursor = connection.cursor()
+    cursor.execute('DELETE FROM soclone_searchdocument')
+    transaction.commit_unless_managed()
+    segment_index.clear()
+
+def get_chunks(chunk_size):
+    """Yields the first and last ids of chunks of Questions."""
+    last_id = 0
+    while True:
+        ids = list(Question.objects.filter(id__gt=last_id).order_by(
+            'id').values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            break
+        yield ids[0], ids[-1]
+        last_id = ids[-1]
+
+@transaction.commit_on_success
+def index_questions(question_ids, force):
+    return SearchDocument.objects.index_questions(question_ids, force)
+
+def index_chunk((first_id, last_id, force)):
+    question_ids = list(Question.objects.filter(
+        id__gte=first_id, id__lte=last_id).values_list('id', flat=True))
+    return len(question_ids), index_questions(question_ids, force)
@@ -0,0 +1,92 @@
+"""
+Converts the stored text of existing revisions to a revision storage mode,
+storing full keyframes and deltas against preceding revisions for
+``delta`` storage and full text for every revision for ``full`` storage.
+
+Posts are processed in chunks ordered by id, with each chunk committed as
+it's completed and only one post's revisions held in memory at a time.
+Converting is idempotent, so the command can be stopped and run again.
+"""
+from optparse import make_option
+
+from django.core.management.base import CommandError, NoArgsCommand
+from django.db import transaction
+
+from soclone.diff import apply_text_delta
+from soclone.models import (REVISION_KEYFRAME_INTERVAL, REVISION_STORAGE,
+    AnswerRevision, QuestionRevision, encode_revision_text)
+
+class Command(NoArgsCommand):
+    help = 'Converts stored revision text to a revision storage mode.'
+    option_list = NoArgsCommand.option_list + (
+        make_option('--storage', action='store', dest='storage',
+                    default=REVISION_STORAGE,
+                    help="Storage mode to convert to - 'full' or 'delta'. "
+                         "Defaults to the REVISION_STORAGE setting."),
+        make_option('--keyframe-interval', action='store', type='int',
+                    dest='keyframe_interval',
+                    default=REVISION_KEYFRAME_INTERVAL,
+                    help='Number of revisions per keyframe for delta '
+                         'storage.'),
+        make_option('--chunk-size', action='store', type='int',
+                    dest='chunk_size', default=100,
+                    help='Number of posts to process per transaction.'),
+    )
+
+    def handle_noargs(self, **options):
+        storage = options['storage']
+        if storage not in ('full', 'delta'):
+            raise CommandError("Storage must be 'full' or 'delta'.")
+        keyframe_interval = options['keyframe_interval']
+        if keyframe_interval < 1:
+            raise CommandError('Keyframe interval must be at least 1.')
+        chunk_size = options['chunk_size']
+        verbosity = int(options.get('verbosity', 1))
+        for model, post_attr in ((QuestionRevision, 'question'),
+                                 (AnswerRevision, 'answer')):
+            post_model = model._meta.get_field(post_attr).rel.to
+            last_id = 0
+            posts = converted = 0
+            while True:
+                post_ids = list(post_model._default_manager.filter(
+                    id__gt=last_id).order_by('id').values_list(
+                    'id', flat=True)[:chunk_size])
+                if not post_ids:
+                    break
+                converted += convert_chunk(model, post_attr, post_ids,
+                                           storage, keyframe_interval)
+                posts += len(post_ids)
+                last_id = post_ids[-1]
+                if verbosity > 0:
+                    print '%s: %s posts processed, %s revisions converted' % (
+                        model.__name__, posts, converted)
+
+@transaction.commit_on_success
+def convert_chunk(model, post_attr, post_ids, storage, keyframe_interval):
+    """
+    Re-encodes the text of all revisions of the posts with the given ids,
+    returning the number of revisions whose stored text changed.
+    """
+    post_id_attr = '%s_id' % post_attr
+    previous = None
+    converted = 0
+    for revision in model.objects.filter(**{
+            '%s__in' % post_attr: post_ids}).order_by(
+            post_attr, 'revision').iterator():
+        if (previous is not None and
+            getattr(previous, post_id_attr) != getattr(revision,
+                                                       post_id_attr)):
+            previous = None
+        # Reconstruct text from the previous revision rather than letting
+        # each delta look up its keyframe.
+        if revision.is_delta:
+            revision._text_cache = apply_text_delta(previous.text,
+                                                    revision.stored_text)
+        stored = revision.stored_text, revision.is_delta
+        encode_revision_text(revision, previous, storage, keyframe_interval)
+        if (revision.stored_text, revision.is_delta) != stored:
+            model.objects.filter(id=revision.id).update(
+                stored_text=revision.stored_text, is_delta=revision.is_delta)
+            converted += 1
+        previous = revision
+    return converted
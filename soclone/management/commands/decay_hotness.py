@@ -0,0 +1,60 @@
+"""
+Recalculates hotness scores which have decayed since they were stored.
+
+Questions which were active within the decay window are rescored, along
+with any Questions outside it which still have a hotness score above the
+floor, which are those last rescored while inside it. Questions are
+processed in chunks, with each chunk committed as it's completed. This
+should be run regularly - every few minutes - to keep the hot tab fresh.
+"""
+import datetime
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import NoArgsCommand
+from django.db import transaction
+
+from soclone.models import Question
+
+class Command(NoArgsCommand):
+    help = 'Recalculates decayed hotness scores for recently active Questions.'
+    option_list = NoArgsCommand.option_list + (
+        make_option('--window', action='store', type='float', dest='window',
+                    default=getattr(settings, 'HOTNESS_DECAY_WINDOW', 48),
+                    help='Rescore Questions active within this many hours. '
+                         'Defaults to the HOTNESS_DECAY_WINDOW setting.'),
+        make_option('--floor', action='store', type='float', dest='floor',
+                    default=getattr(settings, 'HOTNESS_DECAY_FLOOR', 0.01),
+                    help='Rescore inactive Questions with hotness above '
+                         'this. Defaults to the HOTNESS_DECAY_FLOOR setting.'),
+        make_option('--chunk-size', action='store', type='int',
+                    dest='chunk_size', default=1000,
+                    help='Number of Questions to process per transaction.'),
+    )
+
+    def handle_noargs(self, **options):
+        chunk_size = options['chunk_size']
+        verbosity = int(options.get('verbosity', 1))
+        now = datetime.datetime.now()
+        cutoff = now - datetime.timedelta(hours=options['window'])
+        total = 0
+        for questions in (
+                Question.objects.filter(last_activity_at__gte=cutoff),
+                Question.objects.filter(last_activity_at__lt=cutoff,
+                                        hotness__gt=options['floor'])):
+            last_id = 0
+            while True:
+                question_ids = list(questions.filter(
+                    id__gt=last_id).order_by('id').values_list(
+                    'id', flat=True)[:chunk_size])
+                if not question_ids:
+                    break
+                decay_chunk(question_ids, now)
+                total += len(question_ids)
+                last_id = question_ids[-1]
+        if verbosity > 0:
+            print 'Rescored %s questions' % total
+
+@transaction.commit_on_success
+def decay_chunk(question_ids, now):
+    Question.objects.update_hotness(question_ids, now)
@@ -0,0 +1,40 @@
+"""
+Applies journalled changes to denormalised counts, which are recorded
+instead of recalculating counts when COUNTER_WRITE_BEHIND is enabled.
+
+Processes flush the journal as they add to it and periodically from a
+background thread, so this command should be run regularly, or left
+running with ``--interval``, to apply changes left waiting by processes
+which have exited. It should also be run after disabling
+COUNTER_WRITE_BEHIND.
+"""
+from optparse import make_option
+import time
+
+from django.core.management.base import NoArgsCommand
+
+from soclone.models import COUNTER_FLUSH_BATCH_SIZE, flush_counter_changes
+
+class Command(NoArgsCommand):
+    help = 'Applies journalled changes to denormalised counts.'
+    option_list = NoArgsCommand.option_list + (
+        make_option('--interval', action='store', type='float',
+                    dest='interval', default=None,
+                    help='Keep running, flushing every INTERVAL seconds.'),
+    )
+
+    def handle_noargs(self, **options):
+        interval = options['interval']
+        verbosity = int(options.get('verbosity', 1))
+        while True:
+            total = 0
+            while True:
+                applied = flush_counter_changes()
+                total += applied
+                if applied < COUNTER_FLUSH_BATCH_SIZE:
+                    break
+            if verbosity > 0 and (total or interval is None):
+                print 'Applied %s counter changes' % total
+            if interval is None:
+                break
+            time.sleep(interval)
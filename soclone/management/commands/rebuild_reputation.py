@@ -0,0 +1,125 @@
+"""
+Rebuilds every User's reputation score from the reputation ledger.
+
+The ledger is streamed in User order and replayed the same way it was
+applied - events recorded in the same batch are coalesced, with scores
+never going below 1. Events recorded before batches were stored are
+coalesced by timestamp instead. Users with no events are reset to 1, so
+this should only be run once the ledger covers all reputation changes.
+Scores are written in chunks of Users, with each chunk committed as it's
+completed.
+
+Accepting your own Answer used to be recorded in the ledger, so those
+events are removed before the ledger is replayed.
+"""
+from optparse import make_option
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import NoArgsCommand
+from django.db import transaction
+from django.db.models import F
+
+from soclone import auth
+from soclone.models import Answer, ReputationEvent
+
+class Command(NoArgsCommand):
+    help = "Rebuilds every User's reputation score from the ledger."
+    option_list = NoArgsCommand.option_list + (
+        make_option('--chunk-size', action='store', type='int',
+                    dest='chunk_size', default=500,
+                    help='Number of Users to update per transaction.'),
+    )
+
+    def handle_noargs(self, **options):
+        chunk_size = options['chunk_size']
+        verbosity = int(options.get('verbosity', 1))
+        removed = remove_self_acceptance_events()
+        if verbosity > 0:
+            print 'Removed %s self-acceptance reputation events' % removed
+        reset = reset_users_without_events()
+        if verbosity > 0:
+            print 'Reset %s users with no reputation events' % reset
+
+        reputations = {}
+        updated = 0
+        for user_id, reputation in replay_ledger():
+            reputations[user_id] = reputation
+            if len(reputations) == chunk_size:
+                updated += update_chunk(reputations)
+                reputations = {}
+        if reputations:
+            updated += update_chunk(reputations)
+        if verbosity > 0:
+            print 'Updated %s users from the ledger' % updated
+
+def replay_ledger():
+    """
+    Yields two-tuples of (User id, reputation score) calculated by
+    replaying the ledger.
+    """
+    events = ReputationEvent.objects.order_by(
+        'user', 'created_at', 'batch', 'id').values_list(
+        'user', 'created_at', 'batch', 'change').iterator()
+    user_id = batch = None
+    reputation = change = 0
+    for event_user_id, event_created_at, event_batch, event_change in events:
+        # Separate batches may share a timestamp, while events recorded
+        # before batches were stored only have a timestamp.
+        event_batch = (event_created_at, event_batch)
+        if event_user_id == user_id and event_batch == batch:
+            change += event_change
+            continue
+        if user_id is not None:
+            reputation = max(1, reputation + change)
+            if event_user_id != user_id:
+                yield user_id, reputation
+        if event_user_id != user_id:
+            reputation = 1
+        user_id, batch, change = event_user_id, event_batch, event_change
+    if user_id is not None:
+        yield user_id, max(1, reputation + change)
+
+@transaction.commit_on_success
+def remove_self_acceptance_events():
+    """
+    Removes events for Users accepting their own Answers, which no longer
+    affects reputation, returning the number removed.
+    """
+    events = ReputationEvent.objects.filter(
+        reason__in=(ReputationEvent.ANSWER_ACCEPTED,
+                    ReputationEvent.ACCEPTED_ANSWER),
+        content_type=ContentType.objects.get_for_model(Answer),
+        object_id__in=Answer.objects.filter(
+            author=F('question__author')).values('id'))
+    removed = events.count()
+    events.delete()
+    return removed
+
+@transaction.commit_on_success
+def reset_users_without_events():
+    users = User.objects.filter(reputation_events__isnull=True).exclude(
+        reputation=1)
+    if auth.STORE_USER_PRIVILEGES:
+        user_ids = list(users.values_list('id', flat=True))
+        User.objects.filter(id__in=user_ids).update(reputation=1)
+        User.objects.refresh_privileges(user_ids)
+        return len(user_ids)
+    return users.update(reputation=1)
+
+@transaction.commit_on_success
+def update_chunk(reputations):
+    """
+    Updates the Users whose reputation scores differ from those given,
+    returning the number updated.
+    """
+    updated = []
+    for user_id, reputation in User.objects.filter(
+            id__in=reputations.keys()).values_list('id', 'reputation'):
+        if reputation != reputations[user_id]:
+            User.objects.filter(id=user_id).update(
+                reputation=reputations[user_id])
+            updated.append(user_id)
+    if updated and auth.STORE_USER_PRIVILEGES:
+        User.objects.refresh_privileges(updated)
+    return len(updated)
@@ -0,0 +1,58 @@
+"""
+Rebuilds Tag co-occurrence counts from scratch.
+
+Co-occurrence counts are normally kept up to date by applying changes as
+Questions are tagged, retagged and deleted, so this is only needed to
+correct any drift or to populate the counts for an existing database, and
+is best run off-peak. Tags are processed in chunks ordered by id, with the
+counts for each chunk deleted and recounted from the Question-Tag table in
+a transaction which is committed as it's completed.
+"""
+from optparse import make_option
+
+from django.core.cache import cache
+from django.core.management.base import NoArgsCommand
+from django.db import connection, transaction
+
+from soclone.models import RELATED_TAGS_KEY, Tag
+
+class Command(NoArgsCommand):
+    help = 'Rebuilds Tag co-occurrence counts from scratch.'
+    option_list = NoArgsCommand.option_list + (
+        make_option('--chunk-size', action='store', type='int',
+                    dest='chunk_size', default=100,
+                    help='Number of Tags to process per transaction.'),
+    )
+
+    def handle_noargs(self, **options):
+        chunk_size = options['chunk_size']
+        verbosity = int(options.get('verbosity', 1))
+        last_id = 0
+        total = 0
+        while True:
+            ids = list(Tag.objects.filter(id__gt=last_id).order_by(
+                'id').values_list('id', flat=True)[:chunk_size])
+            if not ids:
+                break
+            rebuild_chunk(last_id + 1, ids[-1])
+            cache.delete_many([RELATED_TAGS_KEY % tag_id for tag_id in ids])
+            total += len(ids)
+            last_id = ids[-1]
+            if verbosity > 0:
+                print 'Rebuilt co-occurrences for %s tags' % total
+
+@transaction.commit_on_success
+def rebuild_chunk(first_id, last_id):
+    cursor = connection.cursor()
+    cursor.execute(
+        'DELETE FROM soclone_tagcooccurrence '
+        'WHERE tag_id BETWEEN %s AND %s', [first_id, last_id])
+    cursor.execute(
+        'INSERT INTO soclone_tagcooccurrence '
+        '(tag_id, related_tag_id, question_count) '
+        'SELECT a.tag_id, b.tag_id, COUNT(*) '
+        'FROM soclone_question_tags a '
+        'INNER JOIN soclone_question_tags b '
+        'ON b.question_id = a.question_id AND b.tag_id <> a.tag_id '
+        'WHERE a.tag_id BETWEEN %s AND %s '
+        'GROUP BY a.tag_id, b.tag_id', [first_id, last_id])
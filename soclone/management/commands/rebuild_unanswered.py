@@ -0,0 +1,46 @@
+"""
+Recalculates which Questions are unanswered.
+
+Questions are normally flagged as answered when one of their Answers is
+accepted or upvoted, and as unanswered again when that's undone, so this
+is only needed if Answers or Votes have been changed without sending
+signals, or to populate the flag for an existing database. Questions are
+processed in chunks ordered by id, with each chunk committed as it's
+completed, and the count of unanswered Questions is updated as flags
+change.
+"""
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+from django.db import transaction
+
+from soclone.models import Question, invalidate_question_lists
+
+class Command(NoArgsCommand):
+    help = 'Recalculates which Questions are unanswered.'
+    option_list = NoArgsCommand.option_list + (
+        make_option('--chunk-size', action='store', type='int',
+                    dest='chunk_size', default=500,
+                    help='Number of Questions to process per transaction.'),
+    )
+
+    def handle_noargs(self, **options):
+        chunk_size = options['chunk_size']
+        verbosity = int(options.get('verbosity', 1))
+        last_id = 0
+        total = 0
+        while True:
+            ids = list(Question.objects.filter(id__gt=last_id).order_by(
+                'id').values_list('id', flat=True)[:chunk_size])
+            if not ids:
+                break
+            update_chunk(ids)
+            total += len(ids)
+            last_id = ids[-1]
+            if verbosity > 0:
+                print 'Processed %s questions' % total
+        invalidate_question_lists()
+
+@transaction.commit_on_success
+def update_chunk(question_ids):
+    Question.objects.update_unanswered(question_ids)
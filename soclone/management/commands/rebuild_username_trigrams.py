@@ -0,0 +1,44 @@
+"""
+Rebuilds the trigram index used to filter Users by username.
+
+Trigrams are normally indexed as Users are saved, so this is only needed
+for Users created or renamed without sending signals, or to populate the
+index for an existing database. Users are processed in chunks ordered by
+id, with each chunk committed as it's completed.
+"""
+from optparse import make_option
+
+from django.contrib.auth.models import User
+from django.core.management.base import NoArgsCommand
+from django.db import transaction
+
+from soclone.models import UsernameTrigram
+
+class Command(NoArgsCommand):
+    help = 'Rebuilds the trigram index used to filter Users by username.'
+    option_list = NoArgsCommand.option_list + (
+        make_option('--chunk-size', action='store', type='int',
+                    dest='chunk_size', default=500,
+                    help='Number of Users to process per transaction.'),
+    )
+
+    def handle_noargs(self, **options):
+        chunk_size = options['chunk_size']
+        verbosity = int(options.get('verbosity', 1))
+        last_id = 0
+        total = 0
+        while True:
+            users = list(User.objects.filter(id__gt=last_id).order_by(
+                'id').only('id', 'username')[:chunk_size])
+            if not users:
+                break
+            rebuild_chunk(users)
+            total += len(users)
+            last_id = users[-1].id
+            if verbosity > 0:
+                print 'Indexed %s users' % total
+
+@transaction.commit_on_success
+def rebuild_chunk(users):
+    for user in users:
+        UsernameTrigram.objects.update_user(user)
@@ -0,0 +1,42 @@
+"""
+Recalculates Tag use counts from scratch.
+
+Use counts are normally kept up to date by applying changes as Questions
+are tagged, retagged and deleted, so this is only needed to correct any
+drift and is best run off-peak. Tags are processed in chunks ordered by
+id, with each chunk committed as it's completed.
+"""
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+from django.db import transaction
+
+from soclone.models import Tag
+
+class Command(NoArgsCommand):
+    help = 'Recalculates Tag use counts from scratch.'
+    option_list = NoArgsCommand.option_list + (
+        make_option('--chunk-size', action='store', type='int',
+                    dest='chunk_size', default=100,
+                    help='Number of Tags to process per transaction.'),
+    )
+
+    def handle_noargs(self, **options):
+        chunk_size = options['chunk_size']
+        verbosity = int(options.get('verbosity', 1))
+        last_id = 0
+        total = 0
+        while True:
+            tags = list(Tag.objects.filter(id__gt=last_id).order_by(
+                'id').only('id')[:chunk_size])
+            if not tags:
+                break
+            recount_chunk(tags)
+            total += len(tags)
+            last_id = tags[-1].id
+            if verbosity > 0:
+                print 'Recounted %s tags' % total
+
+@transaction.commit_on_success
+def recount_chunk(tags):
+    Tag.objects.update_use_counts(tags)
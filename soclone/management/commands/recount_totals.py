@@ -0,0 +1,25 @@
+"""
+Recalculates maintained Totals by counting the rows they represent.
+
+Totals are normally kept up to date by applying changes as rows are
+created and deleted, so this is only needed to correct any drift, such as
+after rows have been deleted without sending signals.
+"""
+from django.core.management.base import NoArgsCommand
+from django.db import transaction
+
+from soclone.models import Total, TOTAL_QUERYSETS
+
+class Command(NoArgsCommand):
+    help = 'Recalculates maintained Totals by counting rows.'
+
+    def handle_noargs(self, **options):
+        verbosity = int(options.get('verbosity', 1))
+        for name in sorted(TOTAL_QUERYSETS):
+            value = recount_total(name)
+            if verbosity > 0:
+                print '%s: %s' % (name, value)
+
+@transaction.commit_on_success
+def recount_total(name):
+    return Total.objects.recalculate(name)
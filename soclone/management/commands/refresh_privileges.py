@@ -0,0 +1,40 @@
+"""
+Recalculates the privilege bitmasks stored on Users, which should be done
+when enabling STORE_USER_PRIVILEGES or changing privilege thresholds.
+
+Users are processed in chunks ordered by id, with each chunk committed as
+it's completed.
+"""
+from optparse import make_option
+
+from django.contrib.auth.models import User
+from django.core.management.base import NoArgsCommand
+from django.db import transaction
+
+class Command(NoArgsCommand):
+    help = 'Recalculates the privilege bitmasks stored on Users.'
+    option_list = NoArgsCommand.option_list + (
+        make_option('--chunk-size', action='store', type='int',
+                    dest='chunk_size', default=500,
+                    help='Number of Users to process per transaction.'),
+    )
+
+    def handle_noargs(self, **options):
+        chunk_size = options['chunk_size']
+        verbosity = int(options.get('verbosity', 1))
+        last_id = 0
+        total = 0
+        while True:
+            user_ids = list(User.objects.filter(id__gt=last_id).order_by(
+                'id').values_list('id', flat=True)[:chunk_size])
+            if not user_ids:
+                break
+            refresh_chunk(user_ids)
+            total += len(user_ids)
+            last_id = user_ids[-1]
+            if verbosity > 0:
+                print 'Refreshed privileges for %s users' % total
+
+@transaction.commit_on_success
+def refresh_chunk(user_ids):
+    User.objects.refresh_privileges(user_ids)
@@ -0,0 +1,57 @@
+"""
+Recalculates Question and Answer scores from their votes.
+
+Scores are normally kept up to date by applying the change made by each
+vote, so this is only needed if votes have been changed without sending
+signals or scores have otherwise drifted. Posts are processed in chunks of
+ids, with each chunk committed as it's completed.
+"""
+from optparse import make_option
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import NoArgsCommand
+from django.db import connection, transaction
+
+from soclone.models import Answer, Question
+
+class Command(NoArgsCommand):
+    help = 'Recalculates Question and Answer scores from their votes.'
+    option_list = NoArgsCommand.option_list + (
+        make_option('--chunk-size', action='store', type='int',
+                    dest='chunk_size', default=1000,
+                    help='Number of posts to process per transaction.'),
+    )
+
+    def handle_noargs(self, **options):
+        chunk_size = options['chunk_size']
+        verbosity = int(options.get('verbosity', 1))
+        for model in (Question, Answer):
+            last_id = 0
+            total = 0
+            while True:
+                ids = list(model._default_manager.filter(
+                    id__gt=last_id).order_by('id').values_list(
+                    'id', flat=True)[:chunk_size])
+                if not ids:
+                    break
+                repair_chunk(model, ids[0], ids[-1])
+                total += len(ids)
+                last_id = ids[-1]
+                if verbosity > 0:
+                    print '%s: recalculated %s scores' % (model.__name__,
+                                                          total)
+
+@transaction.commit_on_success
+def repair_chunk(model, first_id, last_id):
+    """Recalculates scores for posts with ids in the given range."""
+    cursor = connection.cursor()
+    cursor.execute(
+        'UPDATE %(post_table)s SET score = ('
+            'SELECT COALESCE(SUM(vote), 0) from soclone_vote '
+            'WHERE soclone_vote.content_type_id = %%s '
+              'AND soclone_vote.object_id = %(post_table)s.id'
+        ') '
+        'WHERE id BETWEEN %%s AND %%s' % {
+            'post_table': model._meta.db_table,
+        }, [ContentType.objects.get_for_model(model).id, first_id, last_id])
+    transaction.commit_unless_managed()
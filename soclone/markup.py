@@ -0,0 +1,47 @@
+"""
+Conversion of Markdown-formatted user input into sanitised HTML.
+
+Rendered HTML is cached using a hash of the Markdown source, so text which
+is previewed repeatedly, or old revisions which never change, are only
+rendered once.
+"""
+import hashlib
+
+import markdown2
+from django.conf import settings
+
+from soclone.utils.cache import get_cache
+from soclone.utils.html import WHITELIST_VERSION, sanitize_html
+
+markdowner = markdown2.Markdown(html4tags=True)
+
+RENDER_CACHE_KEY_PREFIX = 'soclone.markup.%s.%s' % (
+    getattr(markdown2, '__version__', ''), WHITELIST_VERSION)
+
+render_cache = get_cache(
+    getattr(settings, 'RENDER_CACHE_BACKEND', 'tiered'), {
+        'max_entries': getattr(settings, 'RENDER_CACHE_MAX_ENTRIES', 1000),
+        'max_size': getattr(settings, 'RENDER_CACHE_MAX_SIZE', 4194304),
+        'timeout': getattr(settings, 'RENDER_CACHE_TIMEOUT', 86400),
+    })
+
+def render_cache_key(text):
+    """
+    Creates a render cache key for the given Markdown source, which also
+    identifies the Markdown and sanitizer versions used to render it.
+    """
+    return '%s.%s' % (RENDER_CACHE_KEY_PREFIX,
+                      hashlib.sha1(text.encode('utf-8')).hexdigest())
+
+def markdown_to_html(text):
+    """Converts Markdown to sanitised HTML without using the cache."""
+    return sanitize_html(markdowner.convert(text))
+
+def render(text):
+    """Converts Markdown to sanitised HTML, using the render cache."""
+    key = render_cache_key(text)
+    html = render_cache.get(key)
+    if html is None:
+        html = markdown_to_html(text)
+        render_cache.set(key, html)
+    return html
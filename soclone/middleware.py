@@ -0,0 +1,16 @@
+"""SOClone middleware."""
+from soclone.models import flush_search_updates
+
+class SearchUpdateMiddleware(object):
+    """
+    Applies search index updates which were queued while a managed
+    transaction was in progress, once the view has returned and its
+    transaction has been committed or rolled back.
+
+    This should be listed before any middleware which manages
+    transactions, such as ``TransactionMiddleware``, so it sees their
+    outcome.
+    """
+    def process_response(self, request, response):
+        flush_search_updates()
+        return response
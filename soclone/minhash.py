@@ -0,0 +1,85 @@
+"""
+MinHash signatures for finding near-duplicate Questions.
+
+A Question's title is broken into shingles - each term and each pair of
+adjacent terms - and summarised as a signature holding, for each of a fixed
+set of hash functions, the lowest hash of any shingle. The proportion of
+positions at which two signatures agree estimates the Jaccard similarity of
+the two sets of shingles.
+
+For locality-sensitive hashing, signatures are split into ``BANDS`` bands
+of ``BAND_ROWS`` positions, each hashed to a single bucket. Two texts share
+at least one bucket with probability ``1 - (1 - s ** BAND_ROWS) ** BANDS``
+for similarity ``s``, which rises steeply around a similarity of
+``(1.0 / BANDS) ** (1.0 / BAND_ROWS)`` - around 0.37 - so looking up a
+text's buckets finds the similar texts without comparing it to every
+other.
+
+Changing any of these values, or how shingles are made, requires
+signatures to be rebuilt with the ``build_question_signatures`` command.
+"""
+import itertools
+import operator
+import random
+import struct
+import zlib
+
+from soclone.analysis import analyze
+
+BANDS = 20
+BAND_ROWS = 3
+SIGNATURE_LENGTH = BANDS * BAND_ROWS
+
+# Hash functions are of the form (a * x + b) mod PRIME, with coefficients
+# from a fixed seed so every process generates the same ones.
+PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+_random = random.Random(4096)
+COEFFICIENTS = [(_random.randint(1, PRIME - 1), _random.randint(0, PRIME - 1))
+                for i in xrange(SIGNATURE_LENGTH)]
+del _random
+
+SIGNATURE_FORMAT = struct.Struct('>%sI' % SIGNATURE_LENGTH)
+BAND_FORMAT = struct.Struct('>%sI' % BAND_ROWS)
+
+def get_shingles(text):
+    """Returns the set of shingles for some text."""
+    terms = analyze(text)
+    shingles = set(terms)
+    shingles.update([u'%s %s' % pair
+                     for pair in itertools.izip(terms, terms[1:])])
+    return shingles
+
+def get_signature(text):
+    """
+    Returns the MinHash signature for some text as a tuple of integers, or
+    ``None`` if it contains no terms.
+    """
+    hashes = [zlib.crc32(shingle.encode('utf-8')) & MAX_HASH
+              for shingle in get_shingles(text)]
+    if not hashes:
+        return None
+    return tuple([min([(a * x + b) % PRIME for x in hashes]) & MAX_HASH
+                  for a, b in COEFFICIENTS])
+
+def get_band_hashes(signature):
+    """
+    Returns a list of the buckets, as signed 32-bit integers, which each
+    band of a signature hashes to.
+    """
+    return [zlib.crc32(BAND_FORMAT.pack(
+                *signature[band * BAND_ROWS:(band + 1) * BAND_ROWS]))
+            for band in xrange(BANDS)]
+
+def estimate_similarity(signature, other_signature):
+    """Estimates the similarity of the texts two signatures were made from."""
+    return (sum(itertools.imap(operator.eq, signature, other_signature)) /
+            float(SIGNATURE_LENGTH))
+
+def encode_signature(signature):
+    """Encodes a signature as a string for storage."""
+    return SIGNATURE_FORMAT.pack(*signature).encode('hex')
+
+def decode_signature(data):
+    """Decodes a signature which was encoded with ``encode_signature``."""
+    return SIGNATURE_FORMAT.unpack(data.decode('hex'))
@@ -2,19 +2,35 @@
 import collections
 import datetime
 import hashlib
+import math
+import os
 import re
+import threading
+import time
 
+from django.conf import settings
 from django.contrib.auth.models import User, UserManager
 from django.contrib.contenttypes import generic
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
-from django.db import connection, models, transaction
+from django.db import IntegrityError, connection, models, transaction
 from django.db.models import Q
-from django.db.models.signals import post_delete, post_save, pre_save
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+    pre_save)
 from django.template.defaultfilters import slugify
 from django.utils import simplejson
-
-from soclone.utils.lists import flatten
+from django.utils.html import escape
+
+from soclone import auth
+from soclone import markup
+from soclone import minhash
+from soclone.analysis import (analyze, analyze_html, analyze_offsets,
+    analyze_tagnames, html_to_text)
+from soclone.diff import apply_text_delta, html_diff, text_delta
+from soclone.postings import tag_postings
+from soclone.segments import segment_index
+from soclone.tagindex import tag_index
 
 class TagManager(models.Manager):
     UPDATE_USE_COUNTS_QUERY = (
@@ -47,6 +63,20 @@ class TagManager(models.Manager):
         cursor.execute(query, [tag.id for tag in tags])
         transaction.commit_unless_managed()
 
+    def change_use_counts(self, tags, change):
+        """
+        Adds a change, such as ``1`` or ``-1``, to the use counts of the
+        given Tags in a single UPDATE.
+        """
+        if not tags:
+            return
+        cursor = connection.cursor()
+        cursor.execute(
+            'UPDATE soclone_tag SET use_count = use_count + %%s '
+            'WHERE id IN (%s)' % ','.join(['%s'] * len(tags)),
+            [change] + [tag.id for tag in tags])
+        transaction.commit_unless_managed()
+
 class Tag(models.Model):
     """A tag for Questions."""
     name       = models.CharField(max_length=24, unique=True)
@@ -65,6 +95,131 @@ class Tag(models.Model):
     def get_absolute_url(self):
         return reverse('tag', args=[self.name])
 
+def update_tag_index(instance, created, **kwargs):
+    """Makes new Tags available for autocompletion and filtering."""
+    if created:
+        tag_index.invalidate()
+
+post_save.connect(update_tag_index, sender=Tag)
+
+# Number of related Tags cached for each Tag
+RELATED_TAGS_COUNT = getattr(settings, 'RELATED_TAGS_COUNT', 10)
+RELATED_TAGS_CACHE_TIMEOUT = getattr(settings, 'RELATED_TAGS_CACHE_TIMEOUT',
+                                     60 * 60)
+RELATED_TAGS_KEY = 'soclone.related_tags.%s'
+
+class TagCooccurrenceManager(models.Manager):
+    def add_question(self, tags, added_tags):
+        """
+        Counts the co-occurrences of Tags added to a Question, given the
+        Tags the Question now has and those which were added.
+        """
+        self._change_counts(tags, added_tags, 1)
+
+    def remove_question(self, tags, removed_tags):
+        """
+        Stops counting the co-occurrences of Tags removed from a Question,
+        given the Tags the Question had and those which were removed.
+        """
+        self._change_counts(tags, removed_tags, -1)
+
+    def _change_counts(self, tags, changed_tags, change):
+        """
+        Applies a change to the counts for each pair of the given Tags
+        which includes at least one of the changed Tags, in both
+        directions, creating or deleting counts as necessary.
+        """
+        tag_ids = set(tag.id for tag in tags)
+        changed_ids = set(tag.id for tag in changed_tags)
+        pairs = set((tag_id, related_id)
+                    for tag_id in tag_ids for related_id in tag_ids
+                    if tag_id != related_id and
+                    (tag_id in changed_ids or related_id in changed_ids))
+        if not pairs:
+            return
+        existing = dict(((tag_id, related_id), cooccurrence_id)
+            for cooccurrence_id, tag_id, related_id in self.filter(
+                tag__in=tag_ids, related_tag__in=tag_ids).values_list(
+                'id', 'tag', 'related_tag'))
+        ids = [existing[pair] for pair in pairs if pair in existing]
+        if ids:
+            cursor = connection.cursor()
+            cursor.execute(
+                'UPDATE soclone_tagcooccurrence '
+                'SET question_count = question_count + %%s '
+                'WHERE id IN (%s)' % ','.join(['%s'] * len(ids)),
+                [change] + ids)
+            if change < 0:
+                self.filter(id__in=ids, question_count__lte=0).delete()
+        if change > 0:
+            for tag_id, related_id in pairs:
+                if (tag_id, related_id) in existing:
+                    continue
+                savepoint_id = transaction.savepoint()
+                try:
+                    self.create(tag_id=tag_id, related_tag_id=related_id,
+                                question_count=change)
+                except IntegrityError:
+                    # The count was created by a concurrent change since
+                    # existing counts were read.
+                    transaction.savepoint_rollback(savepoint_id)
+                    cursor = connection.cursor()
+                    cursor.execute(
+                        'UPDATE soclone_tagcooccurrence '
+                        'SET question_count = question_count + %s '
+                        'WHERE tag_id = %s AND related_tag_id = %s',
+                        [change, tag_id, related_id])
+                else:
+                    transaction.savepoint_commit(savepoint_id)
+        cache.delete_many([RELATED_TAGS_KEY % tag_id for tag_id in tag_ids])
+        transaction.commit_unless_managed()
+
+    def get_related_tags(self, tag):
+        """
+        Returns a list of up to ``RELATED_TAGS_COUNT`` two-tuples of (Tag
+        name, number of Questions), for the Tags which most often appear
+        on Questions with the given Tag, from the cache if possible.
+        """
+        key = RELATED_TAGS_KEY % tag.id
+        related_tags = cache.get(key)
+        if related_tags is None:
+            related_tags = list(self.filter(tag=tag).order_by(
+                '-question_count', 'related_tag__name').values_list(
+                'related_tag__name', 'question_count')[:RELATED_TAGS_COUNT])
+            cache.set(key, related_tags, RELATED_TAGS_CACHE_TIMEOUT)
+        return related_tags
+
+    def get_combined_related_tags(self, tags):
+        """
+        Combines the related Tags for each of the given Tags, excluding the
+        given Tags themselves, and returns the most common as for
+        ``get_related_tags``.
+        """
+        if len(tags) == 1:
+            return self.get_related_tags(tags[0])
+        names = set(tag.name for tag in tags)
+        counts = {}
+        for tag in tags:
+            for name, count in self.get_related_tags(tag):
+                if name not in names:
+                    counts[name] = counts.get(name, 0) + count
+        return sorted(counts.items(),
+                      key=lambda item: (-item[1], item[0]))[:RELATED_TAGS_COUNT]
+
+class TagCooccurrence(models.Model):
+    """
+    The number of Questions which have both a Tag and a related Tag. Counts
+    are stored in both directions.
+    """
+    tag            = models.ForeignKey(Tag, related_name='cooccurrences')
+    related_tag    = models.ForeignKey(Tag, related_name='related_cooccurrences')
+    question_count = models.PositiveIntegerField(default=0)
+
+    objects = TagCooccurrenceManager()
+
+    class Meta:
+        unique_together = ('tag', 'related_tag')
+
 class QuestionManager(models.Manager):
     def update_tags(self, question, tagnames, user):
         """
@@ -77,25 +232,95 @@ class QuestionManager(models.Manager):
         current_tags = list(question.tags.all())
         current_tagnames = set(t.name for t in current_tags)
         updated_tagnames = set(t for t in tagnames.split(' ') if t)
-        modified_tags = []
+        tags_updated = False
 
         removed_tags = [t for t in current_tags
                         if t.name not in updated_tagnames]
         if removed_tags:
-            modified_tags.extend(removed_tags)
             question.tags.remove(*removed_tags)
+            Tag.objects.change_use_counts(removed_tags, -1)
+            tag_postings.remove(question.id, [t.id for t in removed_tags])
+            TagCooccurrence.objects.remove_question(current_tags,
+                                                    removed_tags)
+            tags_updated = True
 
         added_tagnames = updated_tagnames - current_tagnames
         if added_tagnames:
             added_tags = Tag.objects.get_or_create_multiple(added_tagnames,
                                                             user)
-            modified_tags.extend(added_tags)
             question.tags.add(*added_tags)
+            Tag.objects.change_use_counts(added_tags, 1)
+            tag_postings.add(question.id, [t.id for t in added_tags])
+            TagCooccurrence.objects.add_question(
+                [t for t in current_tags if t.name in updated_tagnames] +
+                added_tags, added_tags)
+            tags_updated = True
 
-        if modified_tags:
-            Tag.objects.update_use_counts(modified_tags)
-            return True
+        return tags_updated
+
+    def set_hotness(self, hotnesses):
+        """
+        Stores hotness scores, specified as two-tuples of (Question id,
+        hotness), using one UPDATE for each batch of Questions.
+        """
+        cursor = connection.cursor()
+        for i in xrange(0, len(hotnesses), 250):
+            batch = hotnesses[i:i + 250]
+            cursor.execute(
+                'UPDATE soclone_question SET hotness = CASE %s END '
+                'WHERE id IN (%s)' % (
+                ' '.join(['WHEN id = %s THEN %s'] * len(batch)),
+                ','.join(['%s'] * len(batch))),
+                [value for pair in batch for value in pair] +
+                [question_id for question_id, hotness in batch])
+        transaction.commit_unless_managed()
+
+    def update_hotness(self, question_ids, now=None):
+        """
+        Recalculates and stores hotness scores for the Questions with the
+        given ids.
+        """
+        question_ids = list(question_ids)
+        for i in xrange(0, len(question_ids), 250):
+            self.set_hotness([
+                (question_id, calculate_hotness(score, answer_count,
+                    view_count, added_at, last_activity_at, now))
+                for (question_id, score, answer_count, view_count, added_at,
+                     last_activity_at) in self.filter(
+                    id__in=question_ids[i:i + 250]).values_list('id',
+                    'score', 'answer_count', 'view_count', 'added_at',
+                    'last_activity_at')])
+
+    def update_unanswered(self, question_ids):
+        """
+        Updates the ``unanswered`` flag for the Questions with the given
+        ids - a Question is unanswered until it has an accepted or upvoted
+        Answer - and the count of unanswered Questions.
 
+        Returns ``True`` if any flags were changed, ``False`` otherwise.
+        """
+        question_ids = list(question_ids)
+        if not question_ids:
+            return False
+        answered_ids = set(Answer.objects.filter(
+            Q(score__gt=0) | Q(accepted=True), question__in=question_ids,
+            deleted=False).values_list('question', flat=True))
+        now_answered = []
+        now_unanswered = []
+        for question_id, unanswered in self.filter(
+                id__in=question_ids).values_list('id', 'unanswered'):
+            if unanswered and question_id in answered_ids:
+                now_answered.append(question_id)
+            elif not unanswered and question_id not in answered_ids:
+                now_unanswered.append(question_id)
+        if now_answered:
+            self.filter(id__in=now_answered).update(unanswered=False)
+        if now_unanswered:
+            self.filter(id__in=now_unanswered).update(unanswered=True)
+        if now_answered or now_unanswered:
+            Total.objects.change_value('unanswered_questions',
+                                       len(now_unanswered) - len(now_answered))
+            return True
         return False
 
     def update_answer_count(self, question):
@@ -106,6 +331,28 @@ class QuestionManager(models.Manager):
         self.filter(id=question.id).update(
             answer_count=Answer.objects.for_question(question).count())
 
+# Hotness decays in proportion to the time since a Question was asked and
+# was last active, raised to this power.
+HOTNESS_GRAVITY = 1.5
+
+def _hours(timedelta):
+    return max(0, timedelta.days * 24 + timedelta.seconds / 3600.0)
+
+def calculate_hotness(score, answer_count, view_count, added_at,
+                      last_activity_at, now=None):
+    """
+    Calculates a Question's "hotness" from the interest shown in it through
+    views, answers and votes, decayed by its age and the time since it was
+    last active. Asking a Question counts as a little interest, so new
+    Questions are ordered by recency.
+    """
+    if now is None:
+        now = datetime.datetime.now()
+    interest = (1 + 4 * math.log10(view_count + 1) + 2 * answer_count +
+                score)
+    age = (_hours(now - added_at) + _hours(now - last_activity_at)) / 2
+    return interest / (age + 2) ** HOTNESS_GRAVITY
+
 class Question(models.Model):
     CLOSE_REASONS = (
         (1, u'Exact duplicate'),
@@ -121,7 +368,7 @@ class Question(models.Model):
     """A question."""
     title    = models.CharField(max_length=300)
     author   = models.ForeignKey(User, related_name='questions')
-    added_at = models.DateTimeField(default=datetime.datetime.now)
+    added_at = models.DateTimeField(default=datetime.datetime.now, db_index=True)
     tags     = models.ManyToManyField(Tag, related_name='questions')
     # Status
     wiki            = models.BooleanField(default=False)
@@ -138,7 +385,7 @@ class Question(models.Model):
     locked_by       = models.ForeignKey(User, null=True, blank=True, related_name='locked_questions')
     locked_at       = models.DateTimeField(null=True, blank=True)
     # Denormalised data
-    score                = models.IntegerField(default=0)
+    score                = models.IntegerField(default=0, db_index=True)
     answer_count         = models.PositiveIntegerField(default=0)
     comment_count        = models.PositiveIntegerField(default=0)
     view_count           = models.PositiveIntegerField(default=0)
@@ -146,8 +393,10 @@ class Question(models.Model):
     favourite_count      = models.PositiveIntegerField(default=0)
     last_edited_at       = models.DateTimeField(null=True, blank=True)
     last_edited_by       = models.ForeignKey(User, null=True, blank=True, related_name='last_edited_questions')
-    last_activity_at     = models.DateTimeField()
+    last_activity_at     = models.DateTimeField(db_index=True)
     last_activity_by     = models.ForeignKey(User, related_name='last_active_in_questions')
+    hotness              = models.FloatField(default=0, db_index=True)
+    unanswered           = models.BooleanField(default=True)
     tagnames             = models.CharField(max_length=125)
     summary              = models.CharField(max_length=180)
     html                 = models.TextField()
@@ -163,12 +412,16 @@ class Question(models.Model):
         adding and editing tags.
         """
         initial_addition = (self.id is None)
+        if initial_addition:
+            self.hotness = self.calculate_hotness()
         super(Question, self).save(**kwargs)
         if initial_addition:
             tags = Tag.objects.get_or_create_multiple(self.tagname_list(),
                                                       self.author)
             self.tags.add(*tags)
-            Tag.objects.update_use_counts(tags)
+            Tag.objects.change_use_counts(tags, 1)
+            tag_postings.add(self.id, [tag.id for tag in tags])
+            TagCooccurrence.objects.add_question(tags, tags)
 
     def __unicode__(self):
         return self.title
@@ -184,10 +437,274 @@ class Question(models.Model):
         """Convenience method to grab the latest revision."""
         return self.revisions.all()[0]
 
+    def calculate_hotness(self, now=None):
+        """Calculates this Question's hotness from its denormalised data."""
+        return calculate_hotness(self.score, self.answer_count,
+                                 self.view_count, self.added_at,
+                                 self.last_activity_at, now)
+
     def tagname_list(self):
         """Creates a list of Tag names from the ``tagnames`` attribute."""
         return [name for name in self.tagnames.split(u' ')]
 
+def remove_question_tag_use_counts(instance, **kwargs):
+    """
+    Removes a Question which is about to be deleted from the use counts and
+    posting lists of its Tags.
+    """
+    tags = list(instance.tags.all())
+    Tag.objects.change_use_counts(tags, -1)
+    tag_postings.remove(instance.id, [tag.id for tag in tags])
+    TagCooccurrence.objects.remove_question(tags, tags)
+
+pre_delete.connect(remove_question_tag_use_counts, sender=Question)
+
+class TotalManager(models.Manager):
+    def get_value(self, name):
+        """
+        Returns the value of a Total, calculating it if it hasn't been
+        stored yet.
+        """
+        try:
+            return self.get(name=name).value
+        except Total.DoesNotExist:
+            return self.recalculate(name)
+
+    def change_value(self, name, change):
+        """
+        Adds a change, such as ``1`` or ``-1``, to the value of a Total,
+        calculating it instead if it hasn't been stored yet.
+        """
+        cursor = connection.cursor()
+        cursor.execute(
+            'UPDATE soclone_total SET value = value + %s WHERE name = %s',
+            [change, name])
+        if not cursor.rowcount:
+            self.recalculate(name)
+        transaction.commit_unless_managed()
+
+    def recalculate(self, name):
+        """
+        Stores the value of a Total calculated by counting the rows it
+        represents, returning the value.
+        """
+        value = TOTAL_QUERYSETS[name]().count()
+        if not self.filter(name=name).update(value=value):
+            self.create(name=name, value=value)
+        return value
+
+class Total(models.Model):
+    """
+    A maintained count of the rows in a QuerySet, to avoid counting them
+    whenever a total is displayed.
+    """
+    name  = models.CharField(max_length=30, unique=True)
+    value = models.IntegerField(default=0)
+
+    objects = TotalManager()
+
+    def __unicode__(self):
+        return u'%s: %s' % (self.name, self.value)
+
+# Functions returning the QuerySets counted by each Total
+TOTAL_QUERYSETS = {
+    'questions': lambda: Question.objects.all(),
+    'unanswered_questions': lambda: Question.objects.filter(unanswered=True),
+}
+
+def add_question_to_totals(instance, created=False, **kwargs):
+    """Counts a newly created Question."""
+    if created:
+        Total.objects.change_value('questions', 1)
+        if instance.unanswered:
+            Total.objects.change_value('unanswered_questions', 1)
+
+# Ids of Questions being deleted by this process, which shouldn't be updated
+# as their Answers are deleted, mapped to whether they were unanswered
+_deleting_questions = {}
+
+def start_question_deletion(instance, **kwargs):
+    """
+    Records that a Question is being deleted, with whether it's unanswered.
+    The flag is read from the database, as ``update_unanswered`` may have
+    changed it since the instance was loaded.
+    """
+    _deleting_questions[instance.id] = bool(
+        Question.objects.filter(id=instance.id, unanswered=True).count())
+
+def remove_question_from_totals(instance, **kwargs):
+    """Stops counting a deleted Question."""
+    unanswered = _deleting_questions.pop(instance.id, instance.unanswered)
+    Total.objects.change_value('questions', -1)
+    if unanswered:
+        Total.objects.change_value('unanswered_questions', -1)
+
+post_save.connect(add_question_to_totals, sender=Question)
+pre_delete.connect(start_question_deletion, sender=Question)
+post_delete.connect(remove_question_from_totals, sender=Question)
+
+# Shared cache key for the generation of cached question list pages, which
+# is bumped whenever Questions see activity shown in lists.
+QUESTION_LIST_GENERATION_KEY = 'soclone.question_lists.generation'
+QUESTION_LIST_GENERATION_TIMEOUT = 60 * 60 * 24 * 30
+
+def get_question_list_generation():
+    """Returns the current generation of cached question list pages."""
+    generation = cache.get(QUESTION_LIST_GENERATION_KEY)
+    if generation is None:
+        # Start from the current time, so a generation which has been
+        # evicted isn't reused.
+        generation = int(time.time() * 1000)
+        cache.add(QUESTION_LIST_GENERATION_KEY, generation,
+                  QUESTION_LIST_GENERATION_TIMEOUT)
+    return generation
+
+def invalidate_question_lists(**kwargs):
+    """
+    Bumps the generation of cached question list pages. May be connected
+    to signals.
+    """
+    try:
+        cache.incr(QUESTION_LIST_GENERATION_KEY)
+    except ValueError:
+        cache.set(QUESTION_LIST_GENERATION_KEY, int(time.time() * 1000),
+                  QUESTION_LIST_GENERATION_TIMEOUT)
+
+post_save.connect(invalidate_question_lists, sender=Question)
+post_delete.connect(invalidate_question_lists, sender=Question)
+
+# Shared cache key for the generation of a Question's cached page, which is
+# bumped whenever anything displayed on the page changes.
+QUESTION_PAGE_GENERATION_KEY = 'soclone.question_pages.%s.generation'
+QUESTION_PAGE_GENERATION_TIMEOUT = 60 * 60 * 24
+
+def get_question_page_generation(question_id):
+    """Returns the current generation of a Question's cached page."""
+    key = QUESTION_PAGE_GENERATION_KEY % question_id
+    generation = cache.get(key)
+    if generation is None:
+        generation = int(time.time() * 1000)
+        cache.add(key, generation, QUESTION_PAGE_GENERATION_TIMEOUT)
+    return generation
+
+def invalidate_question_page(question_id):
+    """Bumps the generation of a Question's cached page."""
+    key = QUESTION_PAGE_GENERATION_KEY % question_id
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time() * 1000),
+                  QUESTION_PAGE_GENERATION_TIMEOUT)
+
+def invalidate_question_page_for_question(instance, **kwargs):
+    """Invalidates a Question's cached page when it changes."""
+    invalidate_question_page(instance.id)
+
+def invalidate_question_page_for_related(instance, **kwargs):
+    """
+    Invalidates the cached page of the Question an Answer or
+    FavouriteQuestion is related to when it changes.
+    """
+    invalidate_question_page(instance.question_id)
+
+def invalidate_question_page_for_post_related(instance, **kwargs):
+    """
+    Invalidates the cached page of the Question a Vote or Comment is
+    related to, directly or through one of its Answers, when it changes.
+    """
+    if (instance.content_type_id ==
+        ContentType.objects.get_for_model(Question).id):
+        invalidate_question_page(instance.object_id)
+    else:
+        for question_id in Answer.objects.filter(
+                id=instance.object_id).values_list('question', flat=True):
+            invalidate_question_page(question_id)
+
+post_save.connect(invalidate_question_page_for_question, sender=Question)
+post_delete.connect(invalidate_question_page_for_question, sender=Question)
+
+def render_revision(revision, previous_revision=None):
+    """
+    Sets the rendered ``html`` of the given QuestionRevision or
+    AnswerRevision and the ``diff`` between it and the previous revision,
+    if there is one.
+    """
+    revision.html = markup.render(revision.text)
+    if previous_revision is None:
+        revision.diff = revision.as_html()
+    else:
+        revision.diff = html_diff(previous_revision.as_html(),
+                                  revision.as_html())
+
+# Revision text storage - 'full' stores the text of every revision, while
+# 'delta' stores a full keyframe every REVISION_KEYFRAME_INTERVAL revisions
+# and deltas against the preceding revision in between.
+REVISION_STORAGE = getattr(settings, 'REVISION_STORAGE', 'full')
+REVISION_KEYFRAME_INTERVAL = getattr(settings, 'REVISION_KEYFRAME_INTERVAL',
+                                     10)
+
+def get_revision_text(revision):
+    """
+    Retrieves the full text of the given QuestionRevision or
+    AnswerRevision, reconstructing it from the preceding keyframe and
+    deltas if it was stored as a delta.
+    """
+    if not hasattr(revision, '_text_cache'):
+        if not revision.is_delta:
+            revision._text_cache = revision.stored_text
+        else:
+            # Walk back to the nearest keyframe, which needn't be where the
+            # current keyframe interval would put it.
+            stored = [revision.stored_text]
+            for stored_text, is_delta in revision.get_post_revisions().filter(
+                    revision__lt=revision.revision).order_by(
+                    '-revision').values_list('stored_text',
+                                             'is_delta').iterator():
+                stored.append(stored_text)
+                if not is_delta:
+                    break
+            text = stored.pop()
+            while stored:
+                text = apply_text_delta(text, stored.pop())
+            revision._text_cache = text
+    return revision._text_cache
+
+def set_revision_text(revision, text):
+    """
+    Sets the full text of the given QuestionRevision or AnswerRevision,
+    which will be stored as a keyframe or a delta when it's saved.
+    """
+    revision._text_cache = text
+    revision._text_changed = True
+    revision.stored_text = text
+    revision.is_delta = False
+
+def encode_revision_text(revision, previous_revision, storage=None,
+                         keyframe_interval=None):
+    """
+    Sets the stored form of a revision's text according to the given
+    storage mode and keyframe interval, which default to the
+    REVISION_STORAGE and REVISION_KEYFRAME_INTERVAL settings.
+
+    A delta is only stored if it's smaller than the text itself.
+    """
+    if storage is None:
+        storage = REVISION_STORAGE
+    if keyframe_interval is None:
+        keyframe_interval = REVISION_KEYFRAME_INTERVAL
+    text = revision.text
+    if (storage == 'delta' and previous_revision is not None and
+        (revision.revision - 1) % keyframe_interval):
+        delta = text_delta(previous_revision.text, text)
+        if delta is not None and len(delta) < len(text):
+            revision.stored_text, revision.is_delta = delta, True
+            return
+    revision.stored_text, revision.is_delta = text, False
+
+QUESTION_REVISION_TEMPLATE = ('<h1>%(title)s</h1>\n'
+    '<div class="text">%(html)s</div>\n'
+    '<div class="tags">%(tags)s</div>')
+
 class QuestionRevision(models.Model):
     """A revision of a Question."""
     question   = models.ForeignKey(Question, related_name='revisions')
@@ -197,22 +714,215 @@ class QuestionRevision(models.Model):
     revised_at = models.DateTimeField()
     tagnames   = models.CharField(max_length=125)
     summary    = models.CharField(max_length=300, blank=True)
-    text       = models.TextField()
+    # Full text, or a delta against the preceding revision - use ``text``
+    stored_text = models.TextField(db_column='text')
+    is_delta    = models.BooleanField(default=False)
+    # Denormalised data
+    html = models.TextField(null=True, blank=True)
+    diff = models.TextField(null=True, blank=True)
+
+    text = property(get_revision_text, set_revision_text)
 
     class Meta:
         ordering = ('-revision',)
 
     def save(self, **kwargs):
-        """Looks up the next available revision number."""
+        """
+        Looks up the next available revision number, renders the revision
+        and its diff against the previous revision if necessary and
+        stores new text as a keyframe or delta.
+        """
         if not self.revision:
             self.revision = QuestionRevision.objects.filter(
                 question=self.question).values_list('revision',
                                                     flat=True)[0] + 1
+        if self.html is None or getattr(self, '_text_changed', False):
+            previous_revision = self.get_previous_revision()
+            if self.html is None:
+                render_revision(self, previous_revision)
+            if getattr(self, '_text_changed', False):
+                encode_revision_text(self, previous_revision)
+                self._text_changed = False
         super(QuestionRevision, self).save(**kwargs)
 
     def __unicode__(self):
         return u'revision %s of %s' % (self.revision, self.title)
 
+    def get_post_revisions(self):
+        """Creates a QuerySet of all revisions of this revision's Question."""
+        return QuestionRevision.objects.filter(question=self.question_id)
+
+    def get_previous_revision(self):
+        """Retrieves the preceding revision, or ``None`` for the first."""
+        if self.revision == 1:
+            return None
+        return self.get_post_revisions().get(revision=self.revision - 1)
+
+    def as_html(self):
+        """Creates HTML displaying all revised details."""
+        if self.html is None:
+            html = markup.render(self.text)
+        else:
+            html = self.html
+        return QUESTION_REVISION_TEMPLATE % {
+            'title': escape(self.title),
+            'html': html,
+            'tags': ' '.join(['<a class="tag">%s</a>' % escape(tag)
+                              for tag in self.tagnames.split(' ')]),
+        }
+
+# Denormalised counts which may be journalled and applied in batches rather
+# than recalculated whenever a related object is saved or deleted.
+COUNTER_WRITE_BEHIND = getattr(settings, 'COUNTER_WRITE_BEHIND', False)
+COUNTER_FLUSH_INTERVAL = getattr(settings, 'COUNTER_FLUSH_INTERVAL', 5)
+COUNTER_FLUSH_THRESHOLD = getattr(settings, 'COUNTER_FLUSH_THRESHOLD', 100)
+# Maximum number of journal entries applied per transaction
+COUNTER_FLUSH_BATCH_SIZE = 500
+
+class CounterChange(models.Model):
+    """
+    A journalled change to a denormalised count for a Question or Answer,
+    waiting to be applied.
+    """
+    content_type = models.ForeignKey(ContentType)
+    object_id    = models.PositiveIntegerField()
+    counter      = models.CharField(max_length=30)
+    change       = models.SmallIntegerField()
+
+# Entries journalled by this process, when it last flushed the journal and
+# the id of the process its background flushing thread was started in
+_counter_journal_state = {'journalled': 0, 'flushed_at': time.time(),
+                          'pid': None}
+_counter_journal_lock = threading.Lock()
+
+def journal_counter_change(content_type_id, object_id, counter, signal_kwargs):
+    """
+    Journals the change in a count caused by the save or delete of a
+    related object, given the keyword arguments from its ``post_save`` or
+    ``post_delete`` signal.
+
+    The journal is flushed if this process has journalled enough changes
+    or hasn't flushed for long enough, unless a transaction is being
+    managed, to avoid holding post row locks for its duration. It's also
+    flushed every ``COUNTER_FLUSH_INTERVAL`` seconds from a background
+    thread, so changes aren't left waiting when no more are journalled.
+    """
+    if signal_kwargs['signal'] is post_delete:
+        change = -1
+    elif signal_kwargs.get('created', False):
+        change = 1
+    else:
+        return
+    CounterChange.objects.create(content_type_id=content_type_id,
+                                 object_id=object_id, counter=counter,
+                                 change=change)
+    start_counter_flushing()
+    state = _counter_journal_state
+    state['journalled'] += 1
+    if ((state['journalled'] >= COUNTER_FLUSH_THRESHOLD or
+         time.time() - state['flushed_at'] >= COUNTER_FLUSH_INTERVAL) and
+        not transaction.is_managed()):
+        state['journalled'] = 0
+        state['flushed_at'] = time.time()
+        while flush_counter_changes() == COUNTER_FLUSH_BATCH_SIZE:
+            pass
+
+def start_counter_flushing():
+    """
+    Starts the background thread which periodically flushes the counter
+    journal, if it isn't already running in this process.
+    """
+    state = _counter_journal_state
+    if state['pid'] == os.getpid():
+        return
+    _counter_journal_lock.acquire()
+    try:
+        if state['pid'] == os.getpid():
+            return
+        state['pid'] = os.getpid()
+    finally:
+        _counter_journal_lock.release()
+    thread = threading.Thread(target=run_counter_flushing)
+    thread.setDaemon(True)
+    thread.start()
+
+def run_counter_flushing():
+    while True:
+        time.sleep(COUNTER_FLUSH_INTERVAL)
+        try:
+            while flush_counter_changes() == COUNTER_FLUSH_BATCH_SIZE:
+                pass
+        except Exception:
+            # Changes remain journalled until the next attempt
+            pass
+        connection.close()
+
+@transaction.commit_manually
+def flush_counter_changes(batch_size=COUNTER_FLUSH_BATCH_SIZE):
+    """
+    Applies a batch of journalled count changes in a single transaction,
+    coalesced into one UPDATE per post, and returns the number of journal
+    entries applied.
+
+    Entries are claimed by deleting them before they're applied - if
+    another flush claimed any of them first, the batch is abandoned and
+    ``0`` is returned. Cached pages of the Questions whose counts, or whose
+    Answers' counts, were changed are invalidated once they're applied.
+    """
+    try:
+        changes = list(CounterChange.objects.order_by('id').values_list(
+            'id', 'content_type', 'object_id', 'counter',
+            'change')[:batch_size])
+        if not changes:
+            transaction.commit()
+            return 0
+
+        cursor = connection.cursor()
+        ids = [change[0] for change in changes]
+        cursor.execute('DELETE FROM soclone_counterchange WHERE id IN (%s)' %
+                       ', '.join(['%s'] * len(ids)), ids)
+        if cursor.rowcount != len(ids):
+            transaction.rollback()
+            return 0
+
+        post_changes = {}
+        for change_id, content_type_id, object_id, counter, change in changes:
+            counters = post_changes.setdefault((content_type_id, object_id),
+                                               {})
+            counters[counter] = counters.get(counter, 0) + change
+        for (content_type_id, object_id), counters in post_changes.items():
+            counters = [(counter, change)
+                        for counter, change in sorted(counters.items())
+                        if change]
+            if not counters:
+                continue
+            cursor.execute(
+                'UPDATE %(post_table)s SET %(updates)s WHERE id = %%s' % {
+                    'post_table': ContentType.objects.get_for_id(
+                        content_type_id).model_class()._meta.db_table,
+                    'updates': ', '.join(['%s = %s + %%s' % (counter, counter)
+                                          for counter, change in counters]),
+                }, [change for counter, change in counters] + [object_id])
+
+        question_ct_id = ContentType.objects.get_for_model(Question).id
+        question_ids = set()
+        answer_ids = []
+        for content_type_id, object_id in post_changes:
+            if content_type_id == question_ct_id:
+                question_ids.add(object_id)
+            else:
+                answer_ids.append(object_id)
+        if answer_ids:
+            question_ids.update(Answer.objects.filter(
+                id__in=answer_ids).values_list('question', flat=True))
+    except:
+        transaction.rollback()
+        raise
+    transaction.commit()
+    for question_id in question_ids:
+        invalidate_question_page(question_id)
+    return len(changes)
+
 class FavouriteQuestion(models.Model):
     """A favourite Question of a User."""
     question      = models.ForeignKey(Question)
@@ -226,6 +936,10 @@ def update_question_favourite_count(instance, **kwargs):
     """
     if kwargs.get('raw', False):
         return
+    if COUNTER_WRITE_BEHIND:
+        journal_counter_change(ContentType.objects.get_for_model(Question).id,
+                               instance.question_id, 'favourite_count', kwargs)
+        return
     cursor = connection.cursor()
     cursor.execute(
         'UPDATE soclone_question SET favourite_count = ('
@@ -237,6 +951,10 @@ def update_question_favourite_count(instance, **kwargs):
 
 post_save.connect(update_question_favourite_count, sender=FavouriteQuestion)
 post_delete.connect(update_question_favourite_count, sender=FavouriteQuestion)
+post_save.connect(invalidate_question_page_for_related,
+                  sender=FavouriteQuestion)
+post_delete.connect(invalidate_question_page_for_related,
+                    sender=FavouriteQuestion)
 
 class AnswerManager(models.Manager):
     def for_question(self, question, user=None):
@@ -277,10 +995,15 @@ class Answer(models.Model):
     def get_absolute_url(self):
         return reverse('answer', args=[self.id])
 
+    def get_revision_url(self):
+        return reverse('answer_revisions', args=[self.id])
+
     def get_latest_revision(self):
         """Convenience method to grab the latest revision."""
         return self.revisions.all()[0]
 
+ANSWER_REVISION_TEMPLATE = '<div class="text">%(html)s</div>'
+
 class AnswerRevision(models.Model):
     """A revision of an Answer."""
     answer     = models.ForeignKey(Answer, related_name='revisions')
@@ -288,19 +1011,55 @@ class AnswerRevision(models.Model):
     author     = models.ForeignKey(User, related_name='answer_revisions')
     revised_at = models.DateTimeField()
     summary    = models.CharField(max_length=300, blank=True)
-    text       = models.TextField()
+    # Full text, or a delta against the preceding revision - use ``text``
+    stored_text = models.TextField(db_column='text')
+    is_delta    = models.BooleanField(default=False)
+    # Denormalised data
+    html = models.TextField(null=True, blank=True)
+    diff = models.TextField(null=True, blank=True)
+
+    text = property(get_revision_text, set_revision_text)
 
     class Meta:
         ordering = ('-revision',)
 
     def save(self, **kwargs):
-        """Looks up the next available revision number if not set."""
+        """
+        Looks up the next available revision number if not set, renders
+        the revision and its diff against the previous revision if
+        necessary and stores new text as a keyframe or delta.
+        """
         if not self.revision:
             self.revision = AnswerRevision.objects.filter(
                 answer=self.answer).values_list('revision',
                                                 flat=True)[0] + 1
+        if self.html is None or getattr(self, '_text_changed', False):
+            previous_revision = self.get_previous_revision()
+            if self.html is None:
+                render_revision(self, previous_revision)
+            if getattr(self, '_text_changed', False):
+                encode_revision_text(self, previous_revision)
+                self._text_changed = False
         super(AnswerRevision, self).save(**kwargs)
 
+    def get_post_revisions(self):
+        """Creates a QuerySet of all revisions of this revision's Answer."""
+        return AnswerRevision.objects.filter(answer=self.answer_id)
+
+    def get_previous_revision(self):
+        """Retrieves the preceding revision, or ``None`` for the first."""
+        if self.revision == 1:
+            return None
+        return self.get_post_revisions().get(revision=self.revision - 1)
+
+    def as_html(self):
+        """Creates HTML displaying all revised details."""
+        if self.html is None:
+            html = markup.render(self.text)
+        else:
+            html = self.html
+        return ANSWER_REVISION_TEMPLATE % {'html': html}
+
 class VoteManager(models.Manager):
     def get_for_question_and_answers(self, user, question, answers):
         """
@@ -368,33 +1127,408 @@ class Vote(models.Model):
     class Meta:
         unique_together = ('content_type', 'object_id', 'user')
 
+    def __init__(self, *args, **kwargs):
+        super(Vote, self).__init__(*args, **kwargs)
+        # The value last saved, from which score changes are calculated
+        self._saved_vote = self.vote
+
     def is_upvote(self):
         return self.vote == self.VOTE_UP
 
     def is_downvote(self):
         return self.vote == self.VOTE_DOWN
 
-def update_post_score(instance, **kwargs):
+def change_post_score(vote, change):
     """
-    Updates the score for the Question or Answer related to the given
-    Vote.
+    Applies a change in score to the Question or Answer related to the
+    given Vote.
     """
-    if kwargs.get('raw', False):
+    if not change:
         return
     cursor = connection.cursor()
     cursor.execute(
-        'UPDATE %(post_table)s SET score = ('
-            'SELECT COALESCE(SUM(vote), 0) from soclone_vote '
-            'WHERE soclone_vote.content_type_id = %%s '
-              'AND soclone_vote.object_id = %(post_table)s.id'
-        ') '
-        'WHERE id = %%s' % {
-            'post_table': instance.content_type.model_class()._meta.db_table,
-        }, [instance.content_type_id, instance.object_id])
+        'UPDATE %(post_table)s SET score = score + %%s WHERE id = %%s' % {
+            'post_table': ContentType.objects.get_for_id(
+                vote.content_type_id).model_class()._meta.db_table,
+        }, [change, vote.object_id])
     transaction.commit_unless_managed()
 
+def update_post_score(instance, created=False, **kwargs):
+    """
+    Updates the score for the Question or Answer related to the given
+    Vote by the change in its value.
+    """
+    if kwargs.get('raw', False):
+        return
+    if created:
+        change_post_score(instance, instance.vote)
+    else:
+        change_post_score(instance, instance.vote - instance._saved_vote)
+    instance._saved_vote = instance.vote
+
+def remove_post_score(instance, **kwargs):
+    """
+    Removes a deleted Vote's value from the score for the Question or
+    Answer it was related to.
+    """
+    change_post_score(instance, -instance._saved_vote)
+
 post_save.connect(update_post_score, sender=Vote)
-post_delete.connect(update_post_score, sender=Vote)
+post_delete.connect(remove_post_score, sender=Vote)
+
+def invalidate_question_lists_for_vote(instance, **kwargs):
+    """
+    Invalidates cached question list pages when a Vote changes a
+    Question's score.
+    """
+    if (instance.content_type_id ==
+        ContentType.objects.get_for_model(Question).id):
+        invalidate_question_lists()
+
+post_save.connect(invalidate_question_lists_for_vote, sender=Vote)
+post_delete.connect(invalidate_question_lists_for_vote, sender=Vote)
+post_save.connect(invalidate_question_lists, sender=Answer)
+post_delete.connect(invalidate_question_lists, sender=Answer)
+post_save.connect(invalidate_question_page_for_post_related, sender=Vote)
+post_delete.connect(invalidate_question_page_for_post_related, sender=Vote)
+post_save.connect(invalidate_question_page_for_related, sender=Answer)
+post_delete.connect(invalidate_question_page_for_related, sender=Answer)
+
+def update_question_unanswered_for_vote(instance, **kwargs):
+    """
+    Updates whether a Question is unanswered when a Vote changes the score
+    of one of its Answers.
+    """
+    if (instance.content_type_id ==
+        ContentType.objects.get_for_model(Answer).id):
+        if Question.objects.update_unanswered(Answer.objects.filter(
+                id=instance.object_id).values_list('question', flat=True)):
+            invalidate_question_lists()
+
+def update_question_unanswered(instance, **kwargs):
+    """Updates whether a deleted Answer's Question is unanswered."""
+    if instance.question_id not in _deleting_questions:
+        Question.objects.update_unanswered([instance.question_id])
+
+post_save.connect(update_question_unanswered_for_vote, sender=Vote)
+post_delete.connect(update_question_unanswered_for_vote, sender=Vote)
+post_delete.connect(update_question_unanswered, sender=Answer)
+
+# Weights applied to the frequencies of terms in each part of a Question's
+# search document, relative to its body and Answers
+SEARCH_TITLE_WEIGHT = getattr(settings, 'SEARCH_TITLE_WEIGHT', 3)
+SEARCH_TAG_WEIGHT = getattr(settings, 'SEARCH_TAG_WEIGHT', 3)
+# Number of characters of each Question's body text stored in the search
+# index, with the positions of the terms in them, for building excerpts
+SEARCH_STORED_TEXT_LENGTH = getattr(settings, 'SEARCH_STORED_TEXT_LENGTH',
+                                    1000)
+
+class SearchDocumentManager(models.Manager):
+    def build_documents(self, question_ids):
+        """
+        Builds search documents for the given Questions from their title,
+        Tags, body and Answers, returning a dict of ``(checksum, term
+        frequencies, length, text, term positions)`` tuples keyed by
+        Question id, where ``text`` is the start of the Question's body
+        text and ``term positions`` holds the positions of the terms in
+        it. Deleted Questions and Answers aren't included.
+        """
+        answers = collections.defaultdict(list)
+        for question_id, html in Answer.objects.filter(
+                question__in=question_ids, deleted=False).order_by(
+                'id').values_list('question', 'html'):
+            answers[question_id].append(html)
+        documents = {}
+        for question_id, title, tagnames, html in Question.objects.filter(
+                id__in=question_ids, deleted=False).values_list(
+                'id', 'title', 'tagnames', 'html'):
+            checksum = hashlib.md5()
+            for text in [title, tagnames, html] + answers[question_id]:
+                checksum.update(text.encode('utf-8'))
+                checksum.update('\0')
+            text = html_to_text(html)
+            body_terms = analyze_offsets(text)
+            stored_text = text[:SEARCH_STORED_TEXT_LENGTH]
+            positions = collections.defaultdict(list)
+            for term, position in body_terms:
+                if position + len(term) > len(stored_text):
+                    break
+                positions[term].append(position)
+            parts = [(analyze(title), SEARCH_TITLE_WEIGHT),
+                     (analyze_tagnames(tagnames), SEARCH_TAG_WEIGHT),
+                     ([term for term, position in body_terms], 1)]
+            parts.extend([(analyze_html(answer), 1)
+                          for answer in answers[question_id]])
+            frequencies = collections.defaultdict(int)
+            length = 0
+            for terms, weight in parts:
+                for term in terms:
+                    frequencies[term] += weight
+                length += len(terms) * weight
+            documents[question_id] = (checksum.hexdigest(), frequencies,
+                                      length, stored_text, positions)
+        return documents
+
+    def index_questions(self, question_ids, force=False):
+        """
+        Indexes the given Questions for searching, replacing their existing
+        documents in the search index, and removes any which have been
+        deleted from the index. Unless ``force`` is ``True``, Questions
+        whose text hasn't changed since they were last indexed are skipped.
+
+        Segment files are written immediately and can't be rolled back, so
+        this should only be given committed changes - if a transaction
+        which called it is rolled back, the index will hold its content
+        until the Questions are reindexed or ``build_search_index`` is run.
+
+        Returns the number of Questions indexed.
+        """
+        question_ids = list(question_ids)
+        documents = self.build_documents(question_ids)
+        checksums = dict(self.filter(question__in=question_ids).values_list(
+            'question', 'checksum'))
+        removed_ids = [question_id for question_id in checksums
+                       if question_id not in documents]
+        if not force:
+            for question_id, checksum in checksums.items():
+                if (question_id in documents and
+                    documents[question_id][0] == checksum):
+                    del documents[question_id]
+        # Rows of unchanged Questions are kept, as they aren't reinserted
+        self.delete_rows(documents.keys() + removed_ids)
+        cursor = connection.cursor()
+        cursor.executemany(
+            'INSERT INTO soclone_searchdocument '
+            '(question_id, length, checksum) VALUES (%s, %s, %s)',
+            [(question_id, document[2], document[0])
+             for question_id, document in documents.items()])
+        transaction.commit_unless_managed()
+        segment_index.update(
+            dict([(question_id, (length, frequencies, text, positions))
+                  for question_id, (checksum, frequencies, length, text,
+                                    positions) in documents.items()]),
+            removed_ids)
+        return len(documents)
+
+    def remove_questions(self, question_ids):
+        """Removes the given Questions from the search index."""
+        question_ids = list(question_ids)
+        self.delete_rows(question_ids)
+        segment_index.update({}, question_ids)
+
+    def delete_rows(self, question_ids):
+        cursor = connection.cursor()
+        for i in xrange(0, len(question_ids), 500):
+            batch = question_ids[i:i + 500]
+            cursor.execute(
+                'DELETE FROM soclone_searchdocument '
+                'WHERE question_id IN (%s)' % ','.join(['%s'] * len(batch)),
+                batch)
+        transaction.commit_unless_managed()
+
+class SearchDocument(models.Model):
+    """
+    Records that a Question is in the search index, with its weighted
+    length and a checksum of its text so unchanged Questions needn't be
+    reindexed. The index itself is held in segment files - see
+    ``soclone.segments``.
+    """
+    question = models.OneToOneField(Question, primary_key=True,
+                                    related_name='search_document')
+    length   = models.PositiveIntegerField()
+    checksum = models.CharField(max_length=32)
+
+    objects = SearchDocumentManager()
+
+# Ids of Questions changed in managed transactions, by thread, whose search
+# index updates wait until the transaction has been committed or rolled back
+_pending_search_updates = threading.local()
+
+def update_search_index(question_ids):
+    """
+    Brings the search index up to date with the committed state of the
+    given Questions, indexing any which have changed and removing any
+    which have been deleted.
+    """
+    question_ids = list(question_ids)
+    existing_ids = set(Question.objects.filter(
+        id__in=question_ids).values_list('id', flat=True))
+    SearchDocument.objects.index_questions(existing_ids)
+    removed_ids = [question_id for question_id in question_ids
+                   if question_id not in existing_ids]
+    if removed_ids:
+        SearchDocument.objects.remove_questions(removed_ids)
+
+def queue_search_update(question_id):
+    """
+    Updates the search index for a changed Question, or, during a managed
+    transaction, queues the update until ``flush_search_updates`` is
+    called after it has ended, so rolled back changes aren't indexed.
+    """
+    if not transaction.is_managed():
+        update_search_index([question_id])
+        return
+    if not hasattr(_pending_search_updates, 'question_ids'):
+        _pending_search_updates.question_ids = set()
+    _pending_search_updates.question_ids.add(question_id)
+
+def flush_search_updates():
+    """
+    Applies the search index updates queued by this thread. This is called
+    by ``SearchUpdateMiddleware`` at the end of each request.
+    """
+    question_ids = getattr(_pending_search_updates, 'question_ids', None)
+    if question_ids:
+        _pending_search_updates.question_ids = set()
+        update_search_index(question_ids)
+
+def index_question_for_search(instance, **kwargs):
+    """Reindexes a Question when it's saved."""
+    if kwargs.get('raw', False):
+        return
+    queue_search_update(instance.id)
+
+def index_answer_question_for_search(instance, **kwargs):
+    """Reindexes the Question an Answer belongs to when it changes."""
+    if (kwargs.get('raw', False) or
+        instance.question_id in _deleting_questions):
+        return
+    queue_search_update(instance.question_id)
+
+def remove_question_from_search(instance, **kwargs):
+    """
+    Removes a deleted Question from the search index - its
+    ``SearchDocument`` is deleted along with it.
+    """
+    queue_search_update(instance.id)
+
+post_save.connect(index_question_for_search, sender=Question)
+post_delete.connect(remove_question_from_search, sender=Question)
+post_save.connect(index_answer_question_for_search, sender=Answer)
+post_delete.connect(index_answer_question_for_search, sender=Answer)
+
+# Maximum number of Questions found by similarity lookups, and the number
+# of candidates sharing buckets with the text which are compared with it
+SIMILAR_QUESTIONS_COUNT = getattr(settings, 'SIMILAR_QUESTIONS_COUNT', 10)
+SIMILAR_QUESTIONS_MAX_CANDIDATES = getattr(
+    settings, 'SIMILAR_QUESTIONS_MAX_CANDIDATES', 500)
+# Minimum estimated similarity of Questions found by similarity lookups
+SIMILAR_QUESTIONS_MIN_SIMILARITY = getattr(
+    settings, 'SIMILAR_QUESTIONS_MIN_SIMILARITY', 0.2)
+
+class QuestionSignatureManager(models.Manager):
+    def update_question(self, question):
+        """
+        Updates the MinHash signature and band buckets stored for a
+        Question's title, removing them if the Question has been deleted.
+        """
+        signature = None
+        if not question.deleted:
+            signature = minhash.get_signature(question.title)
+        existing = self.filter(question=question).values_list('signature',
+                                                              flat=True)
+        if existing:
+            if (signature is not None and
+                minhash.decode_signature(existing[0]) == signature):
+                return
+            self.remove_questions([question.id])
+        if signature is None:
+            return
+        cursor = connection.cursor()
+        cursor.execute(
+            'INSERT INTO soclone_questionsignature (question_id, signature) '
+            'VALUES (%s, %s)',
+            [question.id, minhash.encode_signature(signature)])
+        cursor.executemany(
+            'INSERT INTO soclone_questionsignatureband '
+            '(question_id, band, bucket) VALUES (%s, %s, %s)',
+            [(question.id, band, bucket) for band, bucket in
+             enumerate(minhash.get_band_hashes(signature))])
+        transaction.commit_unless_managed()
+
+    def remove_questions(self, question_ids):
+        """Removes the signatures stored for the given Questions."""
+        cursor = connection.cursor()
+        for i in xrange(0, len(question_ids), 500):
+            batch = question_ids[i:i + 500]
+            placeholders = ','.join(['%s'] * len(batch))
+            cursor.execute(
+                'DELETE FROM soclone_questionsignatureband '
+                'WHERE question_id IN (%s)' % placeholders, batch)
+            cursor.execute(
+                'DELETE FROM soclone_questionsignature '
+                'WHERE question_id IN (%s)' % placeholders, batch)
+        transaction.commit_unless_managed()
+
+    def find_similar(self, text, limit=SIMILAR_QUESTIONS_COUNT,
+                     exclude_id=None):
+        """
+        Finds Questions whose titles are similar to the given text,
+        returning a list of ``(question id, estimated similarity)``
+        tuples for up to ``limit`` of them, most similar first.
+
+        Candidates are found by looking up the buckets for each band of the
+        text's signature, taking those which share the most buckets, then
+        compared using their full signatures.
+        """
+        signature = minhash.get_signature(text)
+        if signature is None:
+            return []
+        band_hashes = minhash.get_band_hashes(signature)
+        params = []
+        for band, bucket in enumerate(band_hashes):
+            params.extend([band, bucket])
+        params.append(SIMILAR_QUESTIONS_MAX_CANDIDATES)
+        cursor = connection.cursor()
+        cursor.execute(
+            'SELECT question_id FROM soclone_questionsignatureband '
+            'WHERE %s '
+            'GROUP BY question_id ORDER BY COUNT(*) DESC, question_id DESC '
+            'LIMIT %%s' % ' OR '.join(['(band = %s AND bucket = %s)'] *
+                                      len(band_hashes)), params)
+        candidate_ids = [row[0] for row in cursor.fetchall()
+                         if row[0] != exclude_id]
+        if not candidate_ids:
+            return []
+        similar = []
+        for question_id, data in self.filter(
+                question__in=candidate_ids).values_list('question',
+                                                        'signature'):
+            similarity = minhash.estimate_similarity(
+                signature, minhash.decode_signature(data))
+            if similarity >= SIMILAR_QUESTIONS_MIN_SIMILARITY:
+                similar.append((similarity, question_id))
+        similar.sort(reverse=True)
+        return [(question_id, similarity)
+                for similarity, question_id in similar[:limit]]
+
+class QuestionSignature(models.Model):
+    """
+    The MinHash signature of a Question's title, for finding similar
+    Questions - see ``soclone.minhash``.
+    """
+    question  = models.OneToOneField(Question, primary_key=True,
+                                     related_name='signature')
+    signature = models.CharField(max_length=8 * minhash.SIGNATURE_LENGTH)
+
+    objects = QuestionSignatureManager()
+
+class QuestionSignatureBand(models.Model):
+    """
+    The bucket one band of a Question's signature hashes to, so Questions
+    with similar signatures can be looked up.
+    """
+    question = models.ForeignKey(Question, related_name='signature_bands')
+    band     = models.PositiveSmallIntegerField()
+    bucket   = models.IntegerField()
+
+def update_question_signature(instance, **kwargs):
+    """Updates a Question's signature when it's saved."""
+    if kwargs.get('raw', False):
+        return
+    QuestionSignature.objects.update_question(instance)
+
+post_save.connect(update_question_signature, sender=Question)
 
 class Comment(models.Model):
     """A comment on a Question or Answer."""
@@ -415,6 +1549,10 @@ def update_post_comment_count(instance, **kwargs):
     """
     if kwargs.get('raw', False):
         return
+    if COUNTER_WRITE_BEHIND:
+        journal_counter_change(instance.content_type_id, instance.object_id,
+                               'comment_count', kwargs)
+        return
     cursor = connection.cursor()
     cursor.execute(
         'UPDATE %(post_table)s SET comment_count = ('
@@ -429,6 +1567,8 @@ def update_post_comment_count(instance, **kwargs):
 
 post_save.connect(update_post_comment_count, sender=Comment)
 post_delete.connect(update_post_comment_count, sender=Comment)
+post_save.connect(invalidate_question_page_for_post_related, sender=Comment)
+post_delete.connect(invalidate_question_page_for_post_related, sender=Comment)
 
 class FlaggedItem(models.Model):
     """A flag on a Question or Answer indicating offensive content."""
@@ -448,6 +1588,10 @@ def update_post_offensive_flag_count(instance, **kwargs):
     """
     if kwargs.get('raw', False):
         return
+    if COUNTER_WRITE_BEHIND:
+        journal_counter_change(instance.content_type_id, instance.object_id,
+                               'offensive_flag_count', kwargs)
+        return
     cursor = connection.cursor()
     cursor.execute(
         'UPDATE %(post_table)s SET offensive_flag_count = ('
@@ -463,6 +1607,122 @@ def update_post_offensive_flag_count(instance, **kwargs):
 post_save.connect(update_post_offensive_flag_count, sender=FlaggedItem)
 post_delete.connect(update_post_offensive_flag_count, sender=FlaggedItem)
 
+class ReputationEventManager(models.Manager):
+    def for_vote(self, post, voter, vote, cancelled=False):
+        """
+        Creates unsaved ReputationEvents for a Vote on a Question or Answer,
+        or for its cancellation.
+        """
+        sign = cancelled and -1 or 1
+        source = {
+            'content_type': ContentType.objects.get_for_model(post),
+            'object_id': post.id,
+        }
+        if vote == Vote.VOTE_UP:
+            return [self.model(user_id=post.author_id,
+                               reason=ReputationEvent.UPVOTED,
+                               change=sign * ReputationEvent.UPVOTED_CHANGE,
+                               **source)]
+        events = [self.model(user_id=post.author_id,
+                             reason=ReputationEvent.DOWNVOTED,
+                             change=sign * ReputationEvent.DOWNVOTED_CHANGE,
+                             **source)]
+        if isinstance(post, Answer):
+            events.append(self.model(user_id=voter.id,
+                reason=ReputationEvent.DOWNVOTED_ANSWER,
+                change=sign * ReputationEvent.DOWNVOTED_ANSWER_CHANGE,
+                **source))
+        return events
+
+    def for_acceptance(self, answer, question, cancelled=False):
+        """
+        Creates unsaved ReputationEvents for the acceptance of an Answer,
+        or for its withdrawal. Accepting your own Answer doesn't affect
+        reputation.
+        """
+        if answer.author_id == question.author_id:
+            return []
+        sign = cancelled and -1 or 1
+        source = {
+            'content_type': ContentType.objects.get_for_model(answer),
+            'object_id': answer.id,
+        }
+        return [
+            self.model(user_id=answer.author_id,
+                reason=ReputationEvent.ANSWER_ACCEPTED,
+                change=sign * ReputationEvent.ANSWER_ACCEPTED_CHANGE,
+                **source),
+            self.model(user_id=question.author_id,
+                reason=ReputationEvent.ACCEPTED_ANSWER,
+                change=sign * ReputationEvent.ACCEPTED_ANSWER_CHANGE,
+                **source),
+        ]
+
+    def record(self, events):
+        """
+        Appends unsaved ReputationEvents to the ledger as a batch and
+        applies their changes to User reputation scores, coalesced per
+        User.
+
+        Events in a batch share a timestamp and the id of the batch's first
+        event, which identifies the batch when the ledger is replayed.
+        """
+        if not events:
+            return
+        created_at = datetime.datetime.now()
+        batch = None
+        changes = {}
+        for event in events:
+            event.created_at = created_at
+            event.batch = batch
+            event.save(force_insert=True)
+            if batch is None:
+                batch = event.batch = event.id
+                self.filter(id=event.id).update(batch=batch)
+            changes[event.user_id] = changes.get(event.user_id, 0) + event.change
+        User.objects.update_reputation([(user_id, change)
+                                        for user_id, change in changes.items()
+                                        if change])
+
+class ReputationEvent(models.Model):
+    """
+    An entry in the append-only ledger of changes to User reputation
+    scores. Cancelling the action which caused a change is recorded as a
+    new event with the opposite change.
+    """
+    UPVOTED          = 1
+    DOWNVOTED        = 2
+    DOWNVOTED_ANSWER = 3
+    ANSWER_ACCEPTED  = 4
+    ACCEPTED_ANSWER  = 5
+    REASON_CHOICES = (
+        (UPVOTED,          u'Post voted up'),
+        (DOWNVOTED,        u'Post voted down'),
+        (DOWNVOTED_ANSWER, u'Voted an answer down'),
+        (ANSWER_ACCEPTED,  u'Answer accepted'),
+        (ACCEPTED_ANSWER,  u'Accepted an answer'),
+    )
+
+    UPVOTED_CHANGE          = 10
+    DOWNVOTED_CHANGE        = -2
+    DOWNVOTED_ANSWER_CHANGE = -1
+    ANSWER_ACCEPTED_CHANGE  = 15
+    ACCEPTED_ANSWER_CHANGE  = 2
+
+    user         = models.ForeignKey(User, related_name='reputation_events')
+    change       = models.SmallIntegerField()
+    reason       = models.SmallIntegerField(choices=REASON_CHOICES)
+    content_type = models.ForeignKey(ContentType, null=True, blank=True)
+    object_id    = models.PositiveIntegerField(null=True, blank=True)
+    source       = generic.GenericForeignKey('content_type', 'object_id')
+    created_at   = models.DateTimeField(default=datetime.datetime.now)
+    batch        = models.PositiveIntegerField(null=True, blank=True)
+
+    objects = ReputationEventManager()
+
+    class Meta:
+        ordering = ('-created_at',)
+
 class Badge(models.Model):
     """Awarded for notable actions performed on the site by Users."""
     GOLD = 1
@@ -559,18 +1819,43 @@ def update_reputation(manager, changes):
     Updates User reputation scores where changes are specified as
     two-tuples of (User id, reputation score change), ensuring that
     a User's reputation score can't go below 1.
+
+    Users are updated with one UPDATE for each distinct change.
     """
-    change_count = len(changes)
+    user_ids_by_change = {}
+    for user_id, change in changes:
+        user_ids_by_change.setdefault(change, []).append(user_id)
     cursor = connection.cursor()
-    cursor.execute(
-        'UPDATE auth_user SET reputation = CASE %s ELSE reputation END '
-        'WHERE id IN (%s)' % (
-        ' '.join(['WHEN id = %s THEN MAX(1, reputation + %s)'] * change_count),
-        ','.join(['%s'] * change_count)),
-        flatten(changes) + [c[0] for c in changes])
+    for change, user_ids in user_ids_by_change.items():
+        for i in xrange(0, len(user_ids), 500):
+            batch = user_ids[i:i + 500]
+            cursor.execute(
+                'UPDATE auth_user SET reputation = CASE '
+                    'WHEN reputation + %%s < 1 THEN 1 '
+                    'ELSE reputation + %%s '
+                'END '
+                'WHERE id IN (%s)' % ','.join(['%s'] * len(batch)),
+                [change, change] + batch)
+    if auth.STORE_USER_PRIVILEGES:
+        manager.refresh_privileges([user_id for user_id, change in changes])
+    transaction.commit_unless_managed()
+
+def refresh_privileges(manager, user_ids):
+    """
+    Recalculates the stored privilege bitmasks of the Users with the
+    given ids from their reputation scores and superuser status.
+    """
+    cursor = connection.cursor()
+    for i in xrange(0, len(user_ids), 500):
+        batch = user_ids[i:i + 500]
+        cursor.execute(
+            'UPDATE auth_user SET privileges = %s WHERE id IN (%s)' % (
+                auth.privileges_sql(), ','.join(['%s'] * len(batch))),
+            batch)
     transaction.commit_unless_managed()
 
 UserManager.update_reputation = update_reputation
+UserManager.refresh_privileges = refresh_privileges
 
 # Monkeypatch additional profile fields into User
 QUESTIONS_PER_PAGE_CHOICES = (
@@ -598,6 +1883,8 @@ User.add_to_class('website', models.URLField(max_length=200, blank=True))
 User.add_to_class('location', models.CharField(max_length=100, blank=True))
 User.add_to_class('date_of_birth', models.DateField(null=True, blank=True))
 User.add_to_class('about', models.TextField(blank=True))
+# Denormalised data, only maintained if STORE_USER_PRIVILEGES is enabled
+User.add_to_class('privileges', models.IntegerField(default=0))
 
 def get_profile_url(self):
     """Returns the URL for this User's profile."""
@@ -612,3 +1899,71 @@ def calculate_gravatar_hash(instance, **kwargs):
     instance.gravatar = hashlib.md5(instance.email).hexdigest()
 
 pre_save.connect(calculate_gravatar_hash, sender=User)
+
+def calculate_user_privileges(instance, **kwargs):
+    """Calculates a User's privilege bitmask, if it's being stored."""
+    if kwargs.get('raw', False) or not auth.STORE_USER_PRIVILEGES:
+        return
+    instance.privileges = auth.calculate_privileges(instance.reputation,
+                                                    instance.is_superuser)
+
+pre_save.connect(calculate_user_privileges, sender=User)
+
+def get_trigrams(text):
+    """Returns the set of lowercase three-character substrings of some text."""
+    text = text.lower()
+    return set(text[i:i + 3] for i in xrange(len(text) - 2))
+
+class UsernameTrigramManager(models.Manager):
+    # Maximum number of trigrams a filter is narrowed down by
+    MAX_FILTER_TRIGRAMS = 5
+
+    def update_user(self, user):
+        """Updates the trigrams indexed for a User's username."""
+        trigrams = get_trigrams(user.username)
+        existing = set(self.filter(user=user).values_list('trigram',
+                                                          flat=True))
+        removed = existing - trigrams
+        if removed:
+            self.filter(user=user, trigram__in=list(removed)).delete()
+        for trigram in trigrams - existing:
+            self.create(user=user, trigram=trigram)
+
+    def filter_users(self, queryset, text):
+        """
+        Filters a User QuerySet to Users whose usernames contain the given
+        text, ignoring case.
+
+        Users who have a selection of the text's trigrams, spread across
+        it, are found using the trigram index before their usernames are
+        checked. Text of fewer than three characters has no trigrams, so
+        every username is checked.
+        """
+        text = text.lower()
+        trigrams = [text[i:i + 3] for i in xrange(0, len(text) - 2, 3)]
+        if len(text) > 3 and (len(text) - 3) % 3:
+            trigrams.append(text[-3:])
+        if len(trigrams) > self.MAX_FILTER_TRIGRAMS:
+            trigrams = (trigrams[:self.MAX_FILTER_TRIGRAMS - 1] +
+                        trigrams[-1:])
+        for trigram in set(trigrams):
+            queryset = queryset.filter(username_trigrams__trigram=trigram)
+        return queryset.filter(username__icontains=text)
+
+class UsernameTrigram(models.Model):
+    """A three-character substring of a User's username, for filtering."""
+    user    = models.ForeignKey(User, related_name='username_trigrams')
+    trigram = models.CharField(max_length=3)
+
+    objects = UsernameTrigramManager()
+
+    class Meta:
+        unique_together = ('trigram', 'user')
+
+def update_username_trigrams(instance, **kwargs):
+    """Indexes the trigrams of a User's username."""
+    if kwargs.get('raw', False):
+        return
+    UsernameTrigram.objects.update_user(instance)
+
+post_save.connect(update_username_trigrams, sender=User)
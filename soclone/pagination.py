@@ -0,0 +1,206 @@
+"""
+Keyset pagination of ordered QuerySets.
+
+Rather than skipping over every preceding row with ``OFFSET``, pages
+following or preceding a page already seen are found by filtering on the
+sort key of its last or first row, which is carried between requests in
+an opaque cursor. Deep pages cost the same as the first one, and paging
+through a list doesn't repeat or skip rows when others are inserted.
+
+Page numbers are kept for display, but are only exact for pages reached
+from the first page - the first and last pages and pages reached through
+a cursor don't need a total count or an ``OFFSET`` to be retrieved.
+"""
+import base64
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.db.models import Q
+from django.utils import simplejson
+
+class InvalidCursor(Exception):
+    pass
+
+def encode_cursor(values):
+    """Encodes a list of sort key values as an opaque, URL-safe string."""
+    return base64.urlsafe_b64encode(simplejson.dumps(values)).rstrip('=')
+
+def decode_cursor(cursor):
+    """Decodes the list of sort key values in a cursor."""
+    try:
+        cursor = str(cursor)
+        values = simplejson.loads(base64.urlsafe_b64decode(
+            cursor + '=' * (-len(cursor) % 4)))
+    except (TypeError, ValueError, UnicodeError):
+        raise InvalidCursor('Cursor could not be decoded')
+    if not isinstance(values, list):
+        raise InvalidCursor('Cursor does not contain sort key values')
+    return values
+
+def keyset_filter(ordering, values, reverse=False):
+    """
+    Creates a ``Q`` object which selects rows which come after a row with
+    the given sort key values in the given ordering, or before it if
+    ``reverse`` is ``True``.
+
+    The leading field is also bounded on its own, so its index can be used
+    to find the starting row.
+    """
+    filter = None
+    equal = {}
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        if field.startswith('-') != reverse:
+            operator = 'lt'
+        else:
+            operator = 'gt'
+        condition = dict(equal)
+        condition['%s__%s' % (name, operator)] = value
+        if filter is None:
+            bound = Q(**{'%s__%se' % (name, operator): value})
+            filter = Q(**condition)
+        else:
+            filter = filter | Q(**condition)
+        equal[name] = value
+    return bound & filter
+
+def reverse_ordering(ordering):
+    return tuple([field[1:] if field.startswith('-') else '-%s' % field
+                  for field in ordering])
+
+class KeysetPaginator(Paginator):
+    """
+    Paginates a QuerySet using the values of its ordering fields.
+
+    The fields given in ``ordering`` must be non-nullable and must
+    uniquely identify each row - ``id`` is added as a final tiebreaker if
+    it isn't already present.
+
+    ``count`` may be given as a number or as a callable returning one, to
+    avoid counting the QuerySet when a maintained count is available. It's
+    only retrieved when a total or the last page is required.
+    """
+    def __init__(self, object_list, ordering, per_page, count=None,
+                 allow_empty_first_page=True):
+        ordering = tuple(ordering)
+        if 'id' not in [field.lstrip('-') for field in ordering]:
+            ordering += ('id',)
+        super(KeysetPaginator, self).__init__(
+            object_list.order_by(*ordering), per_page,
+            allow_empty_first_page=allow_empty_first_page)
+        self.ordering = ordering
+        self.fields = [object_list.model._meta.get_field(field.lstrip('-'))
+                       for field in ordering]
+        self.count_source = count
+
+    def _get_count(self):
+        if self._count is None:
+            if callable(self.count_source):
+                self._count = self.count_source()
+            elif self.count_source is not None:
+                self._count = self.count_source
+            else:
+                self._count = self.object_list.count()
+        return self._count
+    count = property(_get_count)
+
+    def get_cursor(self, obj):
+        """Creates a cursor from the sort key values of an object."""
+        values = []
+        for field in self.fields:
+            value = getattr(obj, field.attname)
+            if not isinstance(value, (int, long, float)):
+                value = unicode(value)
+            values.append(value)
+        return encode_cursor(values)
+
+    def parse_cursor(self, cursor):
+        """Decodes and validates the sort key values in a cursor."""
+        values = decode_cursor(cursor)
+        if len(values) != len(self.fields):
+            raise InvalidCursor('Cursor has the wrong number of values')
+        try:
+            return [field.to_python(value)
+                    for field, value in zip(self.fields, values)]
+        except ValidationError:
+            raise InvalidCursor('Cursor contains invalid values')
+
+    def page(self, number, after=None, before=None):
+        """
+        Returns a Page object for the given 1-based page number.
+
+        If an ``after`` or ``before`` cursor is given, the page will
+        contain the objects following or preceding the object it was
+        created from, and the page number is taken on trust.
+        """
+        try:
+            number = int(number)
+        except ValueError:
+            number = 1
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        if after is not None and number > 1:
+            filter = keyset_filter(self.ordering, self.parse_cursor(after))
+            objects = list(self.object_list.filter(filter)[:self.per_page + 1])
+            return KeysetPage(objects[:self.per_page], number, self,
+                              has_previous=True,
+                              has_next=len(objects) > self.per_page)
+        if before is not None and number > 1:
+            filter = keyset_filter(self.ordering, self.parse_cursor(before),
+                                   reverse=True)
+            objects = list(self.object_list.filter(filter).order_by(
+                *reverse_ordering(self.ordering))[:self.per_page + 1])
+            objects.reverse()
+            return KeysetPage(objects[-self.per_page:], number, self,
+                              has_previous=len(objects) > self.per_page,
+                              has_next=True)
+        if number == 1:
+            objects = list(self.object_list[:self.per_page + 1])
+            return KeysetPage(objects[:self.per_page], number, self,
+                              has_previous=False,
+                              has_next=len(objects) > self.per_page)
+
+        number = self.validate_number(number)
+        if number == self.num_pages:
+            # Read the last page backwards from the end of the list
+            last_page_size = self.count - (number - 1) * self.per_page
+            objects = list(self.object_list.order_by(
+                *reverse_ordering(self.ordering))[:last_page_size])
+            objects.reverse()
+            return KeysetPage(objects, number, self, has_previous=True,
+                              has_next=False)
+        bottom = (number - 1) * self.per_page
+        objects = list(self.object_list[bottom:bottom + self.per_page + 1])
+        return KeysetPage(objects[:self.per_page], number, self,
+                          has_previous=True,
+                          has_next=len(objects) > self.per_page)
+
+class KeysetPage(Page):
+    """
+    A Page which knows whether there are objects before and after it, and
+    can create cursors for the adjacent pages.
+    """
+    def __init__(self, object_list, number, paginator, has_previous,
+                 has_next):
+        super(KeysetPage, self).__init__(object_list, number, paginator)
+        self._has_previous = has_previous and number > 1
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def get_cursor_params(self, number):
+        """
+        Returns a dict of the cursor parameter required to retrieve the
+        page with the given number, if it's adjacent to this page.
+        """
+        if not self.object_list:
+            return {}
+        if number == self.number + 1 and self.has_next():
+            return {'after': self.paginator.get_cursor(self.object_list[-1])}
+        if number == self.number - 1 and number > 1 and self.has_previous():
+            return {'before': self.paginator.get_cursor(self.object_list[0])}
+        return {}
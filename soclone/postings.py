@@ -0,0 +1,197 @@
+"""
+Posting lists of the Questions which have each Tag.
+
+A posting list is a sorted array of Question ids, so the Questions which
+have several Tags can be found by intersecting their posting lists rather
+than joining the Question-Tag table once per Tag.
+
+Posting lists are loaded from the database on demand and held in a
+process-local cache. They're updated in place as Questions are tagged,
+retagged and deleted, and a version number for each Tag held in the shared
+cache is bumped, so other processes reload their copies. As a process may
+load a list while another's changes are uncommitted, copies are also
+reloaded once they're older than ``POSTING_LIST_MAX_AGE`` seconds.
+"""
+import array
+import bisect
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from soclone.utils.cache import LRUCache
+
+# Seconds after which posting lists are reloaded from the database
+POSTING_LIST_MAX_AGE = getattr(settings, 'POSTING_LIST_MAX_AGE', 60)
+# Maximum number of posting lists and of Question ids held by each process
+POSTING_LIST_CACHE_MAX_ENTRIES = getattr(settings,
+                                         'POSTING_LIST_CACHE_MAX_ENTRIES',
+                                         1000)
+POSTING_LIST_CACHE_MAX_SIZE = getattr(settings, 'POSTING_LIST_CACHE_MAX_SIZE',
+                                      4000000)
+
+VERSION_KEY = 'soclone.postings.%s.version'
+VERSION_TIMEOUT = 60 * 60 * 24 * 30
+
+def gallop(ids, value, low=0):
+    """
+    Returns the index of the first item in the sorted array ``ids``, at or
+    after index ``low``, which is greater than or equal to ``value``.
+
+    The search range is doubled until it passes ``value`` before being
+    bisected, so finding a value close to ``low`` is cheap.
+    """
+    length = len(ids)
+    bound = 1
+    while low + bound < length and ids[low + bound] < value:
+        bound *= 2
+    return bisect.bisect_left(ids, value, low + bound // 2,
+                              min(low + bound + 1, length))
+
+# Arrays are intersected by galloping when the shortest is less than this
+# fraction of their total length, and with sets otherwise
+GALLOP_RATIO = 1.0 / 64
+
+def intersect(posting_lists):
+    """
+    Intersects sorted arrays of ids, returning a sorted array of the ids
+    which appear in all of them.
+
+    Each id in the shortest array is galloped to in each of the others,
+    continuing from the position reached for the previous id. When the
+    arrays are of similar lengths, galloping would visit most of their
+    ids anyway, so they're intersected as sets, which is faster.
+    """
+    result = array.array('i')
+    if not posting_lists:
+        return result
+    posting_lists = sorted(posting_lists, key=len)
+    shortest, others = posting_lists[0], posting_lists[1:]
+    if len(shortest) >= GALLOP_RATIO * sum(map(len, posting_lists)):
+        ids = set(shortest)
+        for other in others:
+            ids.intersection_update(other)
+        result.extend(sorted(ids))
+        return result
+    positions = [0] * len(others)
+    for value in shortest:
+        for i, ids in enumerate(others):
+            position = gallop(ids, value, positions[i])
+            if position == len(ids):
+                return result
+            positions[i] = position
+            if ids[position] != value:
+                break
+        else:
+            result.append(value)
+    return result
+
+class PostingList(object):
+    """A sorted array of Question ids for a Tag, with its version."""
+    def __init__(self, ids, version):
+        self.ids = ids
+        self.version = version
+        self.loaded_at = time.time()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, question_id):
+        position = bisect.bisect_left(self.ids, question_id)
+        if position == len(self.ids) or self.ids[position] != question_id:
+            self.ids.insert(position, question_id)
+
+    def remove(self, question_id):
+        position = bisect.bisect_left(self.ids, question_id)
+        if position < len(self.ids) and self.ids[position] == question_id:
+            del self.ids[position]
+
+def load_question_ids(tag_id):
+    """Loads a sorted array of the ids of Questions which have a Tag."""
+    cursor = connection.cursor()
+    cursor.execute(
+        'SELECT question_id FROM soclone_question_tags '
+        'WHERE tag_id = %s ORDER BY question_id', [tag_id])
+    return array.array('i', [row[0] for row in cursor.fetchall()])
+
+class TagPostings(object):
+    """Holds this process' copies of Tag posting lists."""
+    def __init__(self, max_entries=POSTING_LIST_CACHE_MAX_ENTRIES,
+                 max_size=POSTING_LIST_CACHE_MAX_SIZE,
+                 max_age=POSTING_LIST_MAX_AGE):
+        self.lists = LRUCache({'max_entries': max_entries,
+                               'max_size': max_size})
+        self.max_age = max_age
+        self.lock = threading.Lock()
+
+    def get(self, tag_ids):
+        """
+        Returns sorted arrays of the ids of Questions which have each of the
+        Tags with the given ids.
+        """
+        keys = [VERSION_KEY % tag_id for tag_id in tag_ids]
+        versions = cache.get_many(keys)
+        result = []
+        now = time.time()
+        for tag_id, key in zip(tag_ids, keys):
+            version = versions.get(key)
+            if version is None:
+                # Start from the current time, so a version which has been
+                # evicted isn't reused.
+                version = int(now * 1000)
+                if not cache.add(key, version, VERSION_TIMEOUT):
+                    version = cache.get(key, version)
+            posting_list = self.lists.get(tag_id)
+            if (posting_list is None or posting_list.version != version or
+                now - posting_list.loaded_at > self.max_age):
+                posting_list = PostingList(load_question_ids(tag_id),
+                                           version)
+                self.lists.set(tag_id, posting_list)
+            result.append(posting_list.ids)
+        return result
+
+    def intersect(self, tag_ids):
+        """
+        Returns a sorted array of the ids of Questions which have all of the
+        Tags with the given ids.
+        """
+        posting_lists = self.get(tag_ids)
+        if len(posting_lists) == 1:
+            return posting_lists[0]
+        return intersect(posting_lists)
+
+    def add(self, question_id, tag_ids):
+        """Adds a Question to the posting lists of the given Tags."""
+        self._change(question_id, tag_ids, 'add')
+
+    def remove(self, question_id, tag_ids):
+        """Removes a Question from the posting lists of the given Tags."""
+        self._change(question_id, tag_ids, 'remove')
+
+    def _change(self, question_id, tag_ids, method):
+        """
+        Bumps the version of each Tag's posting list. The change is applied
+        to this process' copy if it was up to date, otherwise the copy is
+        discarded.
+        """
+        for tag_id in tag_ids:
+            try:
+                version = cache.incr(VERSION_KEY % tag_id)
+            except ValueError:
+                version = None
+            self.lock.acquire()
+            try:
+                posting_list = self.lists.get(tag_id)
+                if posting_list is None:
+                    continue
+                if version is not None and posting_list.version == version - 1:
+                    getattr(posting_list, method)(question_id)
+                    posting_list.version = version
+                else:
+                    self.lists.delete(tag_id)
+            finally:
+                self.lock.release()
+
+tag_postings = TagPostings()
@@ -0,0 +1,151 @@
+"""
+Cached documents holding everything displayed on a Question's page to
+anonymous visitors, so their page views don't need to query the database.
+"""
+import copy
+import operator
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.paginator import Paginator
+
+from soclone.models import Answer, Question, get_question_page_generation
+from soclone.utils.cache import get_cache
+from soclone.utils.models import populate_foreign_key_caches
+
+ANSWER_SORT = {
+    'votes': ('-score', '-added_at'),
+    'newest': ('-added_at',),
+    'oldest': ('added_at',),
+}
+
+DEFAULT_ANSWER_SORT = 'votes'
+
+ANSWERS_PER_PAGE = 30
+
+# User fields displayed in the user details for each post
+USER_DETAIL_FIELDS = ('username', 'gravatar', 'reputation', 'gold', 'silver',
+                      'bronze')
+
+# Seconds for which a cached question page is used, even if nothing on it
+# has changed, so view counts, reputation and Tag use counts are eventually
+# updated
+QUESTION_PAGE_CACHE_TIMEOUT = getattr(settings, 'QUESTION_PAGE_CACHE_TIMEOUT',
+                                      300)
+
+question_page_cache = get_cache(
+    getattr(settings, 'QUESTION_PAGE_CACHE_BACKEND', 'tiered'), {
+        'max_entries': getattr(settings, 'QUESTION_PAGE_CACHE_MAX_ENTRIES',
+                               1000),
+        'max_size': getattr(settings, 'QUESTION_PAGE_CACHE_MAX_SIZE',
+                            16777216),
+        'timeout': QUESTION_PAGE_CACHE_TIMEOUT,
+    })
+
+def question_page_cache_key(question_id):
+    """
+    Creates a cache key for a Question's page.
+
+    Keys include the generation of the Question's cached page, so pages
+    are invalidated whenever anything displayed on them changes, and also
+    change at the end of each timeout period, so pages expire from
+    process-local caches too.
+    """
+    return 'soclone.question_pages.%s.g%s.%s' % (
+        question_id, get_question_page_generation(question_id),
+        int(time.time() // QUESTION_PAGE_CACHE_TIMEOUT))
+
+def sort_answers(answers, order_by):
+    """
+    Sorts a list of Answers in place by the given ``order_by`` fields, as
+    the database would.
+    """
+    for field in reversed(order_by):
+        answers.sort(key=operator.attrgetter(field.lstrip('-')),
+                     reverse=field.startswith('-'))
+
+class QuestionPage(object):
+    """
+    A Question, its Tags and the first page of its Answers in each
+    ordering given in ``ANSWER_SORT``, as displayed to anonymous visitors.
+
+    The caches of the Question and Answers' User ForeignKeys hold dicts of
+    the fields given in ``USER_DETAIL_FIELDS``.
+    """
+    def __init__(self, question, tags, answers, answer_ids):
+        self.question = question
+        self.tags = tags
+        self.answers = answers
+        self.answer_ids = answer_ids
+
+    def __len__(self):
+        return len(self.question.html) + sum(
+            [len(answer.html) for answer in self.answers.itervalues()])
+
+    @classmethod
+    def build(cls, question_id):
+        """
+        Builds the page for the Question with the given id, or returns
+        ``None`` if it doesn't exist.
+        """
+        try:
+            question = Question.objects.get(id=question_id)
+        except Question.DoesNotExist:
+            return None
+        answers = {}
+        answer_ids = {}
+        if question.answer_count <= ANSWERS_PER_PAGE:
+            # Every ordering's first page holds the same Answers, so they
+            # can be retrieved once and sorted here.
+            all_answers = list(Answer.objects.for_question(question))
+            for sort, order_by in ANSWER_SORT.items():
+                sort_answers(all_answers, order_by)
+                answer_ids[sort] = [answer.id for answer
+                                    in all_answers[:ANSWERS_PER_PAGE]]
+            answers = dict([(answer.id, answer) for answer in all_answers])
+        else:
+            for sort, order_by in ANSWER_SORT.items():
+                page_answers = Answer.objects.for_question(
+                    question).order_by(*order_by)[:ANSWERS_PER_PAGE]
+                answer_ids[sort] = []
+                for answer in page_answers:
+                    answers.setdefault(answer.id, answer)
+                    answer_ids[sort].append(answer.id)
+        populate_foreign_key_caches(User, (
+                ((question,), ('author', 'last_edited_by', 'closed_by')),
+                (answers.values(), ('author', 'last_edited_by'))
+             ),
+             fields=USER_DETAIL_FIELDS)
+        return cls(question, list(question.tags.all()), answers, answer_ids)
+
+    def get_question(self):
+        """
+        Returns a copy of the Question, which may be modified without
+        affecting the cached page.
+        """
+        return copy.copy(self.question)
+
+    def get_answer_page(self, sort):
+        """Returns the first page of Answers in the given ordering."""
+        paginator = Paginator([self.answers[answer_id]
+                               for answer_id in self.answer_ids[sort]],
+                              ANSWERS_PER_PAGE)
+        # Use the denormalised count, as the complete list of Answers
+        # isn't held.
+        paginator._count = self.question.answer_count
+        return paginator.page(1)
+
+def get_question_page(question_id):
+    """
+    Retrieves the cached page for the Question with the given id, building
+    and caching it if necessary, or returns ``None`` if the Question
+    doesn't exist.
+    """
+    key = question_page_cache_key(question_id)
+    page = question_page_cache.get(key)
+    if page is None:
+        page = QuestionPage.build(question_id)
+        if page is not None:
+            question_page_cache.set(key, page)
+    return page
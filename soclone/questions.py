@@ -1,4 +1,93 @@
-from soclone.models import Question
+import array
+import hashlib
+import itertools
+import time
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.core.urlresolvers import reverse
+from django.template.defaultfilters import slugify
+
+from soclone.models import Question, Total, get_question_list_generation
+from soclone.pagination import KeysetPaginator
+from soclone.postings import tag_postings
+from soclone.search import normalize_query, search_index
+from soclone.utils.cache import get_cache
+from soclone.utils.models import row_queryset
+
+# Seconds for which a cached question list page is used, even if Questions
+# haven't seen any activity, so view counts are eventually updated
+QUESTION_LIST_CACHE_TIMEOUT = getattr(settings, 'QUESTION_LIST_CACHE_TIMEOUT',
+                                      300)
+# Seconds for which cached pages of the given views are used regardless of
+# activity, keyed by view id
+QUESTION_LIST_MAX_STALENESS = getattr(settings, 'QUESTION_LIST_MAX_STALENESS',
+                                      {})
+
+question_list_cache = get_cache(
+    getattr(settings, 'QUESTION_LIST_CACHE_BACKEND', 'tiered'), {
+        'max_entries': getattr(settings, 'QUESTION_LIST_CACHE_MAX_ENTRIES',
+                               500),
+        'max_size': getattr(settings, 'QUESTION_LIST_CACHE_MAX_SIZE',
+                            8388608),
+        'timeout': QUESTION_LIST_CACHE_TIMEOUT,
+    })
+
+def question_list_cache_key(view, template, page_number, per_page,
+                            cursor=''):
+    """
+    Creates a cache key for a rendered question list page.
+
+    Keys include the generation of cached question list pages, so pages
+    are invalidated whenever Questions see activity, unless the view has a
+    maximum staleness. Keys also change at the end of each timeout or
+    staleness period, so pages expire from process-local caches too.
+    """
+    staleness = QUESTION_LIST_MAX_STALENESS.get(view.id)
+    if staleness:
+        version = 's%s' % int(time.time() // staleness)
+    else:
+        version = 'g%s.%s' % (get_question_list_generation(),
+                              int(time.time() // QUESTION_LIST_CACHE_TIMEOUT))
+    return 'soclone.question_lists.%s.%s.%s.%s.%s.%s' % (
+        template, view.get_cache_id(), page_number, per_page,
+        hashlib.md5(cursor).hexdigest(), version)
+
+# Question fields displayed for every Question in a list
+LIST_FIELDS = ('id', 'title', 'summary', 'tagnames', 'score', 'answer_count',
+               'answer_accepted', 'view_count', 'closed', 'wiki')
+
+class QuestionRow(object):
+    """
+    A lightweight record of the Question fields required to display a
+    Question in a list, used in place of a full model instance.
+
+    Caches for User ForeignKeys can be populated with
+    ``populate_foreign_key_caches`` as for model instances.
+    """
+    __slots__ = LIST_FIELDS + ('added_at', 'last_activity_at', 'hotness',
+                               'author_id', 'last_activity_by_id',
+                               '_author_cache', '_last_activity_by_cache')
+
+    def __init__(self, attnames, values):
+        for attname, value in itertools.izip(attnames, values):
+            setattr(self, attname, value)
+
+    def get_absolute_url(self):
+        return '%s%s/' % (reverse('question', args=[self.id]),
+                          slugify(self.title))
+
+    def tagname_list(self):
+        """Creates a list of Tag names from the ``tagnames`` attribute."""
+        return [name for name in self.tagnames.split(u' ')]
+
+    @property
+    def author(self):
+        return self._author_cache
+
+    @property
+    def last_activity_by(self):
+        return self._last_activity_by_cache
 
 class QuestionView(object):
     """A view of the list of Questions."""
@@ -7,7 +96,7 @@ class QuestionView(object):
                  user_action='asked',
                  user_fields=('username', 'gravatar', 'reputation',
                                       'gold', 'silver', 'bronze'),
-                 time='added_at'):
+                 time='added_at', total='questions'):
         self.id = id
         self.page_title = page_title
         self.tab_title = tab_title
@@ -17,28 +106,258 @@ class QuestionView(object):
         self.user_action = user_action
         self.user_fields = user_fields
         self.time = time
+        self.total = total
 
     def get_queryset(self):
         raise NotImplementedError
 
+    def get_cache_id(self):
+        """Returns an id for this view which is unique among all views."""
+        return self.id
+
+    def get_count(self):
+        """
+        Returns the number of Questions in this view from a maintained
+        Total, rather than counting them.
+        """
+        return Total.objects.get_value(self.total)
+
+    def get_fields(self, extra_fields=()):
+        """
+        Returns the names of the Question fields required to display this
+        view, including the user and time it displays and any extra
+        fields given.
+        """
+        fields = list(LIST_FIELDS)
+        for field in (self.user, self.time) + tuple(extra_fields):
+            if field not in fields:
+                fields.append(field)
+        return fields
+
+    def get_paginator(self, per_page, extra_fields=()):
+        raise NotImplementedError
+
 class OrderedQuestionView(QuestionView):
-    """A view in which list of Questions has a simple order applied."""
-    def __init__(self, ordering=None, **kwargs):
+    """
+    A view in which list of Questions has a simple order applied,
+    optionally restricted to Questions matching a dict of filters.
+    """
+    def __init__(self, ordering=None, filters=None, **kwargs):
         if ordering is None:
             ordering = ()
+        if filters is None:
+            filters = {}
         self.ordering = ordering
+        self.filters = filters
         super(OrderedQuestionView, self).__init__(**kwargs)
 
     def get_queryset(self):
-        return Question.objects.all().order_by(*self.ordering)
+        return Question.objects.filter(**self.filters).order_by(
+            *self.ordering)
+
+    def get_cache_id(self):
+        # Views of different lists of Questions share ids, but not Totals
+        return '%s.%s' % (self.total, self.id)
+
+    def get_fields(self, extra_fields=()):
+        return super(OrderedQuestionView, self).get_fields(
+            tuple(extra_fields) + tuple([field.lstrip('-')
+                                         for field in self.ordering]))
 
-class HotQuestionView(QuestionView):
+    def get_paginator(self, per_page, extra_fields=()):
+        """
+        Creates a paginator which retrieves pages of ``QuestionRow``
+        objects, holding only the fields required to display this view,
+        using the values of its ordering fields with ``id`` breaking any
+        ties.
+        """
+        return KeysetPaginator(
+            row_queryset(self.get_queryset(), QuestionRow,
+                         self.get_fields(extra_fields)),
+            self.ordering, per_page, count=self.get_count)
+
+class HotQuestionView(OrderedQuestionView):
+    """
+    A question view which sorts all Questions by their stored "hotness"
+    score, which is updated as Questions receive votes, answers, views and
+    edits and decayed periodically by the ``decay_hotness`` command.
+    """
+    def __init__(self, **kwargs):
+        super(HotQuestionView, self).__init__(ordering=('-hotness',),
+                                              **kwargs)
+
+class QuestionRowList(object):
+    """
+    A sequence of the Questions with the given ids, which retrieves
+    ``QuestionRow`` objects holding the given fields only for slices taken
+    from it.
+    """
+    def __init__(self, question_ids, fields):
+        self.question_ids = question_ids
+        self.fields = fields
+
+    def __len__(self):
+        return len(self.question_ids)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        question_ids = self.question_ids[index]
+        rows = dict((row.id, row) for row in row_queryset(
+            Question.objects.filter(id__in=list(question_ids)), QuestionRow,
+            self.fields))
+        return [rows[question_id] for question_id in question_ids
+                if question_id in rows]
+
+def question_id_queryset(question_ids):
     """
-    A question view which applies a "hotness" algorithm to sort all
-    Questions.
+    Creates a QuerySet of the Questions with the given ids, which are
+    written into the query as literals, as there may be more of them than
+    the database allows parameters.
+    """
+    if not question_ids:
+        return Question.objects.filter(id__in=[])
+    return Question.objects.extra(where=['%s.id IN (%s)' % (
+        Question._meta.db_table, ','.join(map(str, question_ids)))])
+
+class TaggedQuestionView(QuestionView):
     """
+    A view of the Questions which have all of the given Tags, ordered in the
+    same way as the given view.
+
+    Questions are found by intersecting the Tags' posting lists. Posting
+    lists are in order of id, which is the order Questions were asked in,
+    so for the newest ordering pages are sliced from them and only the
+    fields for the Questions on the page being displayed are retrieved.
+    For any other ordering, the database sorts the matching Questions and
+    pages are retrieved using keyset pagination, as for the given view.
+    """
+    def __init__(self, view, tags):
+        super(TaggedQuestionView, self).__init__(id=view.id,
+            page_title=view.page_title, tab_title=view.tab_title,
+            tab_tooltip=view.tab_tooltip, description=view.description,
+            user=view.user, user_action=view.user_action,
+            user_fields=view.user_fields, time=view.time)
+        self.view = view
+        self.tags = tags
+        self._question_ids = None
+
+    def get_cache_id(self):
+        return '%s.%s' % (self.id, '+'.join([str(tag.id)
+                                             for tag in self.tags]))
+
+    def get_count(self):
+        return len(self.get_question_ids())
+
+    def get_question_ids(self):
+        """
+        Returns a sorted array of the ids of the Questions which have all
+        of this view's Tags.
+        """
+        if self._question_ids is None:
+            self._question_ids = tag_postings.intersect(
+                [tag.id for tag in self.tags])
+        return self._question_ids
+
+    def get_ordered_question_ids(self):
+        """
+        Returns a list of the ids of the Questions in this view, in the
+        same order as the underlying view, or ``None`` if the database is
+        required to sort them.
+        """
+        if tuple(self.view.ordering) == ('-added_at',):
+            return self.get_question_ids()[::-1]
+        return None
+
     def get_queryset(self):
-        raise NotImplementedError
+        """
+        Returns a QuerySet of the Questions in this view. A single Tag is
+        joined to, while the ids of Questions which have several Tags are
+        given directly.
+        """
+        if len(self.tags) == 1:
+            return Question.objects.filter(tags=self.tags[0])
+        return question_id_queryset(self.get_question_ids())
+
+    def get_fields(self, extra_fields=()):
+        return self.view.get_fields(extra_fields)
+
+    def get_paginator(self, per_page, extra_fields=()):
+        """
+        Creates a paginator which retrieves pages of ``QuestionRow``
+        objects, by slicing the ordered ids of the Questions in this view
+        if they're available, or in the same way as the underlying view.
+        """
+        fields = self.get_fields(extra_fields)
+        question_ids = self.get_ordered_question_ids()
+        if question_ids is not None:
+            return Paginator(QuestionRowList(question_ids, fields), per_page)
+        return KeysetPaginator(
+            row_queryset(self.get_queryset(), QuestionRow, fields),
+            self.view.ordering, per_page, count=self.get_count)
+
+class SearchQuestionView(TaggedQuestionView):
+    """
+    A view of the Questions matching a search query, ordered by relevance
+    or in the same way as the given view.
+
+    ``tags`` may be ``None`` if the query is restricted to a Tag which
+    doesn't exist, in which case no Questions match.
+    """
+    def __init__(self, view, query, terms, tags):
+        super(SearchQuestionView, self).__init__(view, tags)
+        self.query = query
+        self.terms = terms
+        self._results = None
+
+    def get_cache_id(self):
+        return '%s.%s' % (self.id, hashlib.md5(
+            normalize_query(self.query).encode('utf-8')).hexdigest())
+
+    def get_results(self):
+        """
+        Returns the ids of the matching Questions, most relevant first,
+        and the total number of matches.
+        """
+        if self._results is None:
+            if self.tags is None:
+                self._results = ([], 0)
+            else:
+                self._results = search_index.search(
+                    self.terms, [tag.id for tag in self.tags])
+        return self._results
+
+    def get_count(self):
+        return len(self.get_results()[0])
+
+    def get_question_ids(self):
+        return array.array('i', sorted(self.get_results()[0]))
+
+    def get_ordered_question_ids(self):
+        if self.view is relevance_question_view:
+            return self.get_results()[0]
+        return super(SearchQuestionView, self).get_ordered_question_ids()
+
+    def get_queryset(self):
+        return question_id_queryset(self.get_question_ids())
+
+    def get_snippet(self, question_id):
+        """
+        Returns an HTML excerpt of a matching Question's text with the
+        search terms highlighted, or ``None`` if one isn't available.
+        """
+        if not self.terms:
+            return None
+        return search_index.get_snippet(self.terms, question_id)
+
+relevance_question_view = QuestionView(
+    id          = 'relevance',
+    page_title  = 'Search Results',
+    tab_title   = 'Relevance',
+    tab_tooltip = 'Search results with the best matches first',
+    description = 'sorted by <strong>relevance</strong>. The questions which '
+                  'best match your search will appear first.'
+)
 
 all_question_views = (
     OrderedQuestionView(
@@ -84,8 +403,90 @@ all_question_views = (
     )
 )
 
-# TODO Implement unanswered views
-unanswered_question_views = all_question_views
+UNANSWERED_FILTERS = {'unanswered': True}
+
+unanswered_question_views = (
+    OrderedQuestionView(
+        id          = 'newest',
+        page_title  = 'Newest Unanswered Questions',
+        tab_title   = 'Newest',
+        tab_tooltip = 'The most recently asked unanswered questions',
+        description = 'sorted by the <strong>date they were asked</strong>. '
+                      'The newest, most recently asked questions will appear '
+                      'first',
+        ordering    = ('-added_at',),
+        filters     = UNANSWERED_FILTERS,
+        total       = 'unanswered_questions'
+    ),
+    HotQuestionView(
+        id          = 'hot',
+        page_title  = 'Hottest Unanswered Questions',
+        tab_title   = 'Hot',
+        tab_tooltip = 'Unanswered questions with recent interest and activity',
+        description = 'sorted by <strong>hotness</strong>. Questions with the '
+                      'most recent interest and activity will appear first.',
+        filters     = UNANSWERED_FILTERS,
+        total       = 'unanswered_questions'
+    ),
+    OrderedQuestionView(
+        id          = 'votes',
+        page_title  = 'Highest Voted Unanswered Questions',
+        tab_title   = 'Votes',
+        tab_tooltip = 'Unanswered questions with the most votes',
+        description = 'sorted by <strong>votes</strong>. The questions with '
+                      ' the highest vote scores (up votes minus down votes) '
+                      'will appear first.',
+        ordering    = ('-score', '-added_at'),
+        filters     = UNANSWERED_FILTERS,
+        total       = 'unanswered_questions'
+    ),
+    OrderedQuestionView(
+        id           = 'activity',
+        page_title   = 'Recently Active Unanswered Questions',
+        tab_title    = 'Activity',
+        tab_tooltip  = 'Unanswered questions that have recent activity',
+        description  = 'sorted by <strong>activity</strong>. Questions with '
+                       'the most recent activity &mdash; either through new '
+                       'answers or recent edits &mdash; will appear first.',
+        ordering     = ('-last_activity_at',),
+        user         = 'last_activity_by',
+        user_action  = 'modified',
+        time         = 'last_activity_at',
+        filters      = UNANSWERED_FILTERS,
+        total        = 'unanswered_questions'
+    )
+)
+
+index_question_views = (
+    OrderedQuestionView(
+        id          = 'activity',
+        page_title  = 'Top Questions',
+        tab_title   = 'Active',
+        tab_tooltip = 'Questions that have recent activity',
+        ordering    = ('-last_activity_at',),
+        user        = 'last_activity_by',
+        user_action = 'modified',
+        time        = 'last_activity_at'
+    ),
+    HotQuestionView(
+        id          = 'hot',
+        page_title  = 'Top Questions',
+        tab_title   = 'Hot',
+        tab_tooltip = 'Questions with recent interest and activity',
+        user        = 'last_activity_by',
+        user_action = 'modified',
+        time        = 'last_activity_at'
+    ),
+    OrderedQuestionView(
+        id          = 'newest',
+        page_title  = 'Top Questions',
+        tab_title   = 'Newest',
+        tab_tooltip = 'The most recently asked questions',
+        ordering    = ('-added_at',),
+        user        = 'last_activity_by',
+        user_action = 'modified',
+        time        = 'last_activity_at'
+    ),
+)
 
-# TODO Implement index views
-index_question_views = all_question_views
+search_question_views = (relevance_question_view,) + all_question_views
@@ -0,0 +1,369 @@
+"""
+Full-text search of Questions and their Answers.
+
+Each Question is indexed as a single document made up of its title, Tags,
+body and Answers, held in the segment files of ``soclone.segments``. At
+query time, the postings for each term are decoded from each segment as
+arrays sorted by Question id into a process-local cache, intersected with
+the galloping intersection used for Tag posting lists - along with the
+posting lists of any Tags the query is restricted to - and only the
+matching Questions are ranked, using BM25. The best matches from each
+segment are then merged.
+
+Segments are never modified, so cached postings never go stale. Changes to
+Questions and Answers are searchable as soon as their segment is written,
+as readers check the index's manifest for new segments on each search.
+
+Results are cached for ``SEARCH_RESULT_CACHE_TIMEOUT`` seconds, keyed by
+the normalised query and the index's generation, so cached results are
+discarded as soon as documents are added to or removed from the index.
+
+Excerpts of matching Questions, with the search terms highlighted, are
+made from the text and term positions stored in the index.
+"""
+import array
+import bisect
+import hashlib
+import heapq
+import itertools
+import math
+import operator
+import re
+
+from django.conf import settings
+from django.utils.html import escape
+
+from soclone.analysis import analyze
+from soclone.postings import intersect, tag_postings
+from soclone.segments import int_array, segment_index
+from soclone.utils.cache import LRUCache, get_cache
+
+# Maximum number of decoded segment postings lists, and of postings in
+# total, held by each process
+SEARCH_POSTINGS_CACHE_MAX_ENTRIES = getattr(
+    settings, 'SEARCH_POSTINGS_CACHE_MAX_ENTRIES', 10000)
+SEARCH_POSTINGS_CACHE_MAX_SIZE = getattr(
+    settings, 'SEARCH_POSTINGS_CACHE_MAX_SIZE', 10000000)
+# Maximum number of results ranked for a query
+SEARCH_MAX_RESULTS = getattr(settings, 'SEARCH_MAX_RESULTS', 1000)
+# Seconds for which the results of a query are cached
+SEARCH_RESULT_CACHE_TIMEOUT = getattr(settings, 'SEARCH_RESULT_CACHE_TIMEOUT',
+                                      300)
+# Approximate length, in characters, of excerpts of matching Questions
+SEARCH_SNIPPET_LENGTH = getattr(settings, 'SEARCH_SNIPPET_LENGTH', 200)
+# Number of characters shown before the first highlighted term in excerpts
+SNIPPET_CONTEXT = 30
+
+# BM25 term frequency saturation and length normalisation parameters
+K1 = 1.2
+B = 0.75
+
+search_result_cache = get_cache(
+    getattr(settings, 'SEARCH_RESULT_CACHE_BACKEND', 'tiered'), {
+        'max_entries': getattr(settings, 'SEARCH_RESULT_CACHE_MAX_ENTRIES',
+                               1000),
+        'max_size': getattr(settings, 'SEARCH_RESULT_CACHE_MAX_SIZE',
+                            1000000),
+        'timeout': SEARCH_RESULT_CACHE_TIMEOUT,
+    })
+
+tag_filter_re = re.compile(r'\[([^\[\]]+)\]')
+
+def parse_query(query):
+    """
+    Splits a search query into a list of distinct terms and a list of the
+    names of Tags the search is restricted to, which are given in square
+    brackets, such as ``[python]``.
+    """
+    tagnames = []
+    for name in tag_filter_re.findall(query.lower()):
+        name = name.strip()
+        if name and name not in tagnames:
+            tagnames.append(name)
+    terms = []
+    for term in analyze(tag_filter_re.sub(u' ', query)):
+        if term not in terms:
+            terms.append(term)
+    return terms, tagnames
+
+def normalize_query(query):
+    """
+    Returns a canonical form of a search query, with Tags first and
+    without any words which aren't searched for.
+    """
+    terms, tagnames = parse_query(query)
+    return u' '.join([u'[%s]' % name for name in tagnames] + terms)
+
+def rank(scores, question_ids, limit):
+    """
+    Returns ``(score, id)`` tuples for up to ``limit`` of the Questions
+    with the highest scores, given a sequence of scores for a sorted array
+    of Question ids. Ties are broken in favour of newer Questions.
+    """
+    # Considering the newest Questions first means those with a score tied
+    # with the lowest ranked so far are rejected without changing the heap.
+    return heapq.nlargest(limit, itertools.izip(reversed(scores),
+                                                reversed(question_ids)))
+
+def make_snippet(text, matches, length=SEARCH_SNIPPET_LENGTH):
+    """
+    Makes an HTML excerpt of about ``length`` characters of some text,
+    given a sorted list of the ``(start, end)`` positions of matching terms
+    in it. The part of the text with the most matches is chosen, and the
+    matches are highlighted.
+    """
+    start = 0
+    if matches:
+        best = count = 0
+        j = 0
+        for i, (match_start, match_end) in enumerate(matches):
+            while (j < len(matches) and
+                   matches[j][1] <= match_start + length - SNIPPET_CONTEXT):
+                j += 1
+            if j - i > count:
+                best, count = i, j - i
+        start = max(0, matches[best][0] - SNIPPET_CONTEXT)
+        if start:
+            # Start at the beginning of a word
+            space = text.find(u' ', start, matches[best][0])
+            if space != -1:
+                start = space + 1
+    end = start + length
+    if end < len(text):
+        space = text.rfind(u' ', start, end)
+        if space > start:
+            end = space
+    parts = []
+    if start:
+        parts.append(u'&hellip; ')
+    position = start
+    for match_start, match_end in matches:
+        if match_start < start or match_end > end:
+            continue
+        parts.append(escape(text[position:match_start]))
+        parts.append(u'<strong>%s</strong>' %
+                     escape(text[match_start:match_end]))
+        position = match_end
+    parts.append(escape(text[position:end]))
+    if end < len(text):
+        parts.append(u' &hellip;')
+    return u''.join(parts)
+
+class SearchResults(object):
+    """
+    The ids of the Questions matching a query, most relevant first, and the
+    total number of matches.
+    """
+    def __init__(self, question_ids, total):
+        self.question_ids = question_ids
+        self.total = total
+
+    def __len__(self):
+        return len(self.question_ids)
+
+class TermPostings(object):
+    """
+    Arrays of the ids of the Questions in a segment which contain a term,
+    sorted by id, with the term's weighted frequency in and length of each
+    document.
+    """
+    def __init__(self, ids, frequencies, lengths):
+        self.ids = ids
+        self.frequencies = frequencies
+        self.lengths = lengths
+        self.impacts = None
+        self.average_length = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def get_impacts(self, average_length):
+        """
+        Returns an array of the BM25 term frequency component of each
+        posting's score, which is calculated once for each average document
+        length.
+        """
+        if self.average_length != average_length:
+            norm = K1 * (1 - B)
+            length_norm = K1 * B / average_length
+            self.impacts = array.array('f', [
+                frequency * (K1 + 1) /
+                (frequency + norm + length_norm * length)
+                for frequency, length in itertools.izip(self.frequencies,
+                                                        self.lengths)])
+            self.average_length = average_length
+        return self.impacts
+
+class SearchIndex(object):
+    """
+    Searches the segment index, holding this process' copies of decoded
+    term postings.
+    """
+    def __init__(self, index=segment_index, result_cache=search_result_cache,
+                 max_entries=SEARCH_POSTINGS_CACHE_MAX_ENTRIES,
+                 max_size=SEARCH_POSTINGS_CACHE_MAX_SIZE):
+        self.index = index
+        self.result_cache = result_cache
+        self.postings = LRUCache({'max_entries': max_entries,
+                                  'max_size': max_size})
+
+    def get_postings(self, segment, term):
+        """
+        Returns the ``TermPostings`` for a term in a segment, which are
+        empty if none of its documents contain the term.
+        """
+        key = (segment.name, term)
+        postings = self.postings.get(key)
+        if postings is None:
+            postings = segment.get_postings(term.encode('utf-8'))
+            if postings is None:
+                postings = TermPostings(int_array(), int_array(),
+                                        int_array())
+            else:
+                postings = TermPostings(*postings)
+            self.postings.set(key, postings)
+        return postings
+
+    def get_statistics(self, segments):
+        """
+        Returns the number of live documents in the given ``(segment,
+        tombstones)`` tuples and the average length of all their documents.
+        """
+        count = documents = length = 0
+        for segment, tombstones in segments:
+            count += len(segment) - len(tombstones)
+            documents += len(segment)
+            length += segment.total_length
+        if documents:
+            return count, float(length) / documents
+        return 0, 0.0
+
+    def search(self, terms, tag_ids=(), limit=SEARCH_MAX_RESULTS):
+        """
+        Finds the Questions which contain all of the given terms and have
+        all of the Tags with the given ids, returning a list of the ids of
+        up to ``limit`` of them, most relevant first, and the total number
+        of matching Questions.
+
+        If no terms are given, Questions with the Tags are returned newest
+        first.
+        """
+        tag_ids = list(tag_ids)
+        if not terms:
+            if not tag_ids:
+                return [], 0
+            question_ids = tag_postings.intersect(tag_ids)
+            return list(question_ids[:-limit - 1:-1]), len(question_ids)
+
+        # The generation is checked before segments are loaded, so results
+        # are never cached under a later generation than they reflect.
+        key = 'soclone.search.results.%s.%s' % (
+            self.index.get_generation(), hashlib.md5(repr(
+                (sorted(terms), sorted(tag_ids), limit))).hexdigest())
+        results = self.result_cache.get(key)
+        if results is None:
+            results = SearchResults(*self.find(terms, tag_ids, limit))
+            self.result_cache.set(key, results)
+        return results.question_ids, results.total
+
+    def find(self, terms, tag_ids, limit):
+        """Searches the index for ``search``, without caching the results."""
+        segments = self.index.get_segments()
+        segment_postings = [[self.get_postings(segment, term)
+                             for term in terms]
+                            for segment, tombstones in segments]
+        count, average_length = self.get_statistics(segments)
+        average_length = average_length or 1.0
+        # A single term's weight doesn't affect the ranking. Document
+        # frequencies include dead documents until their segments are
+        # merged, which only slightly affects term weights.
+        weights = [1.0] * len(terms)
+        if len(terms) > 1:
+            for i in xrange(len(terms)):
+                document_frequency = sum([len(postings[i])
+                                          for postings in segment_postings])
+                weights[i] = math.log(
+                    1 + (max(count, document_frequency) -
+                         document_frequency + 0.5) /
+                    (document_frequency + 0.5))
+        tagged_ids = None
+        if tag_ids:
+            tagged_ids = tag_postings.intersect(tag_ids)
+
+        ranked = []
+        total = 0
+        for (segment, tombstones), postings in itertools.izip(
+                segments, segment_postings):
+            if not all(postings):
+                continue
+            question_ids, scores = self.search_segment(
+                postings, weights, tombstones, tagged_ids, average_length)
+            total += len(question_ids)
+            ranked.extend(rank(scores, question_ids, limit))
+        ranked = heapq.nlargest(limit, ranked)
+        return [question_id for score, question_id in ranked], total
+
+    def search_segment(self, postings, weights, tombstones, tagged_ids,
+                       average_length):
+        """
+        Finds and scores the live documents in a segment which appear in
+        all of the given ``TermPostings`` and in ``tagged_ids``, if given,
+        returning a sorted sequence of their ids and a list of their scores.
+        """
+        id_lists = [term_postings.ids for term_postings in postings]
+        if tagged_ids is not None:
+            id_lists.append(tagged_ids)
+        if len(id_lists) == 1:
+            question_ids = id_lists[0]
+        else:
+            question_ids = intersect(id_lists)
+        if len(id_lists) == 1 and not tombstones:
+            # Every posting matches, and its impact alone orders it
+            return question_ids, postings[0].get_impacts(average_length)
+        if tombstones:
+            question_ids = [question_id for question_id in question_ids
+                            if question_id not in tombstones]
+
+        # Each term's contribution to the scores of the matching Questions
+        # is calculated in turn, using builtins to find the positions of
+        # the matches in its postings and look up their impacts.
+        scores = [0.0] * len(question_ids)
+        for term_postings, weight in itertools.izip(postings, weights):
+            positions = map(bisect.bisect_left,
+                            itertools.repeat(term_postings.ids,
+                                             len(question_ids)),
+                            question_ids)
+            impacts = map(term_postings.get_impacts(average_length)
+                          .__getitem__, positions)
+            scores = map(operator.add, scores,
+                         map(operator.mul, itertools.repeat(weight,
+                                                            len(impacts)),
+                             impacts))
+        return question_ids, scores
+
+    def get_snippet(self, terms, question_id, length=SEARCH_SNIPPET_LENGTH):
+        """
+        Returns an HTML excerpt of the stored text of a Question, with the
+        given terms highlighted, or ``None`` if it isn't in the index.
+        """
+        for segment, tombstones in self.index.get_segments():
+            ids = segment.get_ids()
+            ordinal = bisect.bisect_left(ids, question_id)
+            if (ordinal == len(ids) or ids[ordinal] != question_id or
+                question_id in tombstones):
+                continue
+            term_lengths = {}
+            for term in terms:
+                index = segment.find_term(term.encode('utf-8'))
+                if index != -1:
+                    term_lengths[index] = len(term)
+            text, positions = segment.get_stored(ordinal, term_lengths)
+            matches = []
+            for index, term_positions in positions.iteritems():
+                matches.extend([(position, position + term_lengths[index])
+                                for position in term_positions])
+            matches.sort()
+            return make_snippet(text, matches, length)
+        return None
+
+search_index = SearchIndex()
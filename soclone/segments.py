@@ -0,0 +1,831 @@
+"""
+An on-disk search index made up of immutable segment files.
+
+Each segment holds the postings for a set of documents, keyed by Question
+id. Changes to the index are made by writing a new segment for the
+documents which were added or changed, and recording the ids of the
+documents it replaces, or which were removed, in tombstone files for the
+older segments which contain them. A manifest file lists the segments
+making up the index and their tombstones, and is replaced atomically.
+
+Segment files are opened with ``mmap``, so preforked processes share the
+operating system's page cache rather than each holding a copy, and opening
+the index only requires reading the manifest and segment headers. Segments
+are never modified once written, so postings read from them may be cached
+indefinitely.
+
+Alongside its postings, each document's stored text - the start of its
+Question's body - is kept with the positions of the terms in it, so
+excerpts highlighting search terms can be made without analysing the text
+again.
+
+As small segments accumulate, they're merged into larger ones in the
+background, dropping the documents recorded in their tombstones.
+
+Segment file format - integers are little-endian::
+
+    header      magic, document count, term count, total document length
+                and the offsets of the following sections
+    postings    for each term, a (document number delta, frequency) pair
+                for each document containing it, as varints
+    documents   an array of the documents' ids, in ascending order, then an
+                array of their lengths, as 32-bit integers, then an array of
+                the offsets of their stored records and the end of the
+                last, as 64-bit integers
+    stored      for each document, the length of its stored text's UTF-8
+                encoding and its number of distinct terms, the encoding,
+                then for each term, in order, the term's dictionary index
+                and the offset of its positions, then the character
+                positions of each term, as deltas in varints
+    dictionary  for each term, in order of its UTF-8 encoding, the offset
+                and length of its encoding, the offset of its postings and
+                the number of documents containing it
+    terms       the UTF-8 encodings of the terms
+"""
+import array
+import bisect
+import errno
+import fcntl
+import heapq
+import itertools
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.utils import simplejson
+
+SEARCH_INDEX_DIR = getattr(settings, 'SEARCH_INDEX_DIR',
+                           os.path.join(os.path.dirname(__file__),
+                                        'search_index'))
+# Number of similarly sized segments which are merged together
+SEARCH_MERGE_FACTOR = getattr(settings, 'SEARCH_MERGE_FACTOR', 10)
+
+MAGIC = 'SOCSEG2\0'
+HEADER = struct.Struct('<8sIIQQQQ')
+ENTRY = struct.Struct('<IHQI')
+RECORD_OFFSET = struct.Struct('<Q')
+RECORD_HEADER = struct.Struct('<II')
+VECTOR_ENTRY = struct.Struct('<II')
+
+MANIFEST = 'manifest.json'
+LOCK = 'lock'
+MERGE_LOCK = 'merge.lock'
+
+class CorruptSegment(Exception):
+    pass
+
+def int_array(values=()):
+    return array.array('i', values)
+
+def to_little_endian(values):
+    values = int_array(values)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values.tostring()
+
+def from_little_endian(data):
+    values = int_array()
+    values.fromstring(data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+def contains(ids, document_id):
+    """Returns ``True`` if a sorted array of ids contains the given id."""
+    position = bisect.bisect_left(ids, document_id)
+    return position < len(ids) and ids[position] == document_id
+
+def append_varint(data, value):
+    """Appends a non-negative integer to a bytearray as a varint."""
+    while value > 0x7f:
+        data.append((value & 0x7f) | 0x80)
+        value >>= 7
+    data.append(value)
+
+def encode_postings(ordinals, frequencies):
+    """
+    Encodes a term's postings as a (document number delta, frequency) pair
+    of varints for each document.
+    """
+    data = bytearray()
+    previous = 0
+    for ordinal, frequency in itertools.izip(ordinals, frequencies):
+        append_varint(data, ordinal - previous)
+        append_varint(data, frequency)
+        previous = ordinal
+    return data
+
+def decode_postings(data, count):
+    """
+    Decodes ``count`` postings, returning arrays of the document numbers
+    and frequencies.
+    """
+    ordinals = int_array()
+    frequencies = int_array()
+    position = ordinal = 0
+    for i in xrange(count):
+        value = shift = 0
+        while True:
+            byte = data[position]
+            position += 1
+            value |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        ordinal += value
+        ordinals.append(ordinal)
+        value = shift = 0
+        while True:
+            byte = data[position]
+            position += 1
+            value |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        frequencies.append(value)
+    return ordinals, frequencies
+
+def decode_positions(data):
+    """Decodes the character positions of a term from its deltas."""
+    positions = []
+    position = value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            position += value
+            positions.append(position)
+            value = shift = 0
+        else:
+            shift += 7
+    return positions
+
+def encode_record(text, term_positions):
+    """
+    Encodes a document's stored record, given its text and a list of
+    ``(dictionary index, character positions)`` tuples for the terms in it,
+    in order.
+    """
+    encoded_text = text.encode('utf-8')
+    entries = []
+    positions_data = bytearray()
+    for index, positions in term_positions:
+        entries.append(VECTOR_ENTRY.pack(index, len(positions_data)))
+        previous = 0
+        for position in positions:
+            append_varint(positions_data, position - previous)
+            previous = position
+    return ''.join([RECORD_HEADER.pack(len(encoded_text), len(entries)),
+                    encoded_text] + entries + [str(positions_data)])
+
+def renumber_record(record, indexes):
+    """
+    Changes the dictionary indexes of the terms in an encoded stored
+    record, given a sequence mapping old indexes to new ones.
+    """
+    text_length, entry_count = RECORD_HEADER.unpack_from(record, 0)
+    start = RECORD_HEADER.size + text_length
+    end = start + entry_count * VECTOR_ENTRY.size
+    entries = []
+    for i in xrange(start, end, VECTOR_ENTRY.size):
+        index, offset = VECTOR_ENTRY.unpack_from(record, i)
+        entries.append(VECTOR_ENTRY.pack(indexes[index], offset))
+    return ''.join([record[:start]] + entries + [record[end:]])
+
+def write_segment(path, ids, lengths, postings, records):
+    """
+    Writes a segment file for documents with the given ids, in ascending
+    order, and lengths. ``postings`` is an iterable of ``(term, document
+    numbers, frequencies)`` tuples in order of the terms' UTF-8 encodings,
+    where document numbers are indexes into ``ids``, and ``records`` is an
+    iterable of the documents' encoded stored records, which is consumed
+    after ``postings``.
+
+    The file is written under a temporary name and renamed once complete.
+    """
+    temporary_path = '%s.tmp' % path
+    f = open(temporary_path, 'wb')
+    try:
+        f.write('\0' * HEADER.size)
+        offset = HEADER.size
+        entries = []
+        terms = []
+        terms_length = 0
+        for term, ordinals, frequencies in postings:
+            data = encode_postings(ordinals, frequencies)
+            entries.append(ENTRY.pack(terms_length, len(term), offset,
+                                      len(ordinals)))
+            terms.append(term)
+            terms_length += len(term)
+            f.write(data)
+            offset += len(data)
+        documents_offset = offset
+        f.write(to_little_endian(ids))
+        f.write(to_little_endian(lengths))
+        # Record offsets are written once the records' lengths are known
+        offsets_offset = documents_offset + 8 * len(ids)
+        offset = offsets_offset + RECORD_OFFSET.size * (len(ids) + 1)
+        f.seek(offset)
+        record_offsets = []
+        for record in records:
+            record_offsets.append(offset)
+            f.write(record)
+            offset += len(record)
+        record_offsets.append(offset)
+        dictionary_offset = offset
+        f.seek(offsets_offset)
+        f.write(''.join([RECORD_OFFSET.pack(record_offset)
+                         for record_offset in record_offsets]))
+        f.seek(dictionary_offset)
+        f.write(''.join(entries))
+        terms_offset = dictionary_offset + ENTRY.size * len(entries)
+        f.write(''.join(terms))
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, len(ids), len(entries), sum(lengths),
+                            documents_offset, dictionary_offset,
+                            terms_offset))
+        f.flush()
+        os.fsync(f.fileno())
+    except:
+        f.close()
+        os.remove(temporary_path)
+        raise
+    f.close()
+    os.rename(temporary_path, path)
+
+def write_documents(path, documents):
+    """
+    Writes a segment file for documents given as a dict of ``(length, term
+    frequencies, text, term positions)`` tuples keyed by id, where ``term
+    positions`` is a dict of the character positions in the stored text of
+    each term in it, with terms as unicode strings.
+    """
+    ids = sorted(documents)
+    lengths = []
+    term_postings = {}
+    for ordinal, document_id in enumerate(ids):
+        length, frequencies, text, positions = documents[document_id]
+        lengths.append(length)
+        for term, frequency in frequencies.iteritems():
+            term_postings.setdefault(term.encode('utf-8'), []).append(
+                (ordinal, frequency))
+    terms = sorted(term_postings)
+    indexes = dict([(term, index) for index, term in enumerate(terms)])
+
+    def records():
+        for document_id in ids:
+            length, frequencies, text, positions = documents[document_id]
+            yield encode_record(text, sorted([
+                (indexes[term.encode('utf-8')], term_positions)
+                for term, term_positions in positions.iteritems()]))
+
+    write_segment(path, ids, lengths,
+                  ((term, [ordinal for ordinal, frequency in
+                           term_postings[term]],
+                    [frequency for ordinal, frequency in
+                     term_postings[term]])
+                   for term in terms), records())
+
+class Segment(object):
+    """A memory-mapped segment file."""
+    def __init__(self, path):
+        self.name = os.path.basename(path)
+        f = open(path, 'rb')
+        try:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            f.close()
+        if len(self.data) < HEADER.size:
+            raise CorruptSegment('Segment %s is truncated' % self.name)
+        (magic, self.document_count, self.term_count, self.total_length,
+         self.documents_offset, self.dictionary_offset,
+         self.terms_offset) = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            raise CorruptSegment('Segment %s has an unknown format' %
+                                 self.name)
+        self._ids = None
+        self._lengths = None
+
+    def __len__(self):
+        return self.document_count
+
+    def get_ids(self):
+        """Returns an array of the ids of the documents in this segment."""
+        if self._ids is None:
+            self._ids = from_little_endian(self.data[
+                self.documents_offset:
+                self.documents_offset + 4 * self.document_count])
+        return self._ids
+
+    def get_lengths(self):
+        """Returns an array of the lengths of the documents in this segment."""
+        if self._lengths is None:
+            offset = self.documents_offset + 4 * self.document_count
+            self._lengths = from_little_endian(self.data[
+                offset:offset + 4 * self.document_count])
+        return self._lengths
+
+    def get_record(self, ordinal):
+        """Returns the encoded stored record for a document."""
+        start, end = struct.unpack_from(
+            '<QQ', self.data, self.documents_offset +
+            8 * self.document_count + RECORD_OFFSET.size * ordinal)
+        return self.data[start:end]
+
+    def get_stored(self, ordinal, indexes):
+        """
+        Returns a document's stored text and a dict of the character
+        positions in it of the terms with the given dictionary indexes.
+        """
+        record = self.get_record(ordinal)
+        text_length, entry_count = RECORD_HEADER.unpack_from(record, 0)
+        start = RECORD_HEADER.size + text_length
+        text = record[RECORD_HEADER.size:start].decode('utf-8')
+        positions_start = start + entry_count * VECTOR_ENTRY.size
+        positions = {}
+        for index in indexes:
+            # Binary search the sorted entries for the term
+            low, high = 0, entry_count
+            while low < high:
+                middle = (low + high) // 2
+                if VECTOR_ENTRY.unpack_from(
+                        record, start + middle * VECTOR_ENTRY.size)[0] < index:
+                    low = middle + 1
+                else:
+                    high = middle
+            if low == entry_count:
+                continue
+            entry_index, offset = VECTOR_ENTRY.unpack_from(
+                record, start + low * VECTOR_ENTRY.size)
+            if entry_index != index:
+                continue
+            if low + 1 < entry_count:
+                end = positions_start + VECTOR_ENTRY.unpack_from(
+                    record, start + (low + 1) * VECTOR_ENTRY.size)[1]
+            else:
+                end = len(record)
+            positions[index] = decode_positions(
+                bytearray(record[positions_start + offset:end]))
+        return text, positions
+
+    def get_entry(self, index):
+        """
+        Returns the term, postings offset and document count for the
+        dictionary entry with the given index.
+        """
+        term_offset, term_length, postings_offset, count = ENTRY.unpack_from(
+            self.data, self.dictionary_offset + index * ENTRY.size)
+        term_offset += self.terms_offset
+        return (self.data[term_offset:term_offset + term_length],
+                postings_offset, count)
+
+    def find_term(self, term):
+        """
+        Returns the index of the dictionary entry for a term, encoded as
+        UTF-8, or ``-1`` if no documents in this segment contain it.
+        """
+        low, high = 0, self.term_count
+        while low < high:
+            middle = (low + high) // 2
+            if self.get_entry(middle)[0] < term:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.term_count and self.get_entry(low)[0] == term:
+            return low
+        return -1
+
+    def iter_terms(self, key=None):
+        """
+        Yields a ``(term, key, index)`` tuple for each term, encoded as
+        UTF-8, in order.
+        """
+        for index in xrange(self.term_count):
+            yield self.get_entry(index)[0], key, index
+
+    def read_postings(self, index):
+        """
+        Returns arrays of the document numbers and frequencies for the
+        dictionary entry with the given index.
+        """
+        term, offset, count = self.get_entry(index)
+        if index + 1 < self.term_count:
+            end = self.get_entry(index + 1)[1]
+        else:
+            end = self.documents_offset
+        return decode_postings(bytearray(self.data[offset:end]), count)
+
+    def get_postings(self, term):
+        """
+        Returns arrays of the ids of the documents which contain a term,
+        encoded as UTF-8, sorted by id, and the term's frequencies in and
+        the lengths of those documents, or ``None`` if no documents in this
+        segment contain the term.
+        """
+        index = self.find_term(term)
+        if index == -1:
+            return None
+        ordinals, frequencies = self.read_postings(index)
+        return (int_array(map(self.get_ids().__getitem__, ordinals)),
+                frequencies,
+                int_array(map(self.get_lengths().__getitem__, ordinals)))
+
+def choose_merge(segments, merge_factor=SEARCH_MERGE_FACTOR):
+    """
+    Chooses segments to merge, given a list of ``(segment, tombstones)``
+    tuples, or returns an empty list if no merge is required.
+
+    Segments are grouped into tiers by the order of magnitude, in base
+    ``merge_factor``, of their number of live documents, and a tier's
+    segments are merged once there are ``merge_factor`` of them. A
+    segment where most documents are dead is merged on its own, to
+    reclaim their space.
+    """
+    tiers = {}
+    for segment, tombstones in segments:
+        live = len(segment) - len(tombstones)
+        if tombstones and live < len(tombstones):
+            return [(segment, tombstones)]
+        tier = int(math.log(max(live, 1), merge_factor))
+        tiers.setdefault(tier, []).append((segment, tombstones))
+    for tier in sorted(tiers):
+        if len(tiers[tier]) >= merge_factor:
+            return tiers[tier][:merge_factor]
+    return []
+
+def merge_segments(path, segments):
+    """
+    Writes a segment file containing the live documents from the given
+    ``(segment, tombstones)`` tuples.
+    """
+    documents = []
+    for i, (segment, tombstones) in enumerate(segments):
+        for ordinal, (document_id, length) in enumerate(itertools.izip(
+                segment.get_ids(), segment.get_lengths())):
+            if document_id not in tombstones:
+                documents.append((document_id, length, i, ordinal))
+    documents.sort()
+    # Map each segment's document numbers to those in the merged segment,
+    # with -1 for dead documents.
+    renumbered = [int_array([-1]) * len(segment) for segment, tombstones in
+                  segments]
+    for ordinal, (document_id, length, i, old_ordinal) in enumerate(
+            documents):
+        renumbered[i][old_ordinal] = ordinal
+
+    # Map each segment's dictionary indexes to those in the merged segment
+    indexes = [int_array([-1]) * segment.term_count for segment, tombstones
+               in segments]
+
+    def postings():
+        terms = heapq.merge(*[segments[i][0].iter_terms(i)
+                              for i in xrange(len(segments))])
+        index = 0
+        for term, entries in itertools.groupby(terms, lambda entry: entry[0]):
+            entries = list(entries)
+            merged = []
+            for term, i, old_index in entries:
+                ordinals, frequencies = segments[i][0].read_postings(
+                    old_index)
+                for ordinal, frequency in itertools.izip(ordinals,
+                                                         frequencies):
+                    ordinal = renumbered[i][ordinal]
+                    if ordinal != -1:
+                        merged.append((ordinal, frequency))
+            if merged:
+                for term, i, old_index in entries:
+                    indexes[i][old_index] = index
+                index += 1
+                merged.sort()
+                yield (term, [ordinal for ordinal, frequency in merged],
+                       [frequency for ordinal, frequency in merged])
+
+    def records():
+        for document_id, length, i, ordinal in documents:
+            yield renumber_record(segments[i][0].get_record(ordinal),
+                                  indexes[i])
+
+    write_segment(path, [document[0] for document in documents],
+                  [document[1] for document in documents], postings(),
+                  records())
+
+class SegmentIndex(object):
+    """
+    A search index stored in a directory of segment files, shared by all
+    processes.
+
+    Readers are reopened whenever the manifest is replaced. Writers hold an
+    exclusive lock on the directory only while updating the manifest, and
+    a separate lock ensures only one process merges segments at a time.
+
+    The manifest's generation is incremented whenever documents are added
+    or removed, but not by merges, which don't change what's indexed.
+    """
+    def __init__(self, path=SEARCH_INDEX_DIR,
+                 merge_factor=SEARCH_MERGE_FACTOR, auto_merge=True):
+        self.path = path
+        self.merge_factor = merge_factor
+        self.auto_merge = auto_merge
+        self.lock = threading.Lock()
+        self.merging = False
+        self.counter = itertools.count()
+        self.manifest_stat = None
+        self.generation = 0
+        self.segments = []
+        self.open_segments = {}
+
+    def get_path(self, name):
+        return os.path.join(self.path, name)
+
+    def create_name(self, extension):
+        return '%s-%s-%s.%s' % (int(time.time() * 1000), os.getpid(),
+                                self.counter.next(), extension)
+
+    def read_manifest(self):
+        try:
+            f = open(self.get_path(MANIFEST))
+        except IOError, e:
+            if e.errno == errno.ENOENT:
+                return {'generation': 0, 'segments': []}
+            raise
+        try:
+            return simplejson.load(f)
+        finally:
+            f.close()
+
+    def write_manifest(self, manifest):
+        """Replaces the manifest atomically."""
+        temporary_path = self.get_path('%s.tmp' % MANIFEST)
+        f = open(temporary_path, 'w')
+        try:
+            simplejson.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        finally:
+            f.close()
+        os.rename(temporary_path, self.get_path(MANIFEST))
+
+    def read_tombstones(self, name):
+        if name is None:
+            return frozenset()
+        f = open(self.get_path(name), 'rb')
+        try:
+            return frozenset(from_little_endian(f.read()))
+        finally:
+            f.close()
+
+    def write_tombstones(self, tombstones):
+        name = self.create_name('del')
+        f = open(self.get_path(name), 'wb')
+        try:
+            f.write(to_little_endian(sorted(tombstones)))
+            f.flush()
+            os.fsync(f.fileno())
+        finally:
+            f.close()
+        return name
+
+    def lock_directory(self, name=LOCK, blocking=True):
+        """
+        Acquires an exclusive lock on a lock file in the index directory,
+        returning the open file, or ``None`` if the lock couldn't be
+        acquired without blocking.
+        """
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        f = open(self.get_path(name), 'a')
+        try:
+            if blocking:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            else:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except IOError, e:
+            f.close()
+            if e.errno in (errno.EAGAIN, errno.EACCES):
+                return None
+            raise
+        return f
+
+    def unlock_directory(self, f):
+        fcntl.flock(f, fcntl.LOCK_UN)
+        f.close()
+
+    def get_segments(self):
+        """
+        Returns a list of ``(segment, tombstones)`` tuples for the segments
+        currently making up the index, where ``tombstones`` is a set of the
+        ids of the documents in the segment which have been replaced or
+        removed.
+        """
+        try:
+            stat = os.stat(self.get_path(MANIFEST))
+            stat = (stat.st_ino, stat.st_mtime, stat.st_size)
+        except OSError:
+            stat = None
+        if stat == self.manifest_stat:
+            return self.segments
+        self.lock.acquire()
+        try:
+            if stat != self.manifest_stat:
+                self.load_segments(stat)
+            return self.segments
+        finally:
+            self.lock.release()
+
+    def get_generation(self):
+        """Returns the generation of the index's current manifest."""
+        self.get_segments()
+        return self.generation
+
+    def load_segments(self, stat):
+        # Files may be removed by another process between reading the
+        # manifest and opening them, in which case a newer manifest will
+        # have been written.
+        for attempt in xrange(3):
+            manifest = self.read_manifest()
+            try:
+                segments = []
+                open_segments = {}
+                for entry in manifest['segments']:
+                    segment = self.open_segments.get(entry['name'])
+                    if segment is None:
+                        segment = Segment(self.get_path(entry['name']))
+                    open_segments[entry['name']] = segment
+                    segments.append(
+                        (segment, self.read_tombstones(entry['tombstones'])))
+                break
+            except IOError, e:
+                if e.errno != errno.ENOENT or attempt == 2:
+                    raise
+        self.segments = segments
+        self.open_segments = open_segments
+        self.generation = manifest['generation']
+        self.manifest_stat = stat
+
+    def update(self, documents, removed_ids=()):
+        """
+        Adds documents, given as a dict of ``(length, term frequencies,
+        text, term positions)`` tuples keyed by id - as described for
+        ``write_documents`` - to the index in a new segment, replacing any
+        existing documents with the same ids, and removes the documents
+        with the given ids.
+        """
+        name = None
+        if documents:
+            if not os.path.isdir(self.path):
+                os.makedirs(self.path)
+            name = self.create_name('seg')
+            write_documents(self.get_path(name), documents)
+        dead_ids = set(documents) | set(removed_ids)
+        if not dead_ids:
+            return
+        lock = self.lock_directory()
+        try:
+            manifest = self.read_manifest()
+            obsolete = []
+            for entry in manifest['segments']:
+                segment = self.open_segments.get(entry['name'])
+                if segment is None:
+                    segment = Segment(self.get_path(entry['name']))
+                ids = segment.get_ids()
+                dead_in_segment = set([document_id for document_id in dead_ids
+                                       if contains(ids, document_id)])
+                if not dead_in_segment:
+                    continue
+                tombstones = self.read_tombstones(entry['tombstones'])
+                if dead_in_segment <= tombstones:
+                    continue
+                if entry['tombstones'] is not None:
+                    obsolete.append(entry['tombstones'])
+                entry['tombstones'] = self.write_tombstones(
+                    tombstones | dead_in_segment)
+            if name is not None:
+                manifest['segments'].append({'name': name,
+                                             'tombstones': None})
+            manifest['generation'] += 1
+            self.write_manifest(manifest)
+            self.remove_files(obsolete)
+        finally:
+            self.unlock_directory(lock)
+        if self.auto_merge:
+            self.start_merging()
+
+    def remove_files(self, names):
+        for name in names:
+            try:
+                os.remove(self.get_path(name))
+            except OSError:
+                pass
+
+    def start_merging(self):
+        """
+        Starts a background thread to merge segments if a merge is required
+        and this process isn't already merging.
+        """
+        if (self.merging or
+            not choose_merge(self.get_segments(), self.merge_factor)):
+            return
+        self.lock.acquire()
+        try:
+            if self.merging:
+                return
+            self.merging = True
+        finally:
+            self.lock.release()
+        thread = threading.Thread(target=self.run_merges)
+        thread.setDaemon(True)
+        thread.start()
+
+    def run_merges(self):
+        try:
+            self.merge()
+        finally:
+            self.merging = False
+
+    def merge(self, optimize=False):
+        """
+        Merges segments until the merge policy requires no further merges,
+        or into a single segment if ``optimize`` is ``True``. Returns the
+        number of merges performed, which is ``0`` if another process is
+        already merging.
+        """
+        lock = self.lock_directory(MERGE_LOCK, blocking=False)
+        if lock is None:
+            return 0
+        merges = 0
+        try:
+            while True:
+                segments = self.get_segments()
+                if optimize:
+                    if len(segments) < 2 and not (
+                        segments and segments[0][1]):
+                        break
+                    chosen = segments
+                else:
+                    chosen = choose_merge(segments, self.merge_factor)
+                if not chosen:
+                    break
+                self.merge_chosen(chosen)
+                merges += 1
+        finally:
+            self.unlock_directory(lock)
+        return merges
+
+    def merge_chosen(self, chosen):
+        """Replaces the chosen segments with a single merged segment."""
+        name = self.create_name('seg')
+        merge_segments(self.get_path(name), chosen)
+        merged = Segment(self.get_path(name))
+        merged_tombstones = dict([(segment.name, tombstones)
+                                  for segment, tombstones in chosen])
+        lock = self.lock_directory()
+        try:
+            manifest = self.read_manifest()
+            entries = []
+            obsolete = []
+            dead_ids = set()
+            for entry in manifest['segments']:
+                if entry['name'] in merged_tombstones:
+                    # Documents replaced or removed during the merge
+                    dead_ids |= (self.read_tombstones(entry['tombstones']) -
+                                 merged_tombstones[entry['name']])
+                    obsolete.append(entry['name'])
+                    if entry['tombstones'] is not None:
+                        obsolete.append(entry['tombstones'])
+                else:
+                    entries.append(entry)
+            if len(merged) == len(dead_ids):
+                obsolete.append(name)
+            else:
+                tombstones = None
+                if dead_ids:
+                    tombstones = self.write_tombstones(dead_ids)
+                entries.append({'name': name, 'tombstones': tombstones})
+            manifest['segments'] = entries
+            self.write_manifest(manifest)
+            self.remove_files(obsolete)
+        finally:
+            self.unlock_directory(lock)
+
+    def clear(self):
+        """Removes every segment from the index."""
+        lock = self.lock_directory()
+        try:
+            manifest = self.read_manifest()
+            obsolete = []
+            for entry in manifest['segments']:
+                obsolete.append(entry['name'])
+                if entry['tombstones'] is not None:
+                    obsolete.append(entry['tombstones'])
+            manifest['segments'] = []
+            manifest['generation'] += 1
+            self.write_manifest(manifest)
+            self.remove_files(obsolete)
+        finally:
+            self.unlock_directory(lock)
+
+segment_index = SegmentIndex()
@@ -70,6 +70,7 @@ TEMPLATE_LOADERS = (
 )
 
 MIDDLEWARE_CLASSES = (
+    'soclone.middleware.SearchUpdateMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -114,6 +115,129 @@ INSTALLED_APPS = (
     'soclone',
 )
 
+# Rendered Markdown cache settings. Backends are 'local' (a per-process LRU
+# cache), 'shared' (the cache configured by CACHE_BACKEND), 'tiered' (local
+# in front of shared), 'dummy' or a dotted path to a
+# soclone.utils.cache.BaseCache subclass.
+RENDER_CACHE_BACKEND = 'tiered'
+RENDER_CACHE_MAX_ENTRIES = 1000
+RENDER_CACHE_MAX_SIZE = 4 * 1024 * 1024 # Total length of cached HTML
+RENDER_CACHE_TIMEOUT = 60 * 60 * 24     # Seconds, for the shared cache
+
+# Revision text storage - 'full' stores the text of every revision, 'delta'
+# stores a full keyframe every REVISION_KEYFRAME_INTERVAL revisions and
+# deltas in between. Use the convert_revisions command to convert existing
+# revisions.
+REVISION_STORAGE = 'full'
+REVISION_KEYFRAME_INTERVAL = 10
+
+# Write-behind for denormalised comment, favourite and offensive flag counts.
+# When enabled, changes are journalled and applied in batches coalesced per
+# post, once a process has journalled COUNTER_FLUSH_THRESHOLD changes or
+# COUNTER_FLUSH_INTERVAL seconds have passed since it last flushed, and every
+# COUNTER_FLUSH_INTERVAL seconds from a background thread in each process which
+# has journalled changes. Run the flush_counters command to apply changes left
+# waiting by processes which have exited.
+COUNTER_WRITE_BEHIND = False
+COUNTER_FLUSH_INTERVAL = 5 # Seconds
+COUNTER_FLUSH_THRESHOLD = 100
+
+# Question views are counted in memory and written every
+# VIEW_COUNT_FLUSH_INTERVAL seconds. Repeat views by the same user or IP
+# address within VIEW_COUNT_DEDUPLICATION_WINDOW seconds aren't counted.
+VIEW_COUNT_FLUSH_INTERVAL = 10
+VIEW_COUNT_DEDUPLICATION_WINDOW = 30 * 60
+
+# Store each User's privilege bitmask alongside their reputation score rather
+# than calculating it on each request. Run the refresh_privileges command
+# after enabling this.
+STORE_USER_PRIVILEGES = False
+
+# The decay_hotness command rescores Questions active within the last
+# HOTNESS_DECAY_WINDOW hours, plus inactive Questions whose stored hotness is
+# still above HOTNESS_DECAY_FLOOR.
+HOTNESS_DECAY_WINDOW = 48 # Hours
+HOTNESS_DECAY_FLOOR = 0.01
+
+# Rendered question list pages are cached using the same backends as the
+# Markdown render cache. Cached pages are invalidated whenever Questions see
+# activity - this requires a shared CACHE_BACKEND when running more than one
+# process - and are refreshed every QUESTION_LIST_CACHE_TIMEOUT seconds to
+# pick up view counts. Pages of the views given in QUESTION_LIST_MAX_STALENESS
+# ignore activity and are refreshed every given number of seconds instead.
+QUESTION_LIST_CACHE_BACKEND = 'tiered'
+QUESTION_LIST_CACHE_MAX_ENTRIES = 500
+QUESTION_LIST_CACHE_MAX_SIZE = 8 * 1024 * 1024 # Total length of cached HTML
+QUESTION_LIST_CACHE_TIMEOUT = 5 * 60           # Seconds
+QUESTION_LIST_MAX_STALENESS = {                # Seconds, by view id
+    'hot': 30,
+    'activity': 30,
+}
+
+# Posting lists of the Questions which have each Tag are held by each process,
+# up to POSTING_LIST_CACHE_MAX_ENTRIES lists and POSTING_LIST_CACHE_MAX_SIZE
+# Question ids in total, and reloaded after POSTING_LIST_MAX_AGE seconds.
+POSTING_LIST_CACHE_MAX_ENTRIES = 1000
+POSTING_LIST_CACHE_MAX_SIZE = 4000000
+POSTING_LIST_MAX_AGE = 60 # Seconds
+
+# Number of related Tags displayed for a Tag, and how long each Tag's related
+# Tags are cached for.
+RELATED_TAGS_COUNT = 10
+RELATED_TAGS_CACHE_TIMEOUT = 60 * 60 # Seconds
+
+# The index of Tag names used for autocompletion and the Tag filter is held
+# by each process and reloaded after TAG_INDEX_MAX_AGE seconds, or as soon as
+# a Tag is created.
+TAG_INDEX_MAX_AGE = 5 * 60 # Seconds
+
+# The search index is held in segment files in SEARCH_INDEX_DIR, which must
+# be shared by every process serving the site, and SEARCH_MERGE_FACTOR
+# similarly sized segments are merged at a time. Postings decoded from
+# segments for up to SEARCH_POSTINGS_CACHE_MAX_ENTRIES terms and
+# SEARCH_POSTINGS_CACHE_MAX_SIZE postings in total are held by each process.
+# Up to SEARCH_MAX_RESULTS results are ranked.
+SEARCH_INDEX_DIR = os.path.join(DIRNAME, 'search_index')
+SEARCH_MERGE_FACTOR = 10
+SEARCH_POSTINGS_CACHE_MAX_ENTRIES = 10000
+SEARCH_POSTINGS_CACHE_MAX_SIZE = 10000000
+SEARCH_MAX_RESULTS = 1000
+# Weights of terms in Question titles and Tags relative to their bodies and
+# Answers
+SEARCH_TITLE_WEIGHT = 3
+SEARCH_TAG_WEIGHT = 3
+# Search results are cached by the SEARCH_RESULT_CACHE_BACKEND backend (see
+# soclone.utils.cache) for SEARCH_RESULT_CACHE_TIMEOUT seconds, or until the
+# index changes. Excerpts of about SEARCH_SNIPPET_LENGTH characters are made
+# from the first SEARCH_STORED_TEXT_LENGTH characters of each Question's
+# body, which are stored in the index.
+SEARCH_RESULT_CACHE_BACKEND = 'tiered'
+SEARCH_RESULT_CACHE_MAX_ENTRIES = 1000
+SEARCH_RESULT_CACHE_MAX_SIZE = 1000000 # Question ids
+SEARCH_RESULT_CACHE_TIMEOUT = 300 # Seconds
+SEARCH_SNIPPET_LENGTH = 200
+SEARCH_STORED_TEXT_LENGTH = 1000
+
+# Up to SIMILAR_QUESTIONS_COUNT Questions whose MinHash signatures have an
+# estimated similarity of at least SIMILAR_QUESTIONS_MIN_SIMILARITY are
+# suggested as possible duplicates, from the SIMILAR_QUESTIONS_MAX_CANDIDATES
+# sharing the most signature band buckets with the Question being asked.
+SIMILAR_QUESTIONS_COUNT = 10
+SIMILAR_QUESTIONS_MAX_CANDIDATES = 500
+SIMILAR_QUESTIONS_MIN_SIMILARITY = 0.2
+
+# Everything displayed on a Question's page to anonymous visitors is cached
+# by the QUESTION_PAGE_CACHE_BACKEND backend, so their page views don't query
+# the database. Cached pages are invalidated whenever the Question, its
+# Answers, Votes or Comments change - this requires a shared CACHE_BACKEND
+# when running more than one process - and are refreshed every
+# QUESTION_PAGE_CACHE_TIMEOUT seconds to pick up view counts, reputation and
+# Tag use counts.
+QUESTION_PAGE_CACHE_BACKEND = 'tiered'
+QUESTION_PAGE_CACHE_MAX_ENTRIES = 1000
+QUESTION_PAGE_CACHE_MAX_SIZE = 16 * 1024 * 1024 # Total length of post HTML
+QUESTION_PAGE_CACHE_TIMEOUT = 5 * 60            # Seconds
+
 # Load local settings if present - place setting modifications in a
 # local_settings module rather than editing this file, which should
 # contain development settings.
@@ -1,5 +1,7 @@
 from django.core.paginator import EmptyPage
 
+from soclone.pagination import InvalidCursor, KeysetPaginator
+
 def get_page(request, paginator, page_param='page'):
     """
     Uses the page number specified as a GET parameter in a request to
@@ -9,6 +11,10 @@ def get_page(request, paginator, page_param='page'):
     first page will be retrieved.
 
     If the specified page is empty, the last page will be retrieved.
+
+    For a ``KeysetPaginator``, any ``after`` or ``before`` cursor GET
+    parameter is also used - if it isn't valid, the page will be
+    retrieved by number instead.
     """
     try:
         page = int(request.GET.get(page_param, '1'))
@@ -16,6 +22,12 @@ def get_page(request, paginator, page_param='page'):
         page = 1
 
     try:
+        if isinstance(paginator, KeysetPaginator):
+            try:
+                return paginator.page(page, after=request.GET.get('after'),
+                                      before=request.GET.get('before'))
+            except InvalidCursor:
+                pass
         return paginator.page(page)
     except EmptyPage:
         return paginator.page(paginator.num_pages)
@@ -0,0 +1,6 @@
+-- Composite indexes for unanswered Question lists, created by syncdb. For an
+-- existing database, print them with "manage.py sqlcustom soclone".
+CREATE INDEX soclone_question_unanswered_added_at ON soclone_question (unanswered, added_at);
+CREATE INDEX soclone_question_unanswered_hotness ON soclone_question (unanswered, hotness);
+CREATE INDEX soclone_question_unanswered_score ON soclone_question (unanswered, score, added_at);
+CREATE INDEX soclone_question_unanswered_last_activity_at ON soclone_question (unanswered, last_activity_at);
@@ -0,0 +1,3 @@
+-- Index for looking up Questions by signature band bucket, created by
+-- syncdb. For an existing database, print it with "manage.py sqlcustom soclone".
+CREATE INDEX soclone_questionsignatureband_band_bucket ON soclone_questionsignatureband (band, bucket);
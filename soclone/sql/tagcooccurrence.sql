@@ -0,0 +1,3 @@
+-- Index for finding the most common related Tags for a Tag, created by
+-- syncdb. For an existing database, print it with "manage.py sqlcustom soclone".
+CREATE INDEX soclone_tagcooccurrence_tag_question_count ON soclone_tagcooccurrence (tag_id, question_count);
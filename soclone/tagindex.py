@@ -0,0 +1,158 @@
+"""
+An in-memory index of Tag names for autocompletion and filtering.
+
+Tag names are held by each process, joined into a single string in order
+of use count and another in order of name, each name preceded by a
+newline. Finding the Tags whose names contain some text is then a matter
+of repeatedly searching one of the strings for it - and for names which
+start with it, searching for it preceded by a newline - with the index of
+each match found by bisecting the offsets of the names. Matches are found
+in the string's order, so the most used Tags starting with a prefix are
+the first few matches, and searching can stop as soon as enough are found.
+
+The index is loaded on demand. When a Tag is created, a version number
+held in the shared cache is bumped, so every process reloads its copy.
+As use counts change continually, copies are also reloaded once they're
+older than ``TAG_INDEX_MAX_AGE`` seconds.
+"""
+import bisect
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Seconds after which the index is reloaded from the database
+TAG_INDEX_MAX_AGE = getattr(settings, 'TAG_INDEX_MAX_AGE', 5 * 60)
+
+VERSION_KEY = 'soclone.tagindex.version'
+VERSION_TIMEOUT = 60 * 60 * 24 * 30
+
+class NameList(object):
+    """Tag names in a particular order, joined for searching."""
+    def __init__(self, tags):
+        self.tags = tags
+        self.offsets = []
+        parts = []
+        offset = 0
+        for tag_id, name, use_count in tags:
+            self.offsets.append(offset)
+            parts.append(u'\n')
+            parts.append(name)
+            offset += len(name) + 1
+        self.text = u''.join(parts)
+
+    def find(self, text, prefix=False, limit=None):
+        """
+        Returns ``(id, name, use_count)`` tuples for Tags whose names
+        contain the given text, or start with it if ``prefix`` is
+        ``True``, in this list's order.
+        """
+        result = []
+        if u'\n' in text:
+            return result
+        if prefix:
+            text = u'\n' + text
+        position = self.text.find(text)
+        while position != -1:
+            index = bisect.bisect_right(self.offsets, position) - 1
+            result.append(self.tags[index])
+            if limit is not None and len(result) >= limit:
+                break
+            # Each name only needs to be matched once
+            if index + 1 < len(self.offsets):
+                position = self.text.find(text, self.offsets[index + 1])
+            else:
+                position = -1
+        return result
+
+class TagList(object):
+    """
+    A sequence of the Tags found in the index, which retrieves Tag objects
+    only for slices taken from it.
+    """
+    def __init__(self, tags):
+        self.tags = tags
+
+    def __len__(self):
+        return len(self.tags)
+
+    def __getitem__(self, index):
+        from soclone.models import Tag
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        tag_ids = [tag[0] for tag in self.tags[index]]
+        tags = Tag.objects.in_bulk(tag_ids)
+        return [tags[tag_id] for tag_id in tag_ids if tag_id in tags]
+
+class TagIndex(object):
+    """Holds this process' copy of the Tag name index."""
+    def __init__(self, max_age=TAG_INDEX_MAX_AGE):
+        self.max_age = max_age
+        self.lists = None
+        self.version = None
+        self.loaded_at = 0
+        self.lock = threading.Lock()
+
+    def get_lists(self):
+        """
+        Returns a dict of ``NameList`` objects for the ``'popular'`` and
+        ``'name'`` orderings, reloading them if they're out of date.
+        """
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            # Start from the current time, so a version which has been
+            # evicted isn't reused.
+            version = int(time.time() * 1000)
+            if not cache.add(VERSION_KEY, version, VERSION_TIMEOUT):
+                version = cache.get(VERSION_KEY, version)
+        lists = self.lists
+        if (lists is None or self.version != version or
+            time.time() - self.loaded_at > self.max_age):
+            self.lock.acquire()
+            try:
+                # Another thread may have reloaded the index while waiting
+                if (self.lists is None or self.version != version or
+                    time.time() - self.loaded_at > self.max_age):
+                    self.lists = self.load()
+                    self.version = version
+                    self.loaded_at = time.time()
+                lists = self.lists
+            finally:
+                self.lock.release()
+        return lists
+
+    def load(self):
+        from soclone.models import Tag
+        tags = list(Tag.objects.order_by('-use_count', 'name').values_list(
+            'id', 'name', 'use_count'))
+        return {
+            'popular': NameList(tags),
+            'name': NameList(sorted(tags, key=lambda tag: tag[1])),
+        }
+
+    def complete(self, prefix, limit):
+        """
+        Returns ``(id, name, use_count)`` tuples for up to ``limit`` of the
+        most used Tags whose names start with the given prefix.
+        """
+        return self.get_lists()['popular'].find(prefix, prefix=True,
+                                                limit=limit)
+
+    def filter(self, text, ordering):
+        """
+        Returns ``(id, name, use_count)`` tuples for all Tags whose names
+        contain the given text, in the given ordering - ``'popular'`` or
+        ``'name'``.
+        """
+        return self.get_lists()[ordering].find(text)
+
+    def invalidate(self):
+        """Makes every process reload the index, such as when a Tag is added."""
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            pass
+        self.lists = None
+
+tag_index = TagIndex()
@@ -4,6 +4,8 @@ import urllib
 from django import template
 from django.contrib.humanize.templatetags.humanize import intcomma
 from django.template.defaultfilters import pluralize
+from django.utils.encoding import smart_str
+from django.utils.html import escape
 from django.utils.safestring import mark_safe
 
 from soclone import auth
@@ -48,9 +50,21 @@ def extra_url_params(extra_params, context):
         else:
             value = template.Variable(value).resolve(context)
         params[param] = value
-    return '&amp;%s' % u'&amp;'.join(u'%s=%s' % (urllib.quote_plus(param),
-                                                 urllib.quote_plus(value))
-                                     for param, value in params.iteritems())
+    return '&amp;%s' % u'&amp;'.join(
+        u'%s=%s' % (urllib.quote_plus(param),
+                    urllib.quote_plus(smart_str(value)))
+        for param, value in params.iteritems())
+
+def cursor_url_params(page, number):
+    """
+    Generates a URL fragment which specifies the cursor required to
+    retrieve the page with the given number, if the page supports keyset
+    pagination, or returns an empty string otherwise.
+    """
+    if not hasattr(page, 'get_cursor_params'):
+        return u''
+    return u''.join(u'&amp;%s=%s' % (param, urllib.quote_plus(cursor))
+                    for param, cursor in page.get_cursor_params(number).items())
 
 ###########
 # Filters #
@@ -175,6 +189,18 @@ def reputation(user):
         })
     return mark_safe(u''.join(spans))
 
+@register.simple_tag
+def search_snippet(question, view):
+    """
+    Creates an excerpt of a Question's text with the terms searched for in
+    the given view highlighted, or displays its summary if an excerpt
+    isn't available.
+    """
+    snippet = view.get_snippet(question.id)
+    if snippet is None:
+        snippet = u'%s &hellip;' % escape(question.summary)
+    return mark_safe(snippet)
+
 class PagerNode(template.Node):
     def __init__(self, page_var, extra_params):
         self.page_var = template.Variable(page_var)
@@ -182,34 +208,34 @@ class PagerNode(template.Node):
 
     def render(self, context):
         page = self.page_var.resolve(context)
-        link_template = (u'<a href="?page=%%s%s" class="%%s">%%s</a>' %
-                         extra_url_params(self.extra_params, context))
+        link_template = (u'<a href="?page=%%s%%s%s" class="%%s">%%s</a>' %
+                         extra_url_params(self.extra_params,
+                                          context).replace(u'%', u'%%'))
+        def link(number, class_, text):
+            return link_template % (number, cursor_url_params(page, number),
+                                    class_, text)
         html = [u'<div class="pager">']
         if page.has_previous():
-            html.append(link_template % (page.previous_page_number(),
-                                         u'previous', u'previous'))
+            html.append(link(page.previous_page_number(), u'previous',
+                             u'previous'))
         if page.number > 2:
-            html.append(link_template % (1, u'first page-number', 1))
+            html.append(link(1, u'first page-number', 1))
             if page.number > 3:
                 html.append(u'<span class="divider">&hellip;</span>')
         if page.has_previous():
-            html.append(link_template % (page.previous_page_number(),
-                                         u'page-number',
-                                         page.previous_page_number()))
+            html.append(link(page.previous_page_number(), u'page-number',
+                             page.previous_page_number()))
         html.append(u'<span class="current page-number">%s</span>' % page.number)
         if page.has_next():
-            html.append(link_template % (page.next_page_number(),
-                                         u'page-number',
-                                         page.next_page_number()))
+            html.append(link(page.next_page_number(), u'page-number',
+                             page.next_page_number()))
         if page.number < page.paginator.num_pages - 1:
             if page.number < page.paginator.num_pages - 2:
                 html.append(u'<span class="divider">&hellip;</span>')
-            html.append(link_template % (page.paginator.num_pages,
-                                         u'last page-number',
-                                         page.paginator.num_pages))
+            html.append(link(page.paginator.num_pages, u'last page-number',
+                             page.paginator.num_pages))
         if page.has_next():
-            html.append(link_template % (page.next_page_number(), u'next',
-                                         u'next'))
+            html.append(link(page.next_page_number(), u'next', u'next'))
         html.append(u'</div>')
         return u' '.join(html)
 
@@ -236,7 +262,8 @@ class SizerNode(template.Node):
         page = self.page_var.resolve(context)
         link_template = (
             u'<a href="?page=%s&amp;pagesize=%%s%s" class="%%s">%%s</a>' % (
-                page.number, extra_url_params(self.extra_params, context)))
+                page.number, extra_url_params(self.extra_params,
+                                              context).replace(u'%', u'%%')))
         html = [u'<div class="sizer">']
         for page_size, description in QUESTIONS_PER_PAGE_CHOICES:
             if page.paginator.per_page == page_size:
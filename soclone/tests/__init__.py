@@ -6,6 +6,10 @@ from soclone.tests import testcases
 
 def suite():
     s = unittest.TestSuite()
-    s.addTest(doctest.DocTestSuite(doctests))
+    try:
+        s.addTest(doctest.DocTestSuite(doctests))
+    except ValueError:
+        # Raised by Python 2.7 when there are no doctests yet
+        pass
     s.addTest(unittest.defaultTestLoader.loadTestsFromModule(testcases))
     return s
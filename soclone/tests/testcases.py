@@ -0,0 +1,43 @@
+import datetime
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from soclone.models import Question, Total
+
+class QuestionListTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice', 'alice@example.com',
+                                             'password')
+        self.answered = self.create_question(u'Answered question')
+        self.unanswered = self.create_question(u'Unanswered question')
+        Question.objects.filter(id=self.answered.id).update(unanswered=False)
+
+    def create_question(self, title):
+        now = datetime.datetime.now()
+        return Question.objects.create(title=title, author=self.user,
+            added_at=now, last_activity_at=now, last_activity_by=self.user,
+            tagnames=u'python', summary=title, html=u'<p>%s</p>' % title)
+
+    def test_lists_are_cached_separately(self):
+        """
+        The all and unanswered Question lists have views with the same ids,
+        which mustn't share cached pages.
+        """
+        response = self.client.get('/questions/', {'sort': 'newest'})
+        self.assertContains(response, u'Answered question')
+        response = self.client.get('/unanswered/', {'sort': 'newest'})
+        self.assertNotContains(response, u'Answered question')
+        self.assertContains(response, u'Unanswered question')
+
+    def test_deleted_question_totals(self):
+        """
+        Deleting a Question uses its stored ``unanswered`` flag, rather
+        than a stale one, to update the count of unanswered Questions.
+        """
+        unanswered_count = Total.objects.get_value('unanswered_questions')
+        # The loaded instance still thinks it's unanswered
+        self.answered.delete()
+        self.assertEqual(Total.objects.get_value('unanswered_questions'),
+                         unanswered_count)
+        self.assertEqual(Total.objects.get_value('questions'), 1)
@@ -12,6 +12,7 @@ urlpatterns = patterns('soclone.views',
     url(r'^logout/$',                                    'logout',             name='logout'),
     url(r'^questions/$',                                 'questions',          name='questions'),
     url(r'^questions/ask/$',                             'ask_question',       name='ask_question'),
+    url(r'^questions/similar/$',                         'similar_questions',  name='similar_questions'),
     url(r'^questions/tagged/(?P<tag_name>[^/]+)/$',      'tag',                name='tag'),
     url(r'^questions/(?P<question_id>\d+)/answer/$',     'add_answer',         name='add_answer'),
     url(r'^questions/(?P<question_id>\d+)/close/$',      'close_question',     name='close_question'),
@@ -33,6 +34,7 @@ urlpatterns = patterns('soclone.views',
     url(r'^answers/(?P<object_id>\d+)/vote/$',           'vote',               name='vote_on_answer', kwargs={'model': Answer}),
     url(r'^comments/(?P<comment_id>\d+)/delete/$',       'delete_comment',     name='delete_comment'),
     url(r'^tags/$',                                      'tags',               name='tags'),
+    url(r'^tags/autocomplete/$',                         'tag_autocomplete',   name='tag_autocomplete'),
     url(r'^users/$',                                     'users',              name='users'),
     url(r'^users/(?P<user_id>\d+)/(?:[^/]+/)?$',         'user',               name='user'),
     url(r'^badges/$',                                    'badges',             name='badges'),
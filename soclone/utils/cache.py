@@ -0,0 +1,240 @@
+"""Utilities for caching."""
+import threading
+
+from django.core.cache import cache as django_cache
+from django.utils.importlib import import_module
+
+class BaseCache(object):
+    """
+    Base for caches which keep a count of hits and misses.
+
+    ``get`` returns ``None`` on a cache miss, so ``None`` can't be cached.
+
+    Backend options are passed in a ``params`` dict, as with Django's own
+    cache backends.
+    """
+    def __init__(self, params=None):
+        self.params = params or {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self._get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def _get(self, key):
+        raise NotImplementedError
+
+    def get_stats(self):
+        """Returns a dict of cache statistics."""
+        return {'hits': self.hits, 'misses': self.misses}
+
+class DummyCache(BaseCache):
+    """A cache which doesn't cache anything."""
+    def _get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+# Indices into linked list entries used by LRUCache
+PREV, NEXT, KEY, VALUE = 0, 1, 2, 3
+
+class LRUCache(BaseCache):
+    """
+    A process-local, thread-safe cache which discards the least recently
+    used items when it holds more than ``max_entries`` items or the total
+    length of its values exceeds ``max_size``.
+
+    Recency is tracked with a circular doubly-linked list of
+    ``[prev, next, key, value]`` entries, so gets and sets are O(1).
+    """
+    def __init__(self, params=None):
+        super(LRUCache, self).__init__(params)
+        self.max_entries = self.params.get('max_entries', 1000)
+        self.max_size = self.params.get('max_size', None)
+        self.size = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self._entries = {}
+        self._root = root = []
+        root[:] = [root, root, None, None]
+        self.size = 0
+
+    def _get(self, key):
+        self._lock.acquire()
+        try:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._unlink(entry)
+            self._link(entry)
+            return entry[VALUE]
+        finally:
+            self._lock.release()
+
+    def set(self, key, value):
+        size = len(value)
+        if self.max_size is not None and size > self.max_size:
+            return
+        self._lock.acquire()
+        try:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._unlink(entry)
+                self.size -= len(entry[VALUE])
+                entry[VALUE] = value
+            else:
+                entry = [None, None, key, value]
+                self._entries[key] = entry
+            self._link(entry)
+            self.size += size
+            while (len(self._entries) > self.max_entries or
+                   (self.max_size is not None and self.size > self.max_size)):
+                self._evict()
+        finally:
+            self._lock.release()
+
+    def delete(self, key):
+        self._lock.acquire()
+        try:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._unlink(entry)
+                self.size -= len(entry[VALUE])
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        self._lock.acquire()
+        try:
+            self._clear()
+        finally:
+            self._lock.release()
+
+    def get_stats(self):
+        stats = super(LRUCache, self).get_stats()
+        stats.update({
+            'entries': len(self._entries),
+            'size': self.size,
+            'evictions': self.evictions,
+        })
+        return stats
+
+    def _link(self, entry):
+        """Links an entry in as the most recently used."""
+        root = self._root
+        last = root[PREV]
+        entry[PREV], entry[NEXT] = last, root
+        last[NEXT] = root[PREV] = entry
+
+    def _unlink(self, entry):
+        entry[PREV][NEXT], entry[NEXT][PREV] = entry[NEXT], entry[PREV]
+
+    def _evict(self):
+        """Discards the least recently used entry."""
+        entry = self._root[NEXT]
+        self._unlink(entry)
+        del self._entries[entry[KEY]]
+        self.size -= len(entry[VALUE])
+        self.evictions += 1
+
+class SharedCache(BaseCache):
+    """
+    A cache shared between processes, which uses the cache configured in
+    Django's ``CACHE_BACKEND`` setting.
+    """
+    def __init__(self, params=None):
+        super(SharedCache, self).__init__(params)
+        self.timeout = self.params.get('timeout', None)
+
+    def _get(self, key):
+        return django_cache.get(key)
+
+    def set(self, key, value):
+        django_cache.set(key, value, self.timeout)
+
+    def delete(self, key):
+        django_cache.delete(key)
+
+    def clear(self):
+        raise NotImplementedError('The shared cache must be cleared through '
+                                  'its own backend.')
+
+class TieredCache(BaseCache):
+    """
+    A process-local LRUCache in front of a SharedCache - items found in
+    the shared cache are copied into the local cache.
+    """
+    def __init__(self, params=None):
+        super(TieredCache, self).__init__(params)
+        self.local = LRUCache(self.params)
+        self.shared = SharedCache(self.params)
+
+    def _get(self, key):
+        value = self.local.get(key)
+        if value is None:
+            value = self.shared.get(key)
+            if value is not None:
+                self.local.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self.local.set(key, value)
+        self.shared.set(key, value)
+
+    def delete(self, key):
+        self.local.delete(key)
+        self.shared.delete(key)
+
+    def clear(self):
+        self.local.clear()
+
+    def get_stats(self):
+        stats = super(TieredCache, self).get_stats()
+        stats.update({
+            'local': self.local.get_stats(),
+            'shared': self.shared.get_stats(),
+        })
+        return stats
+
+BACKENDS = {
+    'dummy': DummyCache,
+    'local': LRUCache,
+    'shared': SharedCache,
+    'tiered': TieredCache,
+}
+
+def get_cache(backend, params=None):
+    """
+    Creates a cache using one of the backends named in ``BACKENDS`` or a
+    dotted path to a BaseCache subclass.
+    """
+    if backend in BACKENDS:
+        cache_class = BACKENDS[backend]
+    else:
+        module_name, class_name = backend.rsplit('.', 1)
+        cache_class = getattr(import_module(module_name), class_name)
+    return cache_class(params)
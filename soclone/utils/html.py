@@ -1,6 +1,10 @@
 """Utilities for working with HTML."""
+import hashlib
+
 import html5lib
 from html5lib import sanitizer, serializer, tokenizer, treebuilders, treewalkers
+from html5lib.constants import (headingElements, namespaces, scopingElements,
+    specialElements, tokenTypes, voidElements)
 
 class HTMLSanitizerMixin(sanitizer.HTMLSanitizerMixin):
     acceptable_elements = ('a', 'abbr', 'acronym', 'address', 'b', 'big',
@@ -25,6 +29,16 @@ class HTMLSanitizerMixin(sanitizer.HTMLSanitizerMixin):
     allowed_css_keywords = ()
     allowed_svg_properties = ()
 
+# Identifies the current sanitizer whitelist, so anything derived from
+# sanitized HTML can be invalidated when the whitelist changes.
+WHITELIST_VERSION = hashlib.md5(repr((
+    HTMLSanitizerMixin.allowed_elements,
+    HTMLSanitizerMixin.allowed_attributes,
+    HTMLSanitizerMixin.allowed_css_properties,
+    HTMLSanitizerMixin.allowed_css_keywords,
+    HTMLSanitizerMixin.allowed_svg_properties,
+))).hexdigest()[:8]
+
 class HTMLSanitizer(tokenizer.HTMLTokenizer, HTMLSanitizerMixin):
     def __init__(self, stream, encoding=None, parseMeta=True, useChardet=True,
                  lowercaseElementName=True, lowercaseAttrName=True):
@@ -38,14 +52,122 @@ class HTMLSanitizer(tokenizer.HTMLTokenizer, HTMLSanitizerMixin):
             if token:
                 yield token
 
-def sanitize_html(html):
-    """Sanitizes an HTML fragment."""
+class TreeConstructionRequired(Exception):
+    """
+    Raised when a sanitized token stream contains markup which an HTML
+    parser would restructure, so it can't be serialized directly.
+    """
+    pass
+
+# Start tags which cause a parser to close an open <p>
+P_CLOSING_ELEMENTS = frozenset(('address', 'article', 'aside', 'blockquote',
+    'center', 'datagrid', 'details', 'dir', 'div', 'dl', 'dd', 'dt',
+    'fieldset', 'figure', 'footer', 'form', 'header', 'hgroup', 'hr', 'li',
+    'listing', 'menu', 'nav', 'ol', 'p', 'plaintext', 'pre', 'section',
+    'table', 'ul', 'xmp') + headingElements)
+
+# Elements which a parser would insert into, or move content out of
+TABLE_ELEMENTS = frozenset(('caption', 'col', 'colgroup', 'table', 'tbody',
+    'td', 'tfoot', 'th', 'thead', 'tr'))
+
+# Open elements which a list item start tag would close
+LIST_ITEM_CLOSES = {
+    'li': ('li',),
+    'dd': ('dd', 'dt'),
+    'dt': ('dd', 'dt'),
+}
+
+# Open elements which stop the search for a list item to close
+LIST_ITEM_BOUNDARIES = frozenset(name for namespace, name
+    in scopingElements | specialElements
+    if namespace == namespaces['html']) - frozenset(('address', 'div', 'p'))
+
+def _serializable_tokens(tokens):
+    """
+    Converts sanitized tokenizer tokens into the tokens expected by the
+    serializer, closing any elements left open at the end of the fragment
+    and dropping the newline which may follow a ``<pre>`` start tag, as a
+    parser would.
+
+    Raises ``TreeConstructionRequired`` for anything else a parser would
+    change - misnested end tags, implicitly closed elements, nested links
+    and table content.
+    """
+    open_elements = []
+    emitted = 0
+    # Position of a <pre> whose leading newline may need to be dropped
+    drop_newline_at = None
+    for token in tokens:
+        type = token['type']
+        if type == tokenTypes['Characters']:
+            if token['data']:
+                emitted += 1
+                yield {'type': 'Characters', 'data': token['data']}
+        elif type == tokenTypes['SpaceCharacters']:
+            data = token['data']
+            if drop_newline_at is not None:
+                if (drop_newline_at == (len(open_elements), emitted) and
+                    data.startswith('\n')):
+                    data = data[1:]
+                drop_newline_at = None
+            if data:
+                emitted += 1
+                yield {'type': 'SpaceCharacters', 'data': data}
+        elif type in (tokenTypes['StartTag'], tokenTypes['EmptyTag']):
+            name = token['name']
+            if name in TABLE_ELEMENTS:
+                raise TreeConstructionRequired(name)
+            if name in P_CLOSING_ELEMENTS and 'p' in open_elements:
+                raise TreeConstructionRequired(name)
+            if (name in headingElements and open_elements and
+                open_elements[-1] in headingElements):
+                raise TreeConstructionRequired(name)
+            if name in LIST_ITEM_CLOSES:
+                for open_name in reversed(open_elements):
+                    if open_name in LIST_ITEM_CLOSES[name]:
+                        raise TreeConstructionRequired(name)
+                    if open_name in LIST_ITEM_BOUNDARIES:
+                        break
+            if name == 'a' and 'a' in open_elements:
+                raise TreeConstructionRequired(name)
+            emitted += 1
+            yield {'type': 'StartTag', 'name': name, 'data': token['data']}
+            if name not in voidElements:
+                open_elements.append(name)
+                if name in ('pre', 'listing'):
+                    drop_newline_at = (len(open_elements), emitted)
+        elif type == tokenTypes['EndTag']:
+            name = token['name']
+            if not open_elements or open_elements[-1] != name:
+                raise TreeConstructionRequired(name)
+            open_elements.pop()
+            emitted += 1
+            yield {'type': 'EndTag', 'name': name, 'data': []}
+        # Comments, doctypes and parse errors don't appear in the output
+    for name in reversed(open_elements):
+        yield {'type': 'EndTag', 'name': name, 'data': []}
+
+def _serialize(stream):
+    s = serializer.HTMLSerializer(omit_optional_tags=False,
+                                  quote_attr_values=True)
+    return u''.join(s.serialize(stream))
+
+def sanitize_html(html, streaming=True):
+    """
+    Sanitizes an HTML fragment.
+
+    When ``streaming`` is ``True``, sanitized tokens are passed straight
+    to the serializer without building a DOM. Fragments which a parser
+    would restructure fall back to being sanitized via a DOM, so the output
+    is the same either way.
+    """
+    if streaming:
+        try:
+            return _serialize(_serializable_tokens(HTMLSanitizer(html)))
+        except TreeConstructionRequired:
+            pass
     p = html5lib.HTMLParser(tokenizer=HTMLSanitizer,
                             tree=treebuilders.getTreeBuilder("dom"))
     dom_tree = p.parseFragment(html)
     walker = treewalkers.getTreeWalker("dom")
-    stream = walker(dom_tree)
-    s = serializer.HTMLSerializer(omit_optional_tags=False,
-                                  quote_attr_values=True)
-    output_generator = s.serialize(stream)
-    return u''.join(output_generator)
+    return _serialize(walker(dom_tree))
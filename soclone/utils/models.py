@@ -2,6 +2,7 @@
 import itertools
 
 from django.contrib.contenttypes.models import ContentType
+from django.db.models.query import ValuesListQuerySet
 
 from soclone.utils.lists import flatten
 
@@ -90,3 +91,30 @@ def populate_content_object_caches(generic_related_objects, model_fields=None):
     for obj in generic_related_objects:
         obj._object_cache = objects[obj.content_type_id][obj.object_id]
         obj._content_type_cache = content_types[obj.content_type_id]
+
+class RowQuerySet(ValuesListQuerySet):
+    """
+    A QuerySet which retrieves only the given fields and yields each row
+    as an instance of its ``row_class``, which is created with a list of
+    field attribute names and a list of the corresponding values.
+    """
+    def iterator(self):
+        opts = self.model._meta
+        attnames = [opts.get_field(name).attname for name in self._fields]
+        row_class = self.row_class
+        for values in super(RowQuerySet, self).iterator():
+            yield row_class(attnames, values)
+
+    def _clone(self, *args, **kwargs):
+        clone = super(RowQuerySet, self)._clone(*args, **kwargs)
+        if not hasattr(clone, 'row_class'):
+            clone.row_class = self.row_class
+        return clone
+
+def row_queryset(queryset, row_class, fields):
+    """
+    Creates a ``RowQuerySet`` from the given QuerySet, which retrieves
+    the given fields as instances of ``row_class``.
+    """
+    return queryset._clone(klass=RowQuerySet, setup=True, flat=False,
+                           _fields=tuple(fields), row_class=row_class)
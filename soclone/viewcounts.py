@@ -0,0 +1,168 @@
+"""
+Buffered counting of Question views.
+
+Views are counted in memory by each process, ignoring repeat views of a
+Question by the same user or IP address within a time window, and written
+to ``Question.view_count`` in batches by a background thread. Any views
+which are still pending when the process exits are written then.
+"""
+import atexit
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from soclone.models import Question
+
+# Seconds between writes of pending views to the database
+FLUSH_INTERVAL = getattr(settings, 'VIEW_COUNT_FLUSH_INTERVAL', 10)
+# Seconds during which repeat views by the same visitor aren't counted
+DEDUPLICATION_WINDOW = getattr(settings, 'VIEW_COUNT_DEDUPLICATION_WINDOW',
+                               30 * 60)
+# Maximum number of Question ids per UPDATE
+UPDATE_BATCH_SIZE = 500
+
+def get_visitor(request):
+    """Creates a key identifying the user or IP address making a request."""
+    if request.user.is_authenticated():
+        return 'user:%s' % request.user.id
+    return 'ip:%s' % request.META.get('REMOTE_ADDR', '')
+
+@transaction.commit_on_success
+def update_view_counts(counts):
+    """
+    Adds view counts, given as a dict of counts keyed by Question id, to
+    the stored counts, using one UPDATE for each distinct count, and
+    updates the Questions' hotness scores.
+    """
+    question_ids_by_count = {}
+    for question_id, count in counts.items():
+        question_ids_by_count.setdefault(count, []).append(question_id)
+    cursor = connection.cursor()
+    for count, question_ids in question_ids_by_count.items():
+        for i in xrange(0, len(question_ids), UPDATE_BATCH_SIZE):
+            batch = question_ids[i:i + UPDATE_BATCH_SIZE]
+            cursor.execute(
+                'UPDATE soclone_question '
+                'SET view_count = view_count + %%s '
+                'WHERE id IN (%s)' % ', '.join(['%s'] * len(batch)),
+                [count] + batch)
+    Question.objects.update_hotness(counts.keys())
+    transaction.commit_unless_managed()
+
+class ViewCounter(object):
+    """
+    Counts Question views in memory and periodically writes them to the
+    database from a background thread.
+    """
+    def __init__(self, flush_interval=FLUSH_INTERVAL,
+                 deduplication_window=DEDUPLICATION_WINDOW):
+        self.flush_interval = flush_interval
+        self.deduplication_window = deduplication_window
+        self.lock = threading.Lock()
+        # Held for the duration of a flush, so a flush at exit waits for
+        # one in progress to complete.
+        self.flush_lock = threading.Lock()
+        self.pending = {}
+        self.flushing = {}
+        self.seen = {}
+        self.pid = None
+
+    def record(self, question_id, visitor):
+        """
+        Counts a view of a Question unless the visitor has viewed it
+        within the deduplication window, returning ``True`` if the view
+        was counted.
+        """
+        now = time.time()
+        key = (question_id, visitor)
+        self.lock.acquire()
+        try:
+            seen_at = self.seen.get(key)
+            if (seen_at is not None and
+                now - seen_at < self.deduplication_window):
+                return False
+            self.seen[key] = now
+            self.pending[question_id] = self.pending.get(question_id, 0) + 1
+        finally:
+            self.lock.release()
+        self.start()
+        return True
+
+    def get_pending_count(self, question_id):
+        """
+        Returns the number of views of a Question counted by this process
+        which haven't been written to the database yet.
+        """
+        return (self.pending.get(question_id, 0) +
+                self.flushing.get(question_id, 0))
+
+    def flush(self):
+        """
+        Writes pending views to the database and forgets visitors whose
+        views are outside the deduplication window, returning the number
+        of views written.
+
+        If writing fails, the views remain pending.
+        """
+        self.flush_lock.acquire()
+        try:
+            self.lock.acquire()
+            try:
+                self.flushing, self.pending = self.pending, {}
+                cutoff = time.time() - self.deduplication_window
+                self.seen = dict([(key, seen_at)
+                                  for key, seen_at in self.seen.iteritems()
+                                  if seen_at > cutoff])
+            finally:
+                self.lock.release()
+            if not self.flushing:
+                return 0
+            try:
+                update_view_counts(self.flushing)
+            except:
+                self.lock.acquire()
+                try:
+                    for question_id, count in self.flushing.items():
+                        self.pending[question_id] = (
+                            self.pending.get(question_id, 0) + count)
+                finally:
+                    self.lock.release()
+                raise
+            return sum(self.flushing.values())
+        finally:
+            self.flushing = {}
+            self.flush_lock.release()
+
+    def start(self):
+        """
+        Starts the background thread which flushes pending views, if it
+        isn't already running in this process.
+        """
+        if self.pid == os.getpid():
+            return
+        self.lock.acquire()
+        try:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+        finally:
+            self.lock.release()
+        thread = threading.Thread(target=self.run)
+        thread.setDaemon(True)
+        thread.start()
+
+    def run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                # Views remain pending until the next attempt
+                pass
+            connection.close()
+
+view_counter = ViewCounter()
+atexit.register(view_counter.flush)
@@ -6,61 +6,104 @@ from django.contrib.auth.models import User
 from django.contrib.auth import views as auth_views
 from django.contrib.contenttypes.models import ContentType
 from django.core.paginator import Paginator, InvalidPage
+from django.db import transaction
 from django.http import Http404, HttpResponseRedirect
 from django.shortcuts import get_object_or_404, render_to_response
 from django.template import RequestContext
+from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 from django.utils.safestring import mark_safe
 
-from lxml.html.diff import htmldiff
-from markdown2 import Markdown
 from soclone import auth
 from soclone import diff
+from soclone import markup
 from soclone.forms import (AddAnswerForm, AskQuestionForm, CloseQuestionForm,
     CommentForm, EditAnswerForm, EditQuestionForm, RetagQuestionForm,
     RevisionForm)
+from soclone.forms.fields import tag_split_re
 from soclone.http import JsonResponse
 from soclone.models import (Answer, AnswerRevision, Badge, Comment,
-    FavouriteQuestion, Question, QuestionRevision, Tag, Vote)
+    FavouriteQuestion, Question, QuestionRevision, QuestionSignature,
+    ReputationEvent, Tag, TagCooccurrence, UsernameTrigram, Vote,
+    invalidate_question_lists, invalidate_question_page, render_revision)
+from soclone.questionpages import (ANSWER_SORT, ANSWERS_PER_PAGE,
+    DEFAULT_ANSWER_SORT, USER_DETAIL_FIELDS, get_question_page)
 from soclone.questions import (all_question_views, index_question_views,
-    unanswered_question_views)
+    question_list_cache, question_list_cache_key, search_question_views,
+    SearchQuestionView, TaggedQuestionView, unanswered_question_views)
+from soclone.search import parse_query
 from soclone.shortcuts import get_page
-from soclone.utils.html import sanitize_html
+from soclone.tagindex import TagList, tag_index
 from soclone.utils.models import populate_foreign_key_caches
-
-markdowner = Markdown(html4tags=True)
+from soclone.viewcounts import get_visitor, view_counter
 
 AUTO_WIKI_ANSWER_COUNT = 30
 
+REVISIONS_PER_PAGE = 10
+
 def get_questions_per_page(user):
     if user.is_authenticated():
         return user.questions_per_page
     return 10
 
-def question_list(request, question_views, template, questions_per_page=None,
-                  page_number=None, extra_context=None):
+def question_list(request, question_views, template, fragment_template,
+                  questions_per_page=None, page_number=None, extra_fields=(),
+                  extra_context=None):
     """
     Question list generic view.
 
     Allows the user to select from a number of ways of viewing questions,
     rendered with the given template.
+
+    The list itself is rendered with the given fragment template and
+    cached, keyed by view, page and page size, until Questions see
+    activity. It's made available to the template as ``questions_html``.
+
+    Questions are retrieved as ``QuestionRow`` objects holding only the
+    fields required to display the selected view - any other fields used
+    by the fragment template must be given as ``extra_fields``. The caches
+    of any User ForeignKeys among them will be populated.
     """
     view_id = request.GET.get('sort', None)
     view = dict([(q.id, q) for q in question_views]).get(view_id,
                                                          question_views[0])
     if questions_per_page is None:
         questions_per_page = get_questions_per_page(request.user)
-    paginator = Paginator(view.get_queryset(), questions_per_page)
     if page_number is None:
-        page = get_page(request, paginator)
+        try:
+            cache_page_number = int(request.GET.get('page', '1'))
+        except ValueError:
+            cache_page_number = 1
+        cursor = u'%s:%s' % (request.GET.get('after', u''),
+                             request.GET.get('before', u''))
     else:
-        page = paginator.page(page_number)
-    populate_foreign_key_caches(User, ((page.object_list, (view.user,)),),
-                                fields=view.user_fields)
+        cache_page_number = page_number
+        cursor = u''
+    cache_key = question_list_cache_key(view, fragment_template,
+                                        cache_page_number,
+                                        questions_per_page,
+                                        cursor.encode('utf-8'))
+    questions_html = question_list_cache.get(cache_key)
+    if questions_html is None:
+        paginator = view.get_paginator(questions_per_page, extra_fields)
+        if page_number is None:
+            page = get_page(request, paginator)
+        else:
+            page = paginator.page(page_number)
+        users = [view.user] + [field for field in extra_fields
+                               if field != view.user and
+                               Question._meta.get_field(field).rel is not None]
+        populate_foreign_key_caches(User, ((page.object_list, users),),
+                                    fields=view.user_fields)
+        questions_html = render_to_string(fragment_template, {
+            'page': page,
+            'questions': page.object_list,
+            'current_view': view,
+        })
+        question_list_cache.set(cache_key, questions_html)
     context = {
         'title': view.page_title,
-        'page': page,
-        'questions': page.object_list,
+        'questions_html': mark_safe(questions_html),
         'current_view': view,
         'question_views': question_views,
     }
@@ -75,7 +118,9 @@ def index(request):
         # TODO Retrieve extra context required for index page
     }
     return question_list(request, index_question_views, 'index.html',
+                         'index_question_summaries.html',
                          questions_per_page=50, page_number=1,
+                         extra_fields=('last_activity_at', 'last_activity_by'),
                          extra_context=extra_context)
 
 def about(request):
@@ -87,8 +132,23 @@ def faq(request):
     raise NotImplementedError
 
 def search(request):
-    """Search Questions and Answers."""
-    raise NotImplementedError
+    """
+    Searches Questions and Answers. Searches may be restricted to Tags by
+    giving their names in square brackets, such as ``[python]``.
+    """
+    query = request.GET.get('q', u'').strip()
+    terms, tagnames = parse_query(query)
+    tags = list(Tag.objects.filter(name__in=tagnames))
+    if len(tags) != len(tagnames):
+        tags = None
+    return question_list(request,
+                         [SearchQuestionView(view, query, terms, tags)
+                          for view in search_question_views],
+                         'search.html', 'search_question_summaries.html',
+                         extra_context={
+                             'title': u'Search Results',
+                             'query': query,
+                         })
 
 def login(request):
     """Logs in."""
@@ -100,23 +160,32 @@ def logout(request):
 
 def questions(request):
     """All Questions list."""
-    return question_list(request, all_question_views, 'questions.html')
+    return question_list(request, all_question_views, 'questions.html',
+                         'question_summaries.html')
 
 def unanswered(request):
     """Unanswered Questions list."""
-    return question_list(request, unanswered_question_views, 'unanswered.html')
+    return question_list(request, unanswered_question_views, 'unanswered.html',
+                         'question_summaries.html')
 
-ANSWER_SORT = {
-    'votes': ('-score', '-added_at'),
-    'newest': ('-added_at',),
-    'oldest': ('added_at',),
-}
-
-DEFAULT_ANSWER_SORT = 'votes'
+def get_answer_sort(request):
+    """Returns the Answer ordering selected in a request."""
+    answer_sort_type = request.GET.get('sort', DEFAULT_ANSWER_SORT)
+    if answer_sort_type not in ANSWER_SORT:
+        answer_sort_type = DEFAULT_ANSWER_SORT
+    return answer_sort_type
 
 def question(request, question_id):
-    """Displays a Question."""
+    """
+    Displays a Question.
+
+    The first page of Answers is displayed to anonymous visitors from the
+    Question's cached page - see ``soclone.questionpages``.
+    """
     if not request.user.is_authenticated():
+        if ('showcomments' not in request.GET and
+            request.GET.get('page', '1') == '1'):
+            return _cached_question(request, question_id)
         question = get_object_or_404(Question, id=question_id)
         favourite = False
     else:
@@ -134,13 +203,14 @@ def question(request, question_id):
     if 'showcomments' in request.GET:
         return question_comments(request, question)
 
-    answer_sort_type = request.GET.get('sort', DEFAULT_ANSWER_SORT)
-    if answer_sort_type not in ANSWER_SORT:
-        answer_sort_type = DEFAULT_ANSWER_SORT
+    view_counter.record(question.id, get_visitor(request))
+    question.view_count += view_counter.get_pending_count(question.id)
+
+    answer_sort_type = get_answer_sort(request)
     order_by = ANSWER_SORT[answer_sort_type]
     paginator = Paginator(Answer.objects.for_question(
                               question, request.user).order_by(*order_by),
-                          AUTO_WIKI_ANSWER_COUNT)
+                          ANSWERS_PER_PAGE)
     # Save ourselves a COUNT() query by using the denormalised count
     paginator._count = question.answer_count
     page = get_page(request, paginator)
@@ -150,8 +220,7 @@ def question(request, question_id):
             ((question,), ('author', 'last_edited_by', 'closed_by')),
             (answers,     ('author', 'last_edited_by'))
          ),
-         fields=('username', 'gravatar', 'reputation', 'gold', 'silver',
-                 'bronze'))
+         fields=USER_DETAIL_FIELDS)
 
     # Look up vote status for the current user
     question_vote, answer_votes = Vote.objects.get_for_question_and_answers(
@@ -173,6 +242,43 @@ def question(request, question_id):
         'tags': question.tags.all(),
     }, context_instance=RequestContext(request))
 
+def _cached_question(request, question_id):
+    """
+    Displays a Question and the first page of its Answers to an anonymous
+    visitor from its cached page, without querying the database when the
+    page is cached.
+    """
+    question_page = get_question_page(int(question_id))
+    if question_page is None:
+        raise Http404
+    question = question_page.get_question()
+
+    view_counter.record(question.id, get_visitor(request))
+    question.view_count += view_counter.get_pending_count(question.id)
+
+    answer_sort_type = get_answer_sort(request)
+    page = question_page.get_answer_page(answer_sort_type)
+
+    # Anonymous visitors have no votes, so this doesn't query the database
+    question_vote, answer_votes = Vote.objects.get_for_question_and_answers(
+        request.user, question, page.object_list)
+
+    title = question.title
+    if question.closed:
+        title = '%s [closed]' % title
+    return render_to_response('question.html', {
+        'title': title,
+        'question': question,
+        'question_vote': question_vote,
+        'favourite': False,
+        'answers': page.object_list,
+        'answer_votes': answer_votes,
+        'page': page,
+        'answer_sort': answer_sort_type,
+        'answer_form': AddAnswerForm(),
+        'tags': question_page.tags,
+    }, context_instance=RequestContext(request))
+
 def question_comments(request, question, form=None):
     """
     Displays a Question and any Comments on it.
@@ -207,7 +313,7 @@ def ask_question(request):
     if request.method == 'POST':
         form = AskQuestionForm(request.POST)
         if form.is_valid():
-            html = sanitize_html(markdowner.convert(form.cleaned_data['text']))
+            html = markup.render(form.cleaned_data['text'])
             if 'preview' in request.POST:
                 # The user submitted the form to preview the formatted question
                 preview = mark_safe(html)
@@ -253,6 +359,28 @@ def ask_question(request):
         'preview': preview,
     }, context_instance=RequestContext(request))
 
+def similar_questions(request):
+    """
+    Finds Questions similar to one being asked, given its title in the
+    ``title`` parameter, as a list of ``[title, url, similarity]`` lists,
+    most similar first.
+
+    Stored signatures are made from titles alone, so matches can be found
+    as soon as a title has been typed.
+    """
+    title = request.GET.get('title', u'').strip()
+    if not title:
+        return JsonResponse([])
+    similar = QuestionSignature.objects.find_similar(title)
+    questions = Question.objects.filter(deleted=False).only(
+        'id', 'title').in_bulk([question_id
+                                for question_id, similarity in similar])
+    return JsonResponse([[questions[question_id].title,
+                          questions[question_id].get_absolute_url(),
+                          round(similarity, 2)]
+                         for question_id, similarity in similar
+                         if question_id in questions])
+
 def edit_question(request, question_id):
     """
     Entry point for editing a question.
@@ -298,8 +426,7 @@ def _edit_question(request, question):
             # Always check modifications against the latest revision
             form = EditQuestionForm(question, latest_revision, request.POST)
             if form.is_valid():
-                html = sanitize_html(
-                    markdowner.convert(form.cleaned_data['text']))
+                html = markup.render(form.cleaned_data['text'])
                 if 'preview' in request.POST:
                     # The user submitted to preview the formatted question
                     preview = mark_safe(html)
@@ -326,10 +453,13 @@ def _edit_question(request, question):
                             updated_fields['wikified_at'] = edited_at
                         Question.objects.filter(
                             id=question.id).update(**updated_fields)
+                        invalidate_question_lists()
+                        invalidate_question_page(question.id)
                         # Update the Question's tag associations
                         if tags_changed:
                             tags_updated = Question.objects.update_tags(
-                                question, question.tagnames, request.user)
+                                question, form.cleaned_data['tags'],
+                                request.user)
                         # Create a new revision
                         revision = QuestionRevision(
                             question   = question,
@@ -347,6 +477,7 @@ def _edit_question(request, question):
                                     latest_revision, revision,
                                     ('wiki' in updated_fields))
                         revision.save()
+                        Question.objects.update_hotness([question.id])
                         # TODO 5 body edits by the author = automatic wiki mode
                         # TODO 4 individual editors = automatic wiki mode
                         # TODO Badges related to Tag usage
@@ -392,6 +523,8 @@ def _retag_question(request, question):
                     last_activity_at = retagged_at,
                     last_activity_by = request.user
                 )
+                invalidate_question_lists()
+                invalidate_question_page(question.id)
                 # Update the Question's tag associations
                 tags_updated = Question.objects.update_tags(question,
                     form.cleaned_data['tags'], request.user)
@@ -405,6 +538,7 @@ def _retag_question(request, question):
                     summary    = u'modified tags',
                     text       = latest_revision.text
                 )
+                Question.objects.update_hotness([question.id])
                 # TODO Badges related to retagging / Tag usage
                 # TODO Badges related to editing Questions
             return HttpResponseRedirect(question.get_absolute_url())
@@ -416,31 +550,36 @@ def _retag_question(request, question):
         'form': form,
     }, context_instance=RequestContext(request))
 
-QUESTION_REVISION_TEMPLATE = ('<h1>%(title)s</h1>\n'
-    '<div class="text">%(html)s</div>\n'
-    '<div class="tags">%(tags)s</div>')
+def get_revision_page(request, post):
+    """
+    Retrieves the requested page of a Question or Answer's revisions,
+    rendering and storing any which haven't been rendered yet.
+    """
+    paginator = Paginator(post.revisions.defer('stored_text', 'html'),
+                          REVISIONS_PER_PAGE)
+    page = get_page(request, paginator)
+    revisions = list(page.object_list)
+    for revision in revisions:
+        if revision.diff is None:
+            # Deferred fields will be loaded as they're accessed
+            render_revision(revision, revision.get_previous_revision())
+            post.revisions.filter(id=revision.id).update(
+                html=revision.html, diff=revision.diff)
+    page.object_list = revisions
+    populate_foreign_key_caches(User, ((revisions, ('author',)),),
+         fields=('username', 'gravatar', 'reputation', 'gold', 'silver',
+                 'bronze'))
+    return page
 
 def question_revisions(request, question_id):
     """Revision history for a Question."""
     question = get_object_or_404(Question, id=question_id)
-    revisions = list(question.revisions.all())
-    populate_foreign_key_caches(User, ((revisions, ('author',)),),
-         fields=('username', 'gravatar', 'reputation', 'gold', 'silver',
-                 'bronze'))
-    for i, revision in enumerate(revisions):
-        revision.html = QUESTION_REVISION_TEMPLATE % {
-            'title': revision.title,
-            'html': sanitize_html(markdowner.convert(revision.text)),
-            'tags': ' '.join(['<a class="tag">%s</a>' % tag
-                              for tag in revision.tagnames.split(' ')]),
-        }
-        if i > 0:
-            revisions[i - 1].diff = htmldiff(revision.html,
-                                             revisions[i - 1].html)
+    page = get_revision_page(request, question)
     return render_to_response('question_revisions.html', {
         'title': u'Question Revisions',
         'question': question,
-        'revisions': revisions,
+        'revisions': page.object_list,
+        'page': page,
     }, context_instance=RequestContext(request))
 
 def close_question(request, question_id):
@@ -461,6 +600,8 @@ def _close_question(request, question):
             Question.objects.filter(id=question.id).update(closed=True,
                 closed_by=request.user, closed_at=datetime.datetime.now(),
                 close_reason=form.cleaned_data['reason'])
+            invalidate_question_lists()
+            invalidate_question_page(question.id)
             if request.is_ajax():
                 return JsonResponse({'success': True})
             else:
@@ -482,6 +623,8 @@ def _reopen_question(request, question):
     if request.method == 'POST' and 'reopen' in request.POST:
         Question.objects.filter(id=question.id).update(closed=False,
             closed_by=None, closed_at=None, close_reason=None)
+        invalidate_question_lists()
+        invalidate_question_page(question.id)
         if request.is_ajax():
             return JsonResponse({'success': True})
         else:
@@ -531,7 +674,7 @@ def add_answer(request, question_id):
     if request.method == 'POST':
         form = AddAnswerForm(request.POST)
         if form.is_valid():
-            html = sanitize_html(markdowner.convert(form.cleaned_data['text']))
+            html = markup.render(form.cleaned_data['text'])
             if 'preview' in request.POST:
                 # The user submitted the form to preview the formatted answer
                 preview = mark_safe(html)
@@ -562,6 +705,7 @@ def add_answer(request, question_id):
                     text       = form.cleaned_data['text']
                 )
                 Question.objects.update_answer_count(question)
+                Question.objects.update_hotness([question.id])
                 # TODO Badges related to answering Questions
                 # TODO If this is answer 30, put question and all answers into
                 #      wiki mode.
@@ -630,8 +774,7 @@ def edit_answer(request, answer_id):
             # Always check modifications against the latest revision
             form = EditAnswerForm(answer, latest_revision, request.POST)
             if form.is_valid():
-                html = sanitize_html(
-                    markdowner.convert(form.cleaned_data['text']))
+                html = markup.render(form.cleaned_data['text'])
                 if 'preview' in request.POST:
                     # The user submitted to preview the formatted question
                     preview = mark_safe(html)
@@ -650,6 +793,7 @@ def edit_answer(request, answer_id):
                             updated_fields['wikified_at'] = edited_at
                         Answer.objects.filter(
                             id=answer.id).update(**updated_fields)
+                        invalidate_question_page(answer.question_id)
                         # Create a new revision
                         revision = AnswerRevision(
                             answer = answer,
@@ -665,6 +809,7 @@ def edit_answer(request, answer_id):
                                     latest_revision, revision,
                                     ('wiki' in updated_fields))
                         revision.save()
+                        Question.objects.update_hotness([answer.question_id])
                         # TODO 5 body edits by the asker = automatic wiki mode
                         # TODO 4 individual editors = automatic wiki mode
                         # TODO Badges related to editing Answers
@@ -686,39 +831,74 @@ def edit_answer(request, answer_id):
         'preview': preview,
     }, context_instance=RequestContext(request))
 
-ANSWER_REVISION_TEMPLATE = '<div class="text">%(html)s</div>'
-
 def answer_revisions(request, answer_id):
     """Revision history for an Answer."""
     answer = get_object_or_404(Answer, id=answer_id)
-    revisions = list(answer.revisions.all())
-    populate_foreign_key_caches(User, ((revisions, ('author',)),),
-         fields=('username', 'gravatar', 'reputation', 'gold', 'silver',
-                 'bronze'))
-    for i, revision in enumerate(revisions):
-        revision.html = QUESTION_REVISION_TEMPLATE % {
-            'html': sanitize_html(markdowner.convert(revision.text)),
-        }
-        if i > 0:
-            revisions[i - 1].diff = htmldiff(revision.html,
-                                             revisions[i - 1].html)
+    page = get_revision_page(request, answer)
     return render_to_response('answer_revisions.html', {
         'title': u'Answer Revisions',
+        'question': answer.question,
         'answer': answer,
-        'revisions': revisions,
+        'revisions': page.object_list,
+        'page': page,
     }, context_instance=RequestContext(request))
 
+@transaction.commit_on_success
 def accept_answer(request, answer_id):
-    """Marks an Answer as accepted."""
-    raise NotImplementedError
+    """
+    Marks an Answer as accepted, replacing any previously accepted Answer,
+    or withdraws acceptance if it was already accepted.
+    """
+    if request.method != 'POST':
+        raise Http404
+
+    answer = get_object_or_404(Answer, id=answer_id, deleted=False)
+    question = answer.question
+    if request.user.id != question.author_id:
+        raise Http404
+
+    reputation_events = []
+    if answer.accepted:
+        Answer.objects.filter(id=answer.id).update(accepted=False)
+        Question.objects.filter(id=question.id).update(answer_accepted=False)
+        reputation_events.extend(ReputationEvent.objects.for_acceptance(
+            answer, question, cancelled=True))
+    else:
+        for accepted_answer in Answer.objects.filter(question=question,
+                                                     accepted=True):
+            reputation_events.extend(ReputationEvent.objects.for_acceptance(
+                accepted_answer, question, cancelled=True))
+        Answer.objects.filter(question=question, accepted=True).update(
+            accepted=False)
+        Answer.objects.filter(id=answer.id).update(accepted=True)
+        Question.objects.filter(id=question.id).update(answer_accepted=True)
+        reputation_events.extend(ReputationEvent.objects.for_acceptance(
+            answer, question))
+    ReputationEvent.objects.record(reputation_events)
+    Question.objects.update_unanswered([question.id])
+    invalidate_question_lists()
+    invalidate_question_page(question.id)
+
+    if request.is_ajax():
+        return JsonResponse({
+            'success': True,
+            'accepted': not answer.accepted,
+        })
+    else:
+        return HttpResponseRedirect(answer.get_absolute_url())
 
 def delete_answer(request, answer_id):
     """Deletes or undeletes an Answer."""
     raise NotImplementedError
 
+@transaction.commit_on_success
 def vote(request, model, object_id):
     """
     Vote on a Question or Answer.
+
+    The vote and the resulting change to the post's score are made in a
+    single transaction, with the new score calculated from the change
+    rather than read back.
     """
     if request.method != 'POST':
         raise Http404
@@ -731,9 +911,15 @@ def vote(request, model, object_id):
     else:
         raise Http404
 
-    # TODO Ensure users can't vote on their own posts
-
     obj = get_object_or_404(model, id=object_id, deleted=False, locked=False)
+    if obj.author_id == request.user.id:
+        if request.is_ajax():
+            return JsonResponse({
+                'success': False,
+                'errors': {'__all__': [u'You can\'t vote on your own post.']},
+            })
+        else:
+            return HttpResponseRedirect(obj.get_absolute_url())
     content_type = ContentType.objects.get_for_model(model)
     try:
         existing_vote = Vote.objects.get(content_type=content_type,
@@ -742,25 +928,40 @@ def vote(request, model, object_id):
     except Vote.DoesNotExist:
         existing_vote = None
 
+    reputation_events = []
     if existing_vote is None:
         Vote.objects.create(content_type=content_type,
                             object_id=object_id,
                             user=request.user,
                             vote=vote_type)
+        score = obj.score + vote_type
+        reputation_events.extend(ReputationEvent.objects.for_vote(
+            obj, request.user, vote_type))
     else:
+        reputation_events.extend(ReputationEvent.objects.for_vote(
+            obj, request.user, existing_vote.vote, cancelled=True))
         if vote_type == existing_vote.vote:
             existing_vote.delete()
+            score = obj.score - vote_type
         else:
             existing_vote.vote = vote_type
-            existing_vote.save()
+            existing_vote.save(force_update=True)
+            score = obj.score + 2 * vote_type
+            reputation_events.extend(ReputationEvent.objects.for_vote(
+                obj, request.user, vote_type))
+
+    # Votes on community wiki posts don't affect reputation
+    if not obj.wiki:
+        ReputationEvent.objects.record(reputation_events)
 
-    # TODO Reputation management
+    if model is Question:
+        obj.score = score
+        Question.objects.set_hotness([(obj.id, obj.calculate_hotness())])
 
     if request.is_ajax():
         return JsonResponse({
             'success': True,
-            'score': model._default_manager.filter(
-                id=object_id).values_list('score', flat=True)[0],
+            'score': score,
         })
     else:
         return HttpResponseRedirect(obj.get_absolute_url())
@@ -813,10 +1014,11 @@ def tags(request):
     sort_type = request.GET.get('sort', DEFAULT_TAG_SORT)
     if sort_type not in TAG_SORT:
         sort_type = DEFAULT_TAG_SORT
-    tags = Tag.objects.all().order_by(*TAG_SORT[sort_type])
     name_filter = request.GET.get('filter', '')
     if name_filter:
-        tags = tags.filter(name__icontains=name_filter)
+        tags = TagList(tag_index.filter(name_filter.lower(), sort_type))
+    else:
+        tags = Tag.objects.all().order_by(*TAG_SORT[sort_type])
     paginator = Paginator(tags, 50)
     page = get_page(request, paginator)
     return render_to_response('tags.html', {
@@ -827,9 +1029,46 @@ def tags(request):
         'filter': name_filter,
     }, context_instance=RequestContext(request))
 
+# Maximum number of Tags suggested for autocompletion
+TAG_AUTOCOMPLETE_LIMIT = 10
+
+def tag_autocomplete(request):
+    """
+    Suggests the most used Tags whose names start with the final, possibly
+    partial, Tag name in the ``q`` parameter, as a list of ``[name, use
+    count]`` pairs.
+    """
+    names = tag_split_re.split(request.GET.get('q', u'').lower())
+    if not names[-1]:
+        return JsonResponse([])
+    return JsonResponse([[name, use_count] for tag_id, name, use_count in
+                         tag_index.complete(names[-1],
+                                            TAG_AUTOCOMPLETE_LIMIT)])
+
 def tag(request, tag_name):
-    """Displayed Questions for a Tag."""
-    raise NotImplementedError
+    """
+    Displays Questions for a Tag, or for a combination of Tags separated
+    by ``+``, such as ``python+django``.
+    """
+    tag_names = []
+    for name in tag_name.replace(u' ', u'+').split(u'+'):
+        if name and name not in tag_names:
+            tag_names.append(name)
+    tags = list(Tag.objects.filter(name__in=tag_names))
+    if not tags or len(tags) != len(tag_names):
+        raise Http404
+    tags.sort(key=lambda tag: tag_names.index(tag.name))
+    related_tags = TagCooccurrence.objects.get_combined_related_tags(tags)
+    return question_list(request,
+                         [TaggedQuestionView(view, tags)
+                          for view in all_question_views],
+                         'tagged_questions.html', 'question_summaries.html',
+                         extra_context={
+                             'title': u'Questions Tagged %s' % u' '.join(
+                                 [tag.name for tag in tags]),
+                             'tags': tags,
+                             'related_tags': related_tags,
+                         })
 
 USER_SORT = {
     'reputation': ('-reputation', '-date_joined'),
@@ -848,7 +1087,7 @@ def users(request):
     users = User.objects.all().order_by(*USER_SORT[sort_type])
     name_filter = request.GET.get('filter', '')
     if name_filter:
-        users = users.filter(username__icontains=name_filter)
+        users = UsernameTrigram.objects.filter_users(users, name_filter)
     users = users.values('id', 'username', 'gravatar',  'reputation', 'gold',
                          'silver', 'bronze')
     paginator = Paginator(users, 28)